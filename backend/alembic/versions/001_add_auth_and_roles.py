@@ -1,7 +1,7 @@
 """Add auth and roles
 
 Revision ID: 001
-Revises: 
+Revises: 000
 Create Date: 2024-01-01 00:00:00.000000
 
 """
@@ -11,7 +11,7 @@ from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
 revision = '001'
-down_revision = None
+down_revision = '000'
 branch_labels = None
 depends_on = None
 
@@ -23,7 +23,7 @@ def upgrade() -> None:
     
     # Add new columns to users table
     op.add_column('users', sa.Column('password_hash', sa.String(255), nullable=False, server_default=''))
-    op.add_column('users', sa.Column('role', user_role_enum, nullable=False, server_default="'athlete'"))
+    op.add_column('users', sa.Column('role', user_role_enum, nullable=False, server_default='athlete'))
     
     # Create notification_prefs table
     op.create_table('notification_prefs',
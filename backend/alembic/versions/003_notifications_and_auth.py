@@ -20,20 +20,7 @@ def upgrade():
     # Add email_verified column to users table
     op.add_column('users', sa.Column('email_verified', sa.Boolean(), nullable=False, server_default='false'))
     
-    # Create notification_prefs table
-    op.create_table('notification_prefs',
-        sa.Column('id', sa.Integer(), nullable=False),
-        sa.Column('user_id', sa.Integer(), nullable=False),
-        sa.Column('email_enabled', sa.Boolean(), nullable=False, server_default='true'),
-        sa.Column('webhook_enabled', sa.Boolean(), nullable=False, server_default='false'),
-        sa.Column('webhook_url', sa.String(length=500), nullable=True),
-        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
-        sa.PrimaryKeyConstraint('id'),
-        sa.UniqueConstraint('user_id')
-    )
-    op.create_index(op.f('ix_notification_prefs_id'), 'notification_prefs', ['id'], unique=False)
+    # notification_prefs and coach_athlete are created by 001
     
     # Create api_keys table
     op.create_table('api_keys',
@@ -73,19 +60,6 @@ def upgrade():
         sa.PrimaryKeyConstraint('id')
     )
     op.create_index(op.f('ix_password_reset_tokens_id'), 'password_reset_tokens', ['id'], unique=False)
-    
-    # Create coach_athlete table if it doesn't exist
-    op.create_table('coach_athlete',
-        sa.Column('id', sa.Integer(), nullable=False),
-        sa.Column('coach_id', sa.Integer(), nullable=False),
-        sa.Column('athlete_id', sa.Integer(), nullable=False),
-        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-        sa.ForeignKeyConstraint(['athlete_id'], ['users.id'], ),
-        sa.ForeignKeyConstraint(['coach_id'], ['users.id'], ),
-        sa.PrimaryKeyConstraint('id'),
-        sa.UniqueConstraint('coach_id', 'athlete_id', name='uq_coach_athlete')
-    )
-    op.create_index(op.f('ix_coach_athlete_id'), 'coach_athlete', ['id'], unique=False)
 
 
 def downgrade():
@@ -93,8 +67,6 @@ def downgrade():
     op.drop_table('password_reset_tokens')
     op.drop_table('email_verify_tokens')
     op.drop_table('api_keys')
-    op.drop_table('notification_prefs')
-    op.drop_table('coach_athlete')
     
     # Remove email_verified column from users table
     op.drop_column('users', 'email_verified')
@@ -0,0 +1,27 @@
+"""Add indexed key_prefix to api_keys for O(1) key lookup
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing keys keep a NULL prefix; they are matched by the legacy scan
+    # once and backfilled on first successful use.
+    op.add_column('api_keys', sa.Column('key_prefix', sa.String(length=16), nullable=True))
+    op.create_index(op.f('ix_api_keys_key_prefix'), 'api_keys', ['key_prefix'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_api_keys_key_prefix'), table_name='api_keys')
+    op.drop_column('api_keys', 'key_prefix')
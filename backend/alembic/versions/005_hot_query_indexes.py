@@ -0,0 +1,45 @@
+"""Composite, partial and hash indexes for hot query patterns
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+OPEN_WORKOUT = sa.text('ended_at IS NULL')
+
+# (name, table, columns, extra kwargs)
+INDEXES = [
+    ('ix_punches_workout_id_timestamp', 'punches', ['workout_id', 'timestamp'], {}),
+    ('ix_punches_session_id_timestamp', 'punches', ['session_id', 'timestamp'], {}),
+    ('ix_sessions_user_id_started_at', 'sessions', ['user_id', 'started_at'], {}),
+    ('ix_workouts_user_id_started_at', 'workouts', ['user_id', 'started_at'], {}),
+    ('ix_workouts_open_user_id_started_at', 'workouts', ['user_id', 'started_at'],
+     {'postgresql_where': OPEN_WORKOUT, 'sqlite_where': OPEN_WORKOUT}),
+    ('ix_workout_segments_workout_id_started_at', 'workout_segments', ['workout_id', 'started_at'], {}),
+    ('ix_coach_athlete_coach_id_athlete_id', 'coach_athlete', ['coach_id', 'athlete_id'], {}),
+    ('ix_email_verify_tokens_token_hash', 'email_verify_tokens', ['token_hash'], {'postgresql_using': 'hash'}),
+    ('ix_password_reset_tokens_token_hash', 'password_reset_tokens', ['token_hash'], {'postgresql_using': 'hash'}),
+]
+
+
+def upgrade():
+    # Build concurrently on Postgres so large punches tables stay writable;
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **kwargs)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,123 @@
+"""Range-partition punches by month on timestamp
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+# Keep in step with services/partitions.py
+MONTHS_AHEAD = 3
+INDEXES = [
+    ('ix_punches_workout_id_timestamp', ['workout_id', 'timestamp']),
+    ('ix_punches_session_id_timestamp', ['session_id', 'timestamp']),
+    ('ix_punches_timestamp', ['timestamp']),
+]
+
+
+def _add_months(month, months):
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _punch_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False, server_default=sa.text("nextval('punches_id_seq'::regclass)")),
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('sessions.id'), nullable=True),
+        sa.Column('workout_id', sa.Integer(), sa.ForeignKey('workouts.id', name='fk_punches_workout'), nullable=True),
+        sa.Column('segment_id', sa.Integer(), sa.ForeignKey('workout_segments.id', name='fk_punches_segment'), nullable=True),
+        sa.Column('punch_type', sa.String(20), nullable=False),
+        sa.Column('speed', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+    ]
+
+
+def upgrade():
+    # Declarative partitioning is Postgres-only; SQLite dev databases keep a plain table
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    # Move the old table aside, keeping its id sequence alive for the new one
+    op.execute("ALTER SEQUENCE punches_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE punches RENAME TO punches_unpartitioned")
+    op.execute("ALTER INDEX punches_pkey RENAME TO punches_unpartitioned_pkey")
+    for name in ['ix_punches_id'] + [name for name, _ in INDEXES]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    # The partition key has to be part of the primary key
+    op.create_table(
+        'punches',
+        *_punch_columns(),
+        sa.PrimaryKeyConstraint('id', 'timestamp', name='punches_pkey'),
+        postgresql_partition_by='RANGE ("timestamp")'
+    )
+    op.execute("ALTER SEQUENCE punches_id_seq OWNED BY punches.id")
+
+    # One partition per month from the oldest punch until MONTHS_AHEAD months out,
+    # plus a default partition for anything outside those ranges
+    oldest = conn.execute(sa.text('SELECT min("timestamp") FROM punches_unpartitioned')).scalar()
+    today = date.today()
+    month = date(oldest.year, oldest.month, 1) if oldest else date(today.year, today.month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        end = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE punches_p{month.year:04d}_{month.month:02d} PARTITION OF punches "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+    op.execute("CREATE TABLE punches_default PARTITION OF punches DEFAULT")
+
+    op.execute('''
+        INSERT INTO punches (id, session_id, workout_id, segment_id, punch_type, speed, count, "timestamp", notes)
+        SELECT id, session_id, workout_id, segment_id, punch_type, speed, count, COALESCE("timestamp", now()), notes
+        FROM punches_unpartitioned
+    ''')
+    op.drop_table('punches_unpartitioned')
+
+    # Built after the copy; indexes on the parent cascade to every partition
+    for name, columns in INDEXES:
+        op.create_index(name, 'punches', columns, unique=False)
+    op.execute("ANALYZE punches")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER SEQUENCE punches_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE punches RENAME TO punches_partitioned")
+    op.execute("ALTER INDEX punches_pkey RENAME TO punches_partitioned_pkey")
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.create_table(
+        'punches',
+        *_punch_columns(),
+        sa.PrimaryKeyConstraint('id', name='punches_pkey')
+    )
+    op.execute("ALTER SEQUENCE punches_id_seq OWNED BY punches.id")
+    op.execute('''
+        INSERT INTO punches (id, session_id, workout_id, segment_id, punch_type, speed, count, "timestamp", notes)
+        SELECT id, session_id, workout_id, segment_id, punch_type, speed, count, "timestamp", notes
+        FROM punches_partitioned
+    ''')
+    # Dropping the parent drops every attached partition; detached ones are left alone
+    op.execute("DROP TABLE punches_partitioned")
+
+    op.create_index('ix_punches_id', 'punches', ['id'], unique=False)
+    for name, columns in INDEXES[:2]:
+        op.create_index(name, 'punches', columns, unique=False)
@@ -0,0 +1,40 @@
+"""Denormalize user_id onto punches for join-free per-user queries
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Added to the partitioned parent on Postgres, so every partition gets it
+    op.add_column('punches', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_punches_user', 'punches', 'users', ['user_id'], ['id'])
+
+    # Backfill from the workout (device punches), then the session for the rest
+    op.execute('''
+        UPDATE punches SET user_id = (SELECT workouts.user_id FROM workouts WHERE workouts.id = punches.workout_id)
+        WHERE user_id IS NULL AND workout_id IS NOT NULL
+    ''')
+    op.execute('''
+        UPDATE punches SET user_id = (SELECT sessions.user_id FROM sessions WHERE sessions.id = punches.session_id)
+        WHERE user_id IS NULL AND session_id IS NOT NULL
+    ''')
+
+    # Built after the backfill; cascades to every partition on Postgres
+    op.create_index('ix_punches_user_id_timestamp', 'punches', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_punches_user_id_timestamp', table_name='punches')
+    op.drop_constraint('fk_punches_user', 'punches', type_='foreignkey')
+    op.drop_column('punches', 'user_id')
@@ -0,0 +1,53 @@
+"""Per-user daily punch rollup
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_daily_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('punch_type', sa.String(20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('speed_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('speed_max', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('workout_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'punch_type'),
+    )
+
+    # Backfill; same grouping as DailyStatsService.rebuild ('*' rows carry workout counts)
+    if op.get_bind().dialect.name == 'postgresql':
+        punch_day = "(\"timestamp\" AT TIME ZONE 'UTC')::date"
+        workout_day = "(started_at AT TIME ZONE 'UTC')::date"
+    else:
+        punch_day = 'date("timestamp")'
+        workout_day = 'date(started_at)'
+    op.execute(f'''
+        INSERT INTO user_daily_stats (user_id, day, punch_type, count, speed_sum, speed_max, workout_count)
+        SELECT user_id, {punch_day}, punch_type, sum(COALESCE(count, 1)), sum(speed * COALESCE(count, 1)), max(speed), 0
+        FROM punches WHERE user_id IS NOT NULL
+        GROUP BY user_id, {punch_day}, punch_type
+    ''')
+    op.execute(f'''
+        INSERT INTO user_daily_stats (user_id, day, punch_type, count, speed_sum, speed_max, workout_count)
+        SELECT user_id, {workout_day}, '*', 0, 0, 0, count(id)
+        FROM workouts
+        GROUP BY user_id, {workout_day}
+    ''')
+
+
+def downgrade():
+    op.drop_table('user_daily_stats')
@@ -0,0 +1,39 @@
+"""Stored aggregates for closed workouts
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not backfilled: rows for already closed workouts are written on their first summary read
+    op.create_table(
+        'workout_stats',
+        sa.Column('workout_id', sa.Integer(), sa.ForeignKey('workouts.id'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('duration_seconds', sa.Integer(), nullable=False),
+        sa.Column('total_punches', sa.Integer(), nullable=False),
+        sa.Column('average_speed', sa.Float(), nullable=False),
+        sa.Column('max_speed', sa.Float(), nullable=False),
+        sa.Column('rounds', sa.Integer(), nullable=False),
+        sa.Column('rests', sa.Integer(), nullable=False),
+        sa.Column('punch_mix', sa.JSON(), nullable=False),
+        sa.Column('segments', sa.JSON(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('workout_stats')
@@ -0,0 +1,35 @@
+"""Manifest of punches moved to cold storage
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-16 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'punch_archives',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('path', sa.String(500), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('min_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('max_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index('ix_punch_archives_user_id_month', 'punch_archives', ['user_id', 'month'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_punch_archives_user_id_month', table_name='punch_archives')
+    op.drop_table('punch_archives')
@@ -0,0 +1,36 @@
+"""At most one open workout per user
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+OPEN_WORKOUT = sa.text('ended_at IS NULL')
+
+
+def upgrade():
+    # Close all but the newest open workout of each user so the index can be built
+    op.execute("""
+        UPDATE workouts SET ended_at = now()
+        WHERE ended_at IS NULL
+          AND id NOT IN (SELECT max(id) FROM workouts WHERE ended_at IS NULL GROUP BY user_id)
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ux_workouts_open_user_id', 'workouts', ['user_id'], unique=True,
+            postgresql_where=OPEN_WORKOUT, sqlite_where=OPEN_WORKOUT, postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_workouts_open_user_id', table_name='workouts', postgresql_concurrently=True)
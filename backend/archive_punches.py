@@ -0,0 +1,60 @@
+"""
+Move old punches to cold storage (see services/archive.py).
+
+Usage (from backend/):
+    python -m archive_punches --older-than-days 180
+    python -m archive_punches --older-than-days 180 --uri s3://bucket/punches
+    python -m archive_punches --database-url postgresql://...
+
+Whole months older than the threshold are archived; the same job also runs
+on PUNCH_ARCHIVE_CRON when PUNCH_ARCHIVE_AFTER_DAYS is set.
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.archive import PunchArchiver, ArchiveError
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Archive old punches to compressed Parquet files")
+    parser.add_argument("--older-than-days", type=int, default=None, help="Override PUNCH_ARCHIVE_AFTER_DAYS")
+    parser.add_argument("--uri", default=None, help="Override PUNCH_ARCHIVE_URI (directory or s3://bucket/prefix)")
+    parser.add_argument("--database-url", default=None, help="Override the configured database")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    archiver = PunchArchiver()
+    if args.older_than_days is not None:
+        archiver.after_days = args.older_than_days
+    if args.uri:
+        archiver.uri = args.uri
+    if archiver.after_days <= 0:
+        print("❌ Set --older-than-days or PUNCH_ARCHIVE_AFTER_DAYS", file=sys.stderr)
+        return 1
+
+    db = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        result = archiver.run(db)
+    except ArchiveError as exc:
+        print(f"❌ Archive failed: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    print(f"✅ Archived {result['rows']:,} punches from {result['months']:,} user-months")
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
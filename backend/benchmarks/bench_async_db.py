@@ -0,0 +1,156 @@
+"""
+Benchmark: request latency under mixed load (blocking vs non-blocking DB access)
+
+Runs the app in-process over ASGI against a throwaway SQLite database.
+Heavy clients repeatedly request session analytics over a large session
+(a full SQL aggregate, Redis unavailable) while light clients fetch a small
+session's punches. Reports light-request latency percentiles: with blocking
+DB calls inside async routes every light request waits behind the running
+aggregate, with the async engine it does not.
+
+Usage (from backend/):
+    python benchmarks/bench_async_db.py [big_session_punches] [seconds]
+
+Run it on two revisions to compare before/after.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, get_db
+from main import app
+from models import Punch, Session as SessionModel, User
+
+try:
+    from database import get_async_db
+except ImportError:  # revisions without the async engine
+    get_async_db = None
+
+PUNCH_TYPES = ["jab", "cross", "hook", "uppercut"]
+HEAVY_CLIENTS = 4
+LIGHT_CLIENTS = 16
+
+
+def _setup(db_path: str, big_punches: int):
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+        pool_size=HEAVY_CLIENTS + LIGHT_CLIENTS
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    big = SessionModel(user_id=user.id, name="Big Session")
+    small = SessionModel(user_id=user.id, name="Small Session")
+    db.add_all([big, small])
+    db.commit()
+    now = datetime.utcnow()
+    for session_id, n in ((big.id, big_punches), (small.id, 20)):
+        db.execute(insert(Punch), [
+            {
+                "session_id": session_id,
+                "punch_type": PUNCH_TYPES[i % 4],
+                "speed": 20.0 + i % 10,
+                "count": 1,
+                "timestamp": now,
+            }
+            for i in range(n)
+        ])
+    db.commit()
+    ids = (big.id, small.id)
+    db.close()
+    return SessionLocal, ids
+
+
+def _override(db_path: str, SessionLocal):
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    if get_async_db is not None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def override_get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_async_db] = override_get_async_db
+
+
+async def _run(big_id: int, small_id: int, seconds: float):
+    transport = httpx.ASGITransport(app=app)
+    light_latencies = []
+    heavy_done = 0
+    deadline = time.perf_counter() + seconds
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def heavy():
+            nonlocal heavy_done
+            while time.perf_counter() < deadline:
+                r = await client.get(f"/api/analytics/{big_id}")
+                r.raise_for_status()
+                heavy_done += 1
+
+        async def light():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                r = await client.get(f"/api/punches/session/{small_id}")
+                r.raise_for_status()
+                light_latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(
+            *(heavy() for _ in range(HEAVY_CLIENTS)),
+            *(light() for _ in range(LIGHT_CLIENTS)),
+        )
+    return light_latencies, heavy_done
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    big_punches = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        SessionLocal, (big_id, small_id) = _setup(db_path, big_punches)
+        _override(db_path, SessionLocal)
+        latencies, heavy_done = asyncio.run(_run(big_id, small_id, seconds))
+
+    mode = "async engine" if get_async_db is not None else "sync session in async routes"
+    print(f"Mode: {mode}")
+    print(f"Load: {HEAVY_CLIENTS} analytics clients over {big_punches} punches + {LIGHT_CLIENTS} light clients, {seconds:.0f}s")
+    print(f"Heavy requests completed: {heavy_done}")
+    print(f"Light requests completed: {len(latencies)} ({len(latencies) / seconds:.0f}/s)")
+    print(
+        f"Light latency ms: p50={statistics.median(latencies):.1f} "
+        f"p95={_percentile(latencies, 95):.1f} p99={_percentile(latencies, 99):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark: cache-hit throughput under concurrency (blocking vs asyncio Redis)
+
+Runs the app in-process over ASGI against a throwaway SQLite database and a
+minimal in-process Redis stand-in that answers every round trip after a
+fixed network delay. Concurrent clients request session analytics and an
+open workout's summary, both served from the Redis cache. With the blocking
+client every cache round trip stalls the event loop, so requests run one
+round trip at a time; with redis.asyncio they overlap.
+
+Usage (from backend/):
+    python benchmarks/bench_async_redis.py [concurrency] [seconds] [redis_rtt_ms]
+
+Run it on two revisions to compare before/after.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PUNCH_TYPES = ["jab", "cross", "hook", "uppercut"]
+
+
+class FakeRedisServer(threading.Thread):
+    """Just enough RESP2 for the cache paths, with one delay per round trip"""
+
+    def __init__(self, rtt_seconds: float):
+        super().__init__(name="fake-redis", daemon=True)
+        self.rtt_seconds = rtt_seconds
+        self.data = {}
+        self.port = None
+        self._ready = threading.Event()
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start_and_wait(self) -> int:
+        self.start()
+        self._ready.wait()
+        return self.port
+
+    async def _handle(self, reader, writer):
+        buffer = b""
+        queued = None
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            await asyncio.sleep(self.rtt_seconds)
+            out = []
+            while True:
+                command, buffer = self._parse(buffer)
+                if command is None:
+                    break
+                name = command[0].upper()
+                if name == "MULTI":
+                    queued = []
+                    out.append(b"+OK\r\n")
+                elif name == "EXEC":
+                    replies = [self._execute(c) for c in queued or []]
+                    queued = None
+                    out.append(b"*%d\r\n" % len(replies) + b"".join(replies))
+                elif queued is not None:
+                    queued.append(command)
+                    out.append(b"+QUEUED\r\n")
+                else:
+                    out.append(self._execute(command))
+            writer.write(b"".join(out))
+            await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def _parse(buffer: bytes):
+        if not buffer.startswith(b"*"):
+            return None, buffer
+        end = buffer.find(b"\r\n")
+        if end < 0:
+            return None, buffer
+        count, pos, args = int(buffer[1:end]), end + 2, []
+        for _ in range(count):
+            end = buffer.find(b"\r\n", pos)
+            if end < 0:
+                return None, buffer
+            length = int(buffer[pos + 1:end])
+            if len(buffer) < end + 2 + length + 2:
+                return None, buffer
+            args.append(buffer[end + 2:end + 2 + length].decode())
+            pos = end + 2 + length + 2
+        return args, buffer[pos:]
+
+    def _execute(self, command) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "GET":
+            return _bulk(self.data.get(args[0]))
+        if name in ("SET", "SETEX"):
+            self.data[args[0]] = args[-1]
+            return b"+OK\r\n"
+        if name == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        if name == "EXISTS":
+            return b":%d\r\n" % sum(key in self.data for key in args)
+        if name == "HSET":
+            fields = self.data.setdefault(args[0], {})
+            for field, value in zip(args[1::2], args[2::2]):
+                fields[field] = value
+            return b":%d\r\n" % (len(args[1:]) // 2)
+        if name == "HGETALL":
+            fields = self.data.get(args[0]) or {}
+            items = [part for pair in fields.items() for part in pair]
+            return b"*%d\r\n" % len(items) + b"".join(_bulk(item) for item in items)
+        if name == "EXPIRE":
+            return b":1\r\n"
+        return b"+OK\r\n"
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    encoded = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(encoded), encoded)
+
+
+def _setup(db_path: str):
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from models import Punch, Session as SessionModel, User, Workout
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Bench Session")
+    workout = Workout(user_id=user.id, started_at=datetime.utcnow())
+    db.add_all([session, workout])
+    db.commit()
+    db.execute(insert(Punch), [
+        {
+            "user_id": user.id,
+            "session_id": session.id,
+            "workout_id": workout.id,
+            "punch_type": PUNCH_TYPES[i % 4],
+            "speed": 20.0 + i % 10,
+            "count": 1,
+            "timestamp": datetime.utcnow(),
+        }
+        for i in range(200)
+    ])
+    db.commit()
+    ids = (user.id, session.id, workout.id)
+    db.close()
+    return ids
+
+
+def _override(app, db_path: str, user_id: int):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from auth import get_current_user
+    from database import get_async_db
+    from models import User
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_current_user] = lambda: User(id=user_id, username="bench")
+
+
+async def _run(app, path: str, concurrency: int, seconds: float):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm the cache entry this endpoint reads
+        (await client.get(path)).raise_for_status()
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                r = await client.get(path)
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    rtt_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
+    # Point the app's Redis settings at the stand-in before it is imported
+    os.environ["REDIS_HOST"] = "127.0.0.1"
+    os.environ["REDIS_PORT"] = str(FakeRedisServer(rtt_ms / 1000).start_and_wait())
+    from main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        user_id, session_id, workout_id = _setup(db_path)
+        _override(app, db_path, user_id)
+
+        print(f"Load: {concurrency} concurrent clients, {seconds:.0f}s per endpoint, Redis round trip {rtt_ms:.1f}ms")
+        for path in (f"/api/analytics/{session_id}", f"/api/workouts/{workout_id}/summary"):
+            latencies = asyncio.run(_run(app, path, concurrency, seconds))
+            print(
+                f"{path}: {len(latencies) / seconds:.0f} req/s, latency ms "
+                f"p50={statistics.median(latencies):.1f} p95={_percentile(latencies, 95):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: single-punch POST /api/punches vs POST /api/punches/batch
+
+Logs one simulated round of punches both ways against a throwaway SQLite
+database and reports wall time and the number of SQL statements issued.
+
+Usage (from backend/):
+    python benchmarks/bench_punch_batch.py [punches_per_round]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from database import Base, get_async_db, get_async_read_db
+from main import app
+from models import Session as SessionModel, User
+
+PUNCH_TYPES = ["jab", "cross", "hook", "uppercut"]
+
+
+def _setup(db_path: str):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Bench Round")
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    db.close()
+
+    # The punch routes use the async session; TestClient runs each request on a
+    # fresh event loop, so async connections are not pooled
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+
+    statements = {"count": 0}
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements["count"] += 1
+
+    return session_id, statements
+
+
+def _punches(session_id: int, n: int) -> list:
+    return [
+        {"session_id": session_id, "punch_type": PUNCH_TYPES[i % 4], "speed": 20.0 + (i % 15), "count": 1}
+        for i in range(n)
+    ]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        session_id, statements = _setup(os.path.join(tmp, "bench.sqlite3"))
+        client = TestClient(app)
+        payload = _punches(session_id, n)
+
+        statements["count"] = 0
+        start = time.perf_counter()
+        for punch in payload:
+            client.post("/api/punches", json=punch)
+        single_s = time.perf_counter() - start
+        single_stmts = statements["count"]
+
+        statements["count"] = 0
+        start = time.perf_counter()
+        response = client.post("/api/punches/batch", json=payload)
+        batch_s = time.perf_counter() - start
+        batch_stmts = statements["count"]
+        assert response.status_code == 200, response.text
+
+    print(f"punches per round: {n}")
+    print(f"single: {single_s:8.3f}s  {single_stmts:6d} SQL statements")
+    print(f"batch:  {batch_s:8.3f}s  {batch_stmts:6d} SQL statements")
+    print(f"round-trip reduction: {single_stmts / max(batch_stmts, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
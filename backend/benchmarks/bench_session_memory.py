@@ -0,0 +1,113 @@
+"""
+Benchmark: peak memory of session analytics as the session grows
+
+Fills a throwaway SQLite database with sessions of increasing size and
+measures (tracemalloc) the peak Python memory allocated while computing
+their analytics on a cache miss:
+
+- sql: SessionStatsService.aggregate, the GROUP BY punch_type query used by
+  GET /api/analytics/{session_id} and update_session_cache
+- orm: the previous implementation, which loaded every Punch object and
+  summed in Python (kept here as a reference)
+
+The sql column should stay flat while the orm column grows with the
+session size.
+
+Usage (from backend/):
+    python benchmarks/bench_session_memory.py [sizes, e.g. 1000,5000,20000,50000]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Punch, Session as SessionModel, User
+from services.session_stats import session_stats_service
+
+PUNCH_TYPES = ["jab", "cross", "hook", "uppercut"]
+
+
+def orm_aggregate(db, session_id: int):
+    """Reference: the per-row implementation this benchmark compares against"""
+    punches = db.query(Punch).filter(Punch.session_id == session_id).all()
+    total = sum(p.count for p in punches)
+    average_speed = sum(p.speed * p.count for p in punches) / total if total else 0.0
+    punch_types = {}
+    for p in punches:
+        punch_types[p.punch_type] = punch_types.get(p.punch_type, 0) + p.count
+    return {"total_punches": total, "average_speed": average_speed, "punch_types": punch_types}
+
+
+def _setup(SessionLocal, sizes):
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session_ids = {}
+    started = datetime.utcnow() - timedelta(hours=1)
+    for size in sizes:
+        session = SessionModel(user_id=user.id, name=f"{size} punches", started_at=started)
+        db.add(session)
+        db.commit()
+        db.execute(insert(Punch), [
+            {
+                "user_id": user.id,
+                "session_id": session.id,
+                "punch_type": PUNCH_TYPES[i % 4],
+                "speed": 20.0 + i % 10,
+                "count": 1 + i % 3,
+                "timestamp": started + timedelta(milliseconds=i * 100),
+            }
+            for i in range(size)
+        ])
+        db.commit()
+        session_ids[size] = session.id
+    db.close()
+    return session_ids
+
+
+def _measure(SessionLocal, fn, session_id: int):
+    db = SessionLocal()
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(db, session_id)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        db.close()
+    return result, peak / 1024, elapsed * 1000
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 5000, 20000, 50000]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False)
+        session_ids = _setup(SessionLocal, sizes)
+
+        # Warm up: statement compilation and mapper setup are one-time costs
+        for fn in (session_stats_service.aggregate, orm_aggregate):
+            _measure(SessionLocal, fn, session_ids[sizes[0]])
+
+        print(f"{'punches':>8} | {'sql peak KiB':>12} {'sql ms':>7} | {'orm peak KiB':>12} {'orm ms':>7}")
+        for size in sizes:
+            sql, sql_kib, sql_ms = _measure(SessionLocal, session_stats_service.aggregate, session_ids[size])
+            orm, orm_kib, orm_ms = _measure(SessionLocal, orm_aggregate, session_ids[size])
+            assert sql["total_punches"] == orm["total_punches"] and sql["punch_types"] == orm["punch_types"]
+            print(f"{size:>8} | {sql_kib:>12.0f} {sql_ms:>7.1f} | {orm_kib:>12.0f} {orm_ms:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
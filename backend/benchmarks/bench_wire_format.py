@@ -0,0 +1,65 @@
+"""
+Benchmark: JSON + pydantic parsing vs the binary columnar frame
+
+Measures only request decoding (what ingest_device_data does before the
+insert) for one batch of glove events.
+
+Usage (from backend/):
+    python benchmarks/bench_wire_format.py [events_per_batch] [iterations]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import DeviceIngestRequest
+from services.wire_format import PUNCH_TYPES, decode_event_frame, encode_event_frame
+
+
+def _events(n: int) -> list:
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    return [
+        {"ts": start + timedelta(milliseconds=50 * i), "punch_type": PUNCH_TYPES[i % 4], "speed": 20.0 + (i % 15), "count": 1}
+        for i in range(n)
+    ]
+
+
+def _bench(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    api_key = "k" * 43
+    events = _events(n)
+
+    json_body = json.dumps({
+        "user_api_key": api_key,
+        "events": [dict(e, ts=e["ts"].isoformat()) for e in events],
+    }).encode("utf-8")
+    binary_body = encode_event_frame(api_key, events)
+
+    def parse_json():
+        DeviceIngestRequest(**json.loads(json_body.decode("utf-8")))
+
+    def parse_binary():
+        decode_event_frame(binary_body)
+
+    json_s = _bench(parse_json, iterations)
+    binary_s = _bench(parse_binary, iterations)
+
+    print(f"events per batch: {n}")
+    print(f"json:   {len(json_body):8d} bytes  {json_s * 1e3:8.3f} ms/batch")
+    print(f"binary: {len(binary_body):8d} bytes  {binary_s * 1e3:8.3f} ms/batch")
+    print(f"speedup: {json_s / binary_s:.1f}x, size ratio: {len(json_body) / len(binary_body):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
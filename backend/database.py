@@ -1,63 +1,485 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import redis
+import redis.asyncio
+import asyncio
 import os
+import threading
+import time
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Database configuration with SQLite fallback for local dev without Docker
+# Engines are created on first use and the database is only contacted by
+# init_db() (called from the app lifespan), so importing this module is cheap
 postgres_user = os.getenv('POSTGRES_USER')
 postgres_password = os.getenv('POSTGRES_PASSWORD')
 postgres_host = os.getenv('POSTGRES_HOST')
 postgres_port = os.getenv('POSTGRES_PORT')
 postgres_db = os.getenv('POSTGRES_DB')
 
-DATABASE_URL = None
-
 def _make_sqlite_url() -> str:
     sqlite_path = os.path.join(os.path.dirname(__file__), 'punchtracker.sqlite3')
     return f"sqlite:///{sqlite_path}"
 
-engine = None
+def _pool_options() -> dict:
+    """Connection pool settings shared by the sync and async Postgres engines"""
+    return {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', '5')),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        "pool_timeout": int(os.getenv('DB_POOL_TIMEOUT_SEC', '30')),
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE_SEC', '1800')),
+        "pool_pre_ping": os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
 
-if all([postgres_user, postgres_password, postgres_host, postgres_port, postgres_db]):
-    # Try Postgres first
-    pg_url = f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"
-    try:
-        tmp_engine = create_engine(pg_url)
-        # Probe connection; if it fails, fall back to SQLite
-        with tmp_engine.connect() as _:
-            pass
-        DATABASE_URL = pg_url
-        engine = tmp_engine
-    except Exception:
-        # Fall back to SQLite
-        DATABASE_URL = _make_sqlite_url()
-        engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # Use SQLite by default when Postgres env is incomplete
-    DATABASE_URL = _make_sqlite_url()
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _make_async_url(url: str) -> str:
+    """Same database through an asyncio driver (asyncpg / aiosqlite)"""
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite:///"):
+        return "sqlite+aiosqlite:///" + url[len("sqlite:///"):]
+    return url
+
+def database_url() -> str:
+    """Postgres when its environment is complete, otherwise the local SQLite dev database"""
+    if all([postgres_user, postgres_password, postgres_host, postgres_port, postgres_db]):
+        return f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"
+    return _make_sqlite_url()
+
+# Session factories are bound when the engines are created
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+def _configure_engines(url: str) -> None:
+    global _engine, _async_engine
+    if url.startswith("postgresql"):
+        _engine = create_engine(url, **_pool_options())
+        # Async engine for async routes, so queries do not block the event loop
+        _async_engine = create_async_engine(_make_async_url(url), **_pool_options())
+    else:
+        _engine = create_engine(url, connect_args={"check_same_thread": False})
+        _async_engine = create_async_engine(_make_async_url(url))
+    SessionLocal.configure(bind=_engine)
+    AsyncSessionLocal.configure(bind=_async_engine)
+
+def get_engine():
+    """Sync engine, created (without connecting) on first use"""
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _configure_engines(database_url())
+    return _engine
+
+def get_async_engine():
+    """Async engine for the same database, created on first use"""
+    get_engine()
+    return _async_engine
+
+def init_db():
+    """Wait for the database with bounded retries; called once per process at startup.
+
+    Retries DB_CONNECT_RETRIES times with exponential backoff starting at
+    DB_CONNECT_RETRY_DELAY_SEC, then raises. Only with USE_SQLITE_FALLBACK=true
+    does an unreachable Postgres fall back to the local SQLite database.
+    """
+    engine = get_engine()
+    attempts = max(1, int(os.getenv('DB_CONNECT_RETRIES', '5')))
+    delay = float(os.getenv('DB_CONNECT_RETRY_DELAY_SEC', '1'))
+    for attempt in range(1, attempts + 1):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return engine
+        except OperationalError as exc:
+            if attempt < attempts:
+                wait = min(delay * 2 ** (attempt - 1), 30)
+                print(f"⚠️ Database not reachable (attempt {attempt}/{attempts}), retrying in {wait:.1f}s: {exc.orig}")
+                time.sleep(wait)
+                continue
+            if engine.dialect.name == "postgresql" and os.getenv('USE_SQLITE_FALLBACK', 'false').lower() in ('1', 'true', 'yes'):
+                print("⚠️ Postgres unreachable; USE_SQLITE_FALLBACK is set, using the local SQLite database")
+                engine.dispose()
+                with _engine_lock:
+                    _configure_engines(_make_sqlite_url())
+                return _engine
+            raise
+
+async def dispose_engines() -> None:
+    """Close pooled connections of whichever engines were created"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+    if _replica_router is not None:
+        await _replica_router.async_replica_engine.dispose()
+        _replica_router.replica_engine.dispose()
+
+def __getattr__(name):
+    # Lazy module attributes kept for scripts that do `from database import engine`
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    if name == "DATABASE_URL":
+        return get_engine().url.render_as_string(hide_password=False)
+    if name == "replica_router":
+        return get_replica_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Optional read replica for heavy analytics / dashboard reads
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL') or None
+
+# Seconds behind the primary; 0 when the replica has replayed everything it received
+PG_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaRouter:
+    """Picks the replica for read-only sessions while it is up and caught up.
+
+    Lag is measured at most once per check interval; when the replica is
+    unreachable or further behind than max_lag_seconds, reads go to the
+    primary until a later check succeeds.
+    """
+
+    def __init__(
+        self, replica_engine, primary_engine, max_lag_seconds: float = 5.0, check_interval: float = 10.0,
+        async_replica_engine=None, async_primary_engine=None
+    ):
+        self.replica_engine = replica_engine
+        self.primary_engine = primary_engine
+        self.async_replica_engine = async_replica_engine
+        self.async_primary_engine = async_primary_engine
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self._use_replica = False
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def measure_lag(self) -> float:
+        """Replication lag in seconds (raises if the replica is unreachable)"""
+        with self.replica_engine.connect() as conn:
+            if self.replica_engine.dialect.name == "postgresql":
+                return float(conn.execute(PG_REPLICA_LAG_SQL).scalar() or 0)
+            # Stand-in replicas (e.g. a second SQLite file) have no lag to report
+            conn.execute(text("SELECT 1"))
+            return 0.0
+
+    def probe_due(self) -> bool:
+        """True when the next use_replica() call will measure lag (a blocking round trip)"""
+        with self._lock:
+            return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def use_replica(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._use_replica
+            # Only one caller probes per interval; the rest keep the last answer
+            self._checked_at = now
+
+        from metrics import update_replica_status
+        try:
+            lag = self.measure_lag()
+        except Exception:
+            lag = None
+        healthy = lag is not None and lag <= self.max_lag_seconds
+        with self._lock:
+            self._use_replica = healthy
+        update_replica_status(lag, healthy)
+        return healthy
+
+    def read_engine(self):
+        return self.replica_engine if self.use_replica() else self.primary_engine
+
+    async def read_async_engine(self):
+        """Async counterpart of read_engine; the lag probe runs off the event loop"""
+        healthy = await asyncio.to_thread(self.use_replica) if self.probe_due() else self.use_replica()
+        return self.async_replica_engine if healthy else self.async_primary_engine
+
+_replica_router = None
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    """Router for REPLICA_DATABASE_URL, created on first use (None without a replica)"""
+    global _replica_router
+    if _replica_router is None and REPLICA_DATABASE_URL:
+        primary_engine = get_engine()
+        with _engine_lock:
+            if _replica_router is None:
+                if REPLICA_DATABASE_URL.startswith("sqlite"):
+                    replica_engine = create_engine(REPLICA_DATABASE_URL, connect_args={"check_same_thread": False})
+                    async_replica_engine = create_async_engine(_make_async_url(REPLICA_DATABASE_URL))
+                else:
+                    replica_engine = create_engine(REPLICA_DATABASE_URL, **_pool_options())
+                    async_replica_engine = create_async_engine(_make_async_url(REPLICA_DATABASE_URL), **_pool_options())
+                _replica_router = ReplicaRouter(
+                    replica_engine,
+                    primary_engine,
+                    async_replica_engine=async_replica_engine,
+                    async_primary_engine=get_async_engine(),
+                    max_lag_seconds=float(os.getenv('REPLICA_MAX_LAG_SEC', '5')),
+                    check_interval=float(os.getenv('REPLICA_CHECK_INTERVAL_SEC', '10'))
+                )
+    return _replica_router
 
 Base = declarative_base()
 
-# Redis configuration
-redis_client = redis.Redis(
-    host=os.getenv('REDIS_HOST', 'localhost'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    password=os.getenv('REDIS_PASSWORD') or None,
-    decode_responses=True
+class CircuitOpenError(redis.ConnectionError):
+    """Raised instead of calling Redis while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Skips a failing dependency for a cool-down instead of waiting on every call.
+
+    After failure_threshold consecutive connection errors or timeouts the
+    breaker opens and calls fail fast. Once cooldown_seconds have passed a
+    single trial call is let through (half-open): success closes the
+    breaker, failure opens it for another cool-down.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown_seconds: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        from metrics import record_breaker_rejection
+        record_breaker_rejection(self.name)
+        return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def release_trial(self) -> None:
+        """Give back a half-open trial that ended without an answer, leaving the state as is"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        try:
+            result = fn(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.record_failure()
+            raise
+        except Exception:
+            # The server answered (e.g. a command error), so the connection is healthy
+            self.record_success()
+            raise
+        except BaseException:
+            # Interrupted before an answer: says nothing about the server
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """call() for coroutine functions"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        try:
+            result = await fn(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        except BaseException:
+            # Includes asyncio.CancelledError, e.g. a client disconnect or wait_for timeout
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        from metrics import update_breaker_state
+        update_breaker_state(self.name, state)
+
+
+class BreakerPipeline(redis.client.Pipeline):
+    """Pipeline whose round trip goes through the client's circuit breaker"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute(self, raise_on_error=True):
+        if not self.command_stack and not self.watching:
+            return []
+        try:
+            return self.breaker.call(super().execute, raise_on_error)
+        except CircuitOpenError:
+            self.reset()
+            raise
+
+
+class BreakerRedis(redis.Redis):
+    """Redis client that fails fast while its circuit breaker is open.
+
+    Guards single commands (including EVALSHA scripts and stream commands)
+    and pipelines. Pub/sub connections are long-lived and reconnect on
+    their own, so they bypass the breaker.
+    """
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute_command(self, *args, **options):
+        return self.breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return BreakerPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint, breaker=self.breaker
+        )
+
+
+class AsyncBreakerPipeline(redis.asyncio.client.Pipeline):
+    """asyncio pipeline whose round trip goes through the circuit breaker"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.command_stack and not self.watching:
+            return []
+        try:
+            return await self.breaker.call_async(super().execute, raise_on_error)
+        except CircuitOpenError:
+            await self.reset()
+            raise
+
+
+class AsyncBreakerRedis(redis.asyncio.Redis):
+    """redis.asyncio counterpart of BreakerRedis, for cache access in async routes"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await self.breaker.call_async(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return AsyncBreakerPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint, breaker=self.breaker
+        )
+
+
+def _redis_pool_options() -> dict:
+    """Redis connection settings shared by the sync and asyncio pools"""
+    return {
+        "host": os.getenv('REDIS_HOST', 'localhost'),
+        "port": int(os.getenv('REDIS_PORT', 6379)),
+        "password": os.getenv('REDIS_PASSWORD') or None,
+        "decode_responses": True,
+        "socket_timeout": float(os.getenv('REDIS_SOCKET_TIMEOUT_SEC', '1.0')),
+        "socket_connect_timeout": float(os.getenv('REDIS_CONNECT_TIMEOUT_SEC', '0.5')),
+        "max_connections": int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+        "health_check_interval": 30,
+    }
+
+# Redis configuration: one pool with bounded socket timeouts shared by every
+# cache, rate limiter, registry and stream user in the process
+redis_pool = redis.ConnectionPool(**_redis_pool_options())
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=int(os.getenv('REDIS_BREAKER_FAILURES', '5')),
+    cooldown_seconds=float(os.getenv('REDIS_BREAKER_COOLDOWN_SEC', '10'))
 )
+redis_client = BreakerRedis(connection_pool=redis_pool, breaker=redis_breaker)
 
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
 
+def get_read_db():
+    """Session for read-only analytics queries: the replica when healthy, else the primary"""
+    engine = get_engine()
+    router = get_replica_router()
+    db = SessionLocal(bind=router.read_engine() if router else engine)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+async def get_async_read_db():
+    """Async session for read-only analytics queries: the replica when healthy, else the primary"""
+    router = get_replica_router()
+    engine = await router.read_async_engine() if router else get_async_engine()
+    async with AsyncSessionLocal(bind=engine) as db:
+        yield db
+
 def get_redis():
     return redis_client
+
+# asyncio connections belong to the event loop that opened them
+_async_redis = None
+
+async def get_async_redis():
+    """asyncio Redis client for async routes: same limits and breaker as redis_client"""
+    global _async_redis
+    loop = asyncio.get_running_loop()
+    if _async_redis is None or _async_redis[0] is not loop:
+        pool = redis.asyncio.ConnectionPool(**_redis_pool_options())
+        _async_redis = (loop, AsyncBreakerRedis(connection_pool=pool, breaker=redis_breaker))
+    return _async_redis[1]
+
+async def close_redis() -> None:
+    """Close pooled Redis connections (sync pool and this loop's asyncio pool)"""
+    global _async_redis
+    if _async_redis is not None:
+        await _async_redis[1].aclose()
+        _async_redis = None
+    redis_pool.disconnect()
@@ -0,0 +1,64 @@
+"""
+Bulk import historical punch data from CSV or Parquet exports.
+
+Usage (from backend/):
+    python -m import_punches history.csv
+    python -m import_punches history.parquet --user-column email
+    python -m import_punches history.csv.gz --database-url postgresql://...
+
+Expected columns: user (id, email or username), timestamp, punch_type,
+speed and optionally count. See services/bulk_import.py for how workouts and
+segments are derived.
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+
+from services.bulk_import import BulkImporter, BulkImportError, iter_records
+
+
+def _print_progress(stats):
+    print(
+        f"  {stats['rows_loaded']:,} rows staged "
+        f"({stats['rows_per_second']:,.0f} rows/s, {stats['rows_rejected']:,} rejected)",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import historical punch data")
+    parser.add_argument("path", help="CSV (optionally .gz) or Parquet file")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Input format (default: from extension)")
+    parser.add_argument("--user-column", default="user", help="Column identifying the user (default: user)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per COPY/executemany batch")
+    parser.add_argument("--database-url", default=None, help="Override the configured database")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    importer = BulkImporter(
+        engine,
+        batch_size=args.batch_size,
+        user_column=args.user_column,
+        progress=_print_progress,
+    )
+    try:
+        stats = importer.run(iter_records(args.path, args.format, importer.batch_size))
+    except (BulkImportError, FileNotFoundError) as exc:
+        print(f"❌ Import failed: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"✅ Imported {stats['rows_loaded']:,} punches at {stats['rows_per_second']:,.0f} rows/s")
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
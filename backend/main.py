@@ -5,31 +5,80 @@ from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_
 from prometheus_client.core import CollectorRegistry
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
 import time
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 
-from database import get_db, engine
+from database import get_db, init_db, dispose_engines, close_redis, SessionLocal
 from models import Base, User
 from routes import punches, analytics
 from routes import auth, sessions, notifications, coach, analytics_enhanced
 from routes import workouts, device, auth_flows, leaderboard
 from services.notifications import NotificationService
+from services.workouts import WorkoutService
+from services.partitions import PunchPartitionManager
+from services.archive import PunchArchiver
+from services.ingest_queue import start_ingest_workers, stop_ingest_workers
+from services.active_workouts import active_workout_registry
 from metrics import get_metrics, get_metrics_content_type
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
 # Prometheus metrics are now defined in metrics.py
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-process startup and shutdown; nothing touches the database at import time"""
+    engine = await asyncio.to_thread(init_db)
+    if engine.dialect.name == "sqlite":
+        # Local dev database only: Postgres schema is managed by `alembic upgrade head`,
+        # whose migrations do not run on SQLite
+        Base.metadata.create_all(bind=engine)
+
+    # Set SCHEDULER_ENABLED=false on all but one worker so jobs run once per deployment
+    scheduler = None
+    if os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes"):
+        scheduler = create_scheduler()
+        scheduler.start()
+
+    # Write-behind ingest workers and the active-workout invalidation listener
+    ingest_workers = start_ingest_workers(
+        device.device_service.ingest_queue,
+        SessionLocal,
+        device.device_service.resolve_active_workout,
+        device.device_service.insert_rows
+    )
+    active_workout_registry.start_listener()
+
+    yield
+
+    if scheduler:
+        scheduler.shutdown()
+
+    # Drain buffered device events before exiting
+    stop_ingest_workers(ingest_workers)
+    active_workout_registry.stop_listener()
+
+    # Persist coalesced API key usage timestamps
+    db = next(get_db())
+    try:
+        device.device_service.flush_last_used(db)
+    finally:
+        db.close()
+
+    await dispose_engines()
+    await close_redis()
+
 app = FastAPI(
     title="PunchTracker API",
     description="API for tracking boxing punch sessions with authentication and analytics",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -55,9 +104,6 @@ app.include_router(device.router, prefix="/api", tags=["device"])
 app.include_router(coach.router, prefix="/api/coach", tags=["coach"])
 app.include_router(leaderboard.router, prefix="/api", tags=["leaderboard"])
 
-# Scheduler for weekly reports
-scheduler = BackgroundScheduler()
-
 def send_weekly_reports():
     """Send weekly reports to all users with email enabled"""
     db = next(get_db())
@@ -70,17 +116,90 @@ def send_weekly_reports():
     finally:
         db.close()
 
-# Schedule weekly reports
-cron_schedule = os.getenv("REPORT_SCHEDULE_CRON", "0 8 * * 1")  # Monday 8 AM
-scheduler.add_job(
-    send_weekly_reports,
-    trigger=CronTrigger.from_crontab(cron_schedule),
-    id="weekly_reports",
-    name="Send weekly progress reports",
-    replace_existing=True
-)
+def reap_stale_workouts():
+    """Auto-stop workouts that have been inactive past INACTIVITY_MINUTES"""
+    db = next(get_db())
+    try:
+        WorkoutService().reap_stale_workouts(db)
+    except Exception as e:
+        print(f"Error in workout reaper: {e}")
+    finally:
+        db.close()
 
-scheduler.start()
+def manage_punch_partitions():
+    """Pre-create upcoming monthly punch partitions and expire old ones"""
+    db = next(get_db())
+    try:
+        result = PunchPartitionManager().manage(db)
+        if result["created"] or result["expired"]:
+            print(f"Punch partitions: {result}")
+    except Exception as e:
+        print(f"Error in punch partition job: {e}")
+    finally:
+        db.close()
+
+def archive_old_punches():
+    """Move punches older than PUNCH_ARCHIVE_AFTER_DAYS to cold storage"""
+    db = next(get_db())
+    try:
+        result = PunchArchiver().run(db)
+        if result["rows"]:
+            print(f"Punch archive: {result}")
+    except Exception as e:
+        print(f"Error in punch archive job: {e}")
+    finally:
+        db.close()
+
+def create_scheduler() -> BackgroundScheduler:
+    """Background jobs; built and started by the lifespan, not at import time"""
+    scheduler = BackgroundScheduler()
+
+    # Schedule weekly reports
+    cron_schedule = os.getenv("REPORT_SCHEDULE_CRON", "0 8 * * 1")  # Monday 8 AM
+    scheduler.add_job(
+        send_weekly_reports,
+        trigger=CronTrigger.from_crontab(cron_schedule),
+        id="weekly_reports",
+        name="Send weekly progress reports",
+        replace_existing=True
+    )
+
+    # Schedule the inactivity reaper
+    reaper_interval = int(os.getenv("WORKOUT_REAPER_INTERVAL_SEC", "60"))
+    scheduler.add_job(
+        reap_stale_workouts,
+        trigger=IntervalTrigger(seconds=reaper_interval),
+        id="workout_reaper",
+        name="Auto-stop inactive workouts",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+    # Schedule punch partition maintenance (no-op unless punches is partitioned)
+    partition_cron = os.getenv("PUNCH_PARTITION_CRON", "15 0 * * *")  # daily 00:15
+    scheduler.add_job(
+        manage_punch_partitions,
+        trigger=CronTrigger.from_crontab(partition_cron),
+        id="punch_partitions",
+        name="Manage monthly punch partitions",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+    # Schedule punch archival (no-op unless PUNCH_ARCHIVE_AFTER_DAYS is set)
+    archive_cron = os.getenv("PUNCH_ARCHIVE_CRON", "30 1 * * *")  # daily 01:30
+    scheduler.add_job(
+        archive_old_punches,
+        trigger=CronTrigger.from_crontab(archive_cron),
+        id="punch_archive",
+        name="Archive old punches to cold storage",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    return scheduler
 
 @app.middleware("http")
 async def prometheus_middleware(request, call_next):
@@ -107,11 +226,6 @@ async def metrics():
     """Prometheus metrics endpoint"""
     return Response(get_metrics(), media_type=get_metrics_content_type())
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Shutdown scheduler on app shutdown"""
-    scheduler.shutdown()
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
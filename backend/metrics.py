@@ -47,6 +47,88 @@ ACTIVE_WORKOUTS = Gauge(
     'Number of currently active workouts'
 )
 
+WORKOUTS_REAPED = Counter(
+    'workouts_reaped_total',
+    'Total workouts auto-stopped by the inactivity reaper'
+)
+
+WORKOUT_REAPER_DURATION = Histogram(
+    'workout_reaper_duration_seconds',
+    'Inactivity reaper run duration in seconds'
+)
+
+# Device ingest write-behind metrics
+INGEST_QUEUE_DEPTH = Gauge(
+    'ingest_queue_depth',
+    'Entries in the device ingest stream'
+)
+
+INGEST_FLUSH_DURATION = Histogram(
+    'ingest_flush_duration_seconds',
+    'Time to write one batch from the ingest stream to the database'
+)
+
+INGEST_EVENTS_FLUSHED = Counter(
+    'ingest_events_flushed_total',
+    'Total device events written by ingest workers'
+)
+
+# Punch cold-storage archival metrics
+PUNCHES_ARCHIVED = Counter(
+    'punches_archived_total',
+    'Total punch rows moved from the punches table to archive files'
+)
+
+PUNCH_ARCHIVE_DURATION = Histogram(
+    'punch_archive_duration_seconds',
+    'Punch archival run duration in seconds'
+)
+
+# Read replica metrics
+REPLICA_LAG = Gauge(
+    'db_replica_lag_seconds',
+    'Replication lag of the read replica at the last health check'
+)
+
+REPLICA_IN_USE = Gauge(
+    'db_replica_in_use',
+    '1 while read-only queries are routed to the replica, 0 while they fall back to the primary'
+)
+
+# Circuit breaker metrics (e.g. the shared Redis client)
+BREAKER_STATE = Gauge(
+    'circuit_breaker_state',
+    'Circuit breaker state: 0 closed, 1 half-open, 2 open',
+    ['name']
+)
+
+BREAKER_TRANSITIONS = Counter(
+    'circuit_breaker_transitions_total',
+    'Circuit breaker state changes',
+    ['name', 'state']
+)
+
+BREAKER_REJECTED_CALLS = Counter(
+    'circuit_breaker_rejected_calls_total',
+    'Calls failed fast without contacting the dependency because the breaker was open',
+    ['name']
+)
+
+# Compressed request body metrics
+REQUEST_BODY_COMPRESSED_BYTES = Histogram(
+    'request_body_compressed_bytes',
+    'Compressed request body size in bytes',
+    ['encoding'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+
+REQUEST_BODY_DECOMPRESSED_BYTES = Histogram(
+    'request_body_decompressed_bytes',
+    'Decompressed request body size in bytes',
+    ['encoding'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+
 def record_request_metrics(request: Request, response: Response, duration: float):
     """Record request metrics"""
     method = request.method
@@ -76,6 +158,45 @@ def update_active_workouts(count: int):
     """Update active workouts gauge"""
     ACTIVE_WORKOUTS.set(count)
 
+def record_workouts_reaped(count: int, duration: float):
+    """Record an inactivity reaper run"""
+    WORKOUTS_REAPED.inc(count)
+    WORKOUT_REAPER_DURATION.observe(duration)
+
+def record_punch_archive(rows: int, duration: float):
+    """Record a punch archival run"""
+    PUNCHES_ARCHIVED.inc(rows)
+    PUNCH_ARCHIVE_DURATION.observe(duration)
+
+def record_ingest_flush(events: int, duration: float):
+    """Record an ingest worker batch flush"""
+    INGEST_EVENTS_FLUSHED.inc(events)
+    INGEST_FLUSH_DURATION.observe(duration)
+
+def update_ingest_queue_depth(depth: int):
+    """Update ingest stream depth gauge"""
+    INGEST_QUEUE_DEPTH.set(depth)
+
+def update_replica_status(lag_seconds, in_use: bool):
+    """Update read replica lag and routing gauges"""
+    if lag_seconds is not None:
+        REPLICA_LAG.set(lag_seconds)
+    REPLICA_IN_USE.set(1 if in_use else 0)
+
+def update_breaker_state(name: str, state: str):
+    """Record a circuit breaker state change"""
+    BREAKER_STATE.labels(name=name).set({"closed": 0, "half_open": 1, "open": 2}[state])
+    BREAKER_TRANSITIONS.labels(name=name, state=state).inc()
+
+def record_breaker_rejection(name: str):
+    """Record a call short-circuited by an open breaker"""
+    BREAKER_REJECTED_CALLS.labels(name=name).inc()
+
+def record_request_body_sizes(encoding: str, compressed: int, decompressed: int):
+    """Record compressed vs decompressed size of a request body"""
+    REQUEST_BODY_COMPRESSED_BYTES.labels(encoding=encoding).observe(compressed)
+    REQUEST_BODY_DECOMPRESSED_BYTES.labels(encoding=encoding).observe(decompressed)
+
 def get_metrics():
     """Get Prometheus metrics"""
     return generate_latest()
@@ -3,14 +3,6 @@ ML Service stub for PunchTracker
 TODO: Future milestone - Implement actual ML models for punch classification and fatigue detection
 """
 
-try:
-    import torch  # type: ignore
-except Exception:  # pragma: no cover - optional in local dev
-    torch = None  # type: ignore
-try:
-    import numpy as np  # noqa: F401
-except Exception:  # pragma: no cover
-    np = None  # type: ignore
 from typing import Dict, List, Optional
 
 class PunchMLService:
@@ -20,14 +12,22 @@ class PunchMLService:
     """
     
     def __init__(self):
-        if torch:
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        else:
-            self.device = 'cpu'
+        self._device = None
         # TODO: Load actual trained models here
         self.punch_classifier = None
         self.fatigue_detector = None
     
+    @property
+    def device(self):
+        """Torch device, resolved on first use so importing this module stays cheap"""
+        if self._device is None:
+            try:
+                import torch  # type: ignore
+                self._device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            except Exception:  # pragma: no cover - optional in local dev
+                self._device = 'cpu'
+        return self._device
+
     def classify_punch(self, punch_data: Dict) -> str:
         """
         Classify punch type based on sensor data
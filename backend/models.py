@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Enum, Index, JSON, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -38,6 +38,10 @@ class Session(Base):
     user = relationship("User", back_populates="sessions")
     punches = relationship("Punch", back_populates="session")
 
+    __table_args__ = (
+        Index("ix_sessions_user_id_started_at", "user_id", "started_at"),
+    )
+
 class Workout(Base):
     __tablename__ = "workouts"
 
@@ -53,6 +57,22 @@ class Workout(Base):
     segments = relationship("WorkoutSegment", back_populates="workout", cascade="all, delete-orphan")
     punches = relationship("Punch", back_populates="workout")
 
+    __table_args__ = (
+        Index("ix_workouts_user_id_started_at", "user_id", "started_at"),
+        # Open workouts only; serves active-workout lookups and the reaper
+        Index(
+            "ix_workouts_open_user_id_started_at", "user_id", "started_at",
+            postgresql_where=text("ended_at IS NULL"),
+            sqlite_where=text("ended_at IS NULL"),
+        ),
+        # At most one open workout per user (guards concurrent auto-starts)
+        Index(
+            "ux_workouts_open_user_id", "user_id", unique=True,
+            postgresql_where=text("ended_at IS NULL"),
+            sqlite_where=text("ended_at IS NULL"),
+        ),
+    )
+
 class WorkoutSegment(Base):
     __tablename__ = "workout_segments"
 
@@ -66,23 +86,85 @@ class WorkoutSegment(Base):
     # Relationships
     workout = relationship("Workout", back_populates="segments")
 
+    __table_args__ = (
+        Index("ix_workout_segments_workout_id_started_at", "workout_id", "started_at"),
+    )
+
+class WorkoutStats(Base):
+    """Aggregates of a closed workout, written once at close (services/workout_stats.py)"""
+    __tablename__ = "workout_stats"
+
+    workout_id = Column(Integer, ForeignKey("workouts.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=False)
+    duration_seconds = Column(Integer, nullable=False)
+    total_punches = Column(Integer, nullable=False, default=0)
+    average_speed = Column(Float, nullable=False, default=0.0)  # weighted by punch count
+    max_speed = Column(Float, nullable=False, default=0.0)
+    rounds = Column(Integer, nullable=False, default=0)
+    rests = Column(Integer, nullable=False, default=0)
+    punch_mix = Column(JSON, nullable=False)  # {punch_type: count}
+    segments = Column(JSON, nullable=False)  # segment dicts with punches / average_speed / max_speed
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Punch(Base):
     __tablename__ = "punches"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # On Postgres the table is range-partitioned by month on timestamp and the
+    # primary key is (id, timestamp); see migration 006 and services/partitions.py
+    id = Column(Integer, primary_key=True)
+    # Owner copied from the session / workout on write so per-user queries need no join
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=True)
     workout_id = Column(Integer, ForeignKey("workouts.id"), nullable=True)
     segment_id = Column(Integer, ForeignKey("workout_segments.id"), nullable=True)
     punch_type = Column(String(20), nullable=False)  # jab, cross, hook, uppercut
     speed = Column(Float, nullable=False)  # mph or m/s
     count = Column(Integer, default=1)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     notes = Column(Text, nullable=True)
     
     # Relationships
     session = relationship("Session", back_populates="punches")
     workout = relationship("Workout", back_populates="punches")
 
+    __table_args__ = (
+        Index("ix_punches_workout_id_timestamp", "workout_id", "timestamp"),
+        Index("ix_punches_session_id_timestamp", "session_id", "timestamp"),
+        Index("ix_punches_timestamp", "timestamp"),
+        Index("ix_punches_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+class UserDailyStats(Base):
+    """Per-user daily punch rollup, upserted on every ingest path (services/daily_stats.py)"""
+    __tablename__ = "user_daily_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day of the punch timestamp
+    punch_type = Column(String(20), primary_key=True)  # "*" row holds workout_count only
+    count = Column(Integer, nullable=False, default=0)
+    speed_sum = Column(Float, nullable=False, default=0.0)  # sum of speed * count
+    speed_max = Column(Float, nullable=False, default=0.0)
+    workout_count = Column(Integer, nullable=False, default=0)
+
+class PunchArchive(Base):
+    """Manifest of one user's month of punches moved to an archive file (services/archive.py)"""
+    __tablename__ = "punch_archives"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(Date, nullable=False)  # first day of the UTC month
+    path = Column(String(500), nullable=False)  # relative to PUNCH_ARCHIVE_URI
+    row_count = Column(Integer, nullable=False)
+    min_timestamp = Column(DateTime, nullable=False)  # naive UTC
+    max_timestamp = Column(DateTime, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_punch_archives_user_id_month", "user_id", "month", unique=True),
+    )
+
 class NotificationPrefs(Base):
     __tablename__ = "notification_prefs"
     
@@ -111,6 +193,7 @@ class CoachAthlete(Base):
     
     # Ensure unique coach-athlete relationship
     __table_args__ = (
+        Index("ix_coach_athlete_coach_id_athlete_id", "coach_id", "athlete_id"),
         {"extend_existing": True}
     )
 
@@ -120,6 +203,7 @@ class ApiKey(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String(100), nullable=False)
+    key_prefix = Column(String(16), nullable=True, index=True)  # lookup id, first chars of the secret
     secret_hash = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_used_at = Column(DateTime(timezone=True), nullable=True)
@@ -140,6 +224,11 @@ class EmailVerifyToken(Base):
     # Relationships
     user = relationship("User")
 
+    __table_args__ = (
+        # Equality-only lookups; hash on Postgres, plain b-tree elsewhere
+        Index("ix_email_verify_tokens_token_hash", "token_hash", postgresql_using="hash"),
+    )
+
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
     
@@ -152,3 +241,8 @@ class PasswordResetToken(Base):
     
     # Relationships
     user = relationship("User")
+
+    __table_args__ = (
+        # Equality-only lookups; hash on Postgres, plain b-tree elsewhere
+        Index("ix_password_reset_tokens_token_hash", "token_hash", postgresql_using="hash"),
+    )
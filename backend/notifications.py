@@ -2,14 +2,11 @@
 Notification service for email and webhook alerts
 """
 import os
-import requests
 from datetime import datetime, timedelta
 from typing import Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from models import User, Session, Punch, NotificationPrefs
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -42,6 +39,10 @@ class NotificationService:
 
     def _send_via_sendgrid(self, to_email: str, subject: str, html_content: str) -> bool:
         """Send email via SendGrid"""
+        # Deferred: sendgrid is optional and slow to import
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
         message = Mail(
             from_email=(self.from_email, self.from_name),
             to_emails=to_email,
@@ -73,6 +74,8 @@ class NotificationService:
     def send_webhook(self, webhook_url: str, data: dict) -> bool:
         """Send data to webhook URL (Slack/Discord)"""
         try:
+            import requests
+
             response = requests.post(webhook_url, json=data, timeout=10)
             return response.status_code in [200, 201, 204]
         except Exception as e:
@@ -93,9 +96,9 @@ class NotificationService:
             )
         ).all()
         
-        this_week_punches = db.query(Punch).join(Session).filter(
+        this_week_punches = db.query(Punch).filter(
             and_(
-                Session.user_id == user.id,
+                Punch.user_id == user.id,
                 Punch.timestamp >= week_start
             )
         ).all()
@@ -109,9 +112,9 @@ class NotificationService:
             )
         ).all()
         
-        last_week_punches = db.query(Punch).join(Session).filter(
+        last_week_punches = db.query(Punch).filter(
             and_(
-                Session.user_id == user.id,
+                Punch.user_id == user.id,
                 Punch.timestamp >= two_weeks_ago,
                 Punch.timestamp < week_start
             )
@@ -0,0 +1,49 @@
+"""
+Rebuild the user_daily_stats rollup from punches and workouts.
+
+Usage (from backend/):
+    python -m rebuild_daily_stats
+    python -m rebuild_daily_stats --user 42 --since 2026-01-01
+    python -m rebuild_daily_stats --database-url postgresql://...
+
+Use after restoring data, fixing rows by hand, or any time the rollup is
+suspected to have drifted from the raw punches.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.daily_stats import daily_stats_service
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the per-user daily punch rollup")
+    parser.add_argument("--user", type=int, default=None, help="Only rebuild this user id")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="Only rebuild days from YYYY-MM-DD on")
+    parser.add_argument("--database-url", default=None, help="Override the configured database")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    db = sessionmaker(bind=engine, autoflush=False)()
+    start = time.perf_counter()
+    try:
+        rows = daily_stats_service.rebuild(db, user_id=args.user, since=args.since)
+    finally:
+        db.close()
+
+    print(f"✅ Rebuilt {rows:,} rollup rows in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
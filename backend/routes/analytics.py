@@ -1,60 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db, get_redis
-from models import Punch, Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from database import get_async_db, get_async_redis
+from models import Session
 from schemas import SessionAnalytics
-import json
+from services.session_stats import session_stats_service
 
 router = APIRouter()
 
 @router.get("/analytics/{session_id}", response_model=SessionAnalytics)
-async def get_session_analytics(session_id: int, db: Session = Depends(get_db), redis_client = Depends(get_redis)):
+async def get_session_analytics(session_id: int, db: AsyncSession = Depends(get_async_db), redis_client = Depends(get_async_redis)):
     """Get analytics for a specific session"""
     
-    # Check Redis cache first (best-effort)
+    # Check the incrementally maintained Redis hash first (best-effort)
     try:
-        cached_stats = redis_client.get(f"session_stats:{session_id}")
+        stats = await session_stats_service.read_async(redis_client, session_id)
     except Exception:
-        cached_stats = None
-    if cached_stats:
-        try:
-            stats = json.loads(cached_stats)
-            return SessionAnalytics(
-                session_id=session_id,
-                total_punches=stats["total_punches"],
-                average_speed=stats["average_speed"],
-                punch_types=stats["punch_types"],
-                ml_classification=await get_ml_classification(session_id)  # TODO: Future ML integration
-            )
-        except Exception:
-            # fall through to DB calculation if cache malformed
-            pass
-    
-    # Verify session exists
-    session = db.query(Session).filter(Session.id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Calculate analytics from database
-    punches = db.query(Punch).filter(Punch.session_id == session_id).all()
-    
-    if not punches:
+        stats = None
+    if stats:
         return SessionAnalytics(
             session_id=session_id,
-            total_punches=0,
-            average_speed=0.0,
-            punch_types={},
-            ml_classification=await get_ml_classification(session_id)
+            total_punches=stats["total_punches"],
+            average_speed=session_stats_service.average_speed(stats),
+            punch_types=stats["punch_types"],
+            ml_classification=await get_ml_classification(session_id)  # TODO: Future ML integration
         )
     
-    # Calculate statistics
-    total_punches = sum(punch.count for punch in punches)
-    avg_speed = sum(punch.speed * punch.count for punch in punches) / total_punches
+    # Verify session exists
+    session = await db.scalar(select(Session).where(Session.id == session_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
     
-    punch_types = {}
-    for punch in punches:
-        punch_types[punch.punch_type] = punch_types.get(punch.punch_type, 0) + punch.count
+    # Cache miss: rebuild the hash once from a SQL aggregate
+    stats = await session_stats_service.rebuild_async(db, redis_client, session_id)
     
     # Calculate session duration
     session_duration = None
@@ -64,9 +42,9 @@ async def get_session_analytics(session_id: int, db: Session = Depends(get_db),
     
     return SessionAnalytics(
         session_id=session_id,
-        total_punches=total_punches,
-        average_speed=round(avg_speed, 2),
-        punch_types=punch_types,
+        total_punches=stats["total_punches"],
+        average_speed=session_stats_service.average_speed(stats),
+        punch_types=stats["punch_types"],
         session_duration_minutes=session_duration,
         ml_classification=await get_ml_classification(session_id)
     )
@@ -1,41 +1,34 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
-from database import get_db
-from models import User, Session, Punch
-from schemas import WeeklyAnalytics
+from sqlalchemy import case, func, select
+from database import get_read_db, get_async_read_db, get_async_redis
+from models import User, Session
+from schemas import WeeklyAnalytics, HistoryAnalytics
+from services.daily_stats import daily_stats_service
+from services.session_stats import session_stats_service
+from services.archive import punch_archiver
 from auth import get_current_user
-from datetime import datetime, timedelta
-import redis
+from datetime import date, datetime, time, timedelta
+from typing import Optional
 import json
-import os
 
 router = APIRouter()
 
-# Redis client for caching (optional)
-try:
-    redis_client = redis.Redis(
-        host=os.getenv('REDIS_HOST', 'localhost'),
-        port=int(os.getenv('REDIS_PORT', 6379)),
-        password=os.getenv('REDIS_PASSWORD') or None,
-        decode_responses=True
-    )
-except Exception:  # pragma: no cover
-    redis_client = None
-
 @router.get("/analytics/weekly", response_model=WeeklyAnalytics)
 async def get_weekly_analytics(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db),
+    redis_client = Depends(get_async_redis)
 ):
-    """Get weekly analytics with trends and comparisons"""
+    """Get weekly analytics with trends and comparisons (served from the read replica)"""
     
     # Check cache first
     cache_key = f"weekly:{current_user.id}"
     cached_data = None
     if redis_client:
         try:
-            cached_data = redis_client.get(cache_key)
+            cached_data = await redis_client.get(cache_key)
         except Exception:
             cached_data = None
     if cached_data:
@@ -44,50 +37,44 @@ async def get_weekly_analytics(
         except Exception:
             pass
     
+    analytics = await db.run_sync(_weekly_analytics, current_user.id)
+    
+    # Cache for 5 minutes (best-effort)
+    if redis_client:
+        try:
+            await redis_client.setex(cache_key, 300, json.dumps(analytics.dict()))
+        except Exception:
+            pass
+    
+    return analytics
+
+def _weekly_analytics(db: Session, user_id: int) -> WeeklyAnalytics:
+    """Compute the weekly analytics on a sync session (run through AsyncSession.run_sync)"""
     now = datetime.utcnow()
     week_start = now - timedelta(days=7)
     two_weeks_ago = now - timedelta(days=14)
-    four_weeks_ago = now - timedelta(days=28)
-    
-    # This week's data
-    this_week_sessions = db.query(Session).filter(
-        and_(
-            Session.user_id == current_user.id,
-            Session.started_at >= week_start
-        )
-    ).all()
-    
-    this_week_punches = db.query(Punch).join(Session).filter(
-        and_(
-            Session.user_id == current_user.id,
-            Punch.timestamp >= week_start
-        )
-    ).all()
     
-    # Last week's data
-    last_week_sessions = db.query(Session).filter(
-        and_(
-            Session.user_id == current_user.id,
-            Session.started_at >= two_weeks_ago,
-            Session.started_at < week_start
+    # Session counts for both weeks and the latest session of this week in one query
+    latest_session = select(Session.id).where(
+        Session.user_id == user_id,
+        Session.started_at >= week_start
+    ).order_by(Session.started_at.desc()).limit(1).scalar_subquery()
+    this_week_sessions, last_week_sessions, last_session_id = db.execute(
+        select(
+            func.sum(case((Session.started_at >= week_start, 1), else_=0)),
+            func.sum(case((Session.started_at < week_start, 1), else_=0)),
+            latest_session
+        ).where(
+            Session.user_id == user_id,
+            Session.started_at >= two_weeks_ago
         )
-    ).all()
+    ).one()
     
-    last_week_punches = db.query(Punch).join(Session).filter(
-        and_(
-            Session.user_id == current_user.id,
-            Punch.timestamp >= two_weeks_ago,
-            Punch.timestamp < week_start
-        )
-    ).all()
-    
-    # Calculate this week metrics
-    this_week_total = sum(p.count for p in this_week_punches)
-    this_week_avg_speed = sum(p.speed * p.count for p in this_week_punches) / max(len(this_week_punches), 1)
-    
-    # Calculate last week metrics
-    last_week_total = sum(p.count for p in last_week_punches)
-    last_week_avg_speed = sum(p.speed * p.count for p in last_week_punches) / max(len(last_week_punches), 1)
+    # Punch totals of the four sparkline weeks (this week and last week are the
+    # first two) from one CASE-bucketed query over 28 days of the daily rollup
+    weeks = daily_stats_service.week_buckets(db, user_id, weeks=4)
+    this_week_total, this_week_avg_speed = weeks[0]["total_punches"], weeks[0]["avg_speed"]
+    last_week_total, last_week_avg_speed = weeks[1]["total_punches"], weeks[1]["avg_speed"]
     
     # Calculate percentage change
     if last_week_total > 0:
@@ -96,72 +83,55 @@ async def get_weekly_analytics(
         delta_percent = 100 if this_week_total > 0 else 0
     
     # Generate 4-week sparkline data
-    sparkline_data = []
-    for i in range(4):
-        week_end = now - timedelta(days=i*7)
-        week_start_spark = week_end - timedelta(days=7)
-        
-        week_punches = db.query(Punch).join(Session).filter(
-            and_(
-                Session.user_id == current_user.id,
-                Punch.timestamp >= week_start_spark,
-                Punch.timestamp < week_end
-            )
-        ).all()
-        
-        week_total = sum(p.count for p in week_punches)
-        sparkline_data.append({
-            "date": week_end.strftime("%Y-%m-%d"),
-            "total_punches": week_total
-        })
+    sparkline_data = [
+        {"date": week["last_day"].strftime("%Y-%m-%d"), "total_punches": week["total_punches"]}
+        for week in weeks
+    ]
     
-    # Calculate fatigue proxy (negative slope of speed across last session)
+    # Calculate fatigue proxy (negative slope of speed across last session),
+    # with the regression computed in the database
     fatigue_proxy = None
-    if this_week_sessions:
-        last_session = max(this_week_sessions, key=lambda s: s.started_at)
-        session_punches = db.query(Punch).filter(
-            Punch.session_id == last_session.id
-        ).order_by(Punch.timestamp).all()
-        
-        if len(session_punches) > 1:
-            # Calculate speed trend (simple linear regression slope)
-            speeds = [p.speed for p in session_punches]
-            n = len(speeds)
-            x_values = list(range(n))
-            
-            # Calculate slope
-            x_mean = sum(x_values) / n
-            y_mean = sum(speeds) / n
-            
-            numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(x_values, speeds))
-            denominator = sum((x - x_mean) ** 2 for x in x_values)
-            
-            if denominator != 0:
-                slope = numerator / denominator
-                fatigue_proxy = -slope  # Negative slope indicates fatigue
+    if last_session_id is not None:
+        slope = session_stats_service.speed_slope(db, last_session_id)
+        if slope is not None:
+            fatigue_proxy = -slope  # Negative slope indicates fatigue
     
     # Prepare response
     analytics = WeeklyAnalytics(
         this_week={
             "total_punches": this_week_total,
             "avg_speed": round(this_week_avg_speed, 2),
-            "sessions_count": len(this_week_sessions)
+            "sessions_count": int(this_week_sessions or 0)
         },
         last_week={
             "total_punches": last_week_total,
             "avg_speed": round(last_week_avg_speed, 2),
-            "sessions_count": len(last_week_sessions)
+            "sessions_count": int(last_week_sessions or 0)
         },
         delta_percent=round(delta_percent, 1),
         sparkline_data=sparkline_data,
         fatigue_proxy=round(fatigue_proxy, 3) if fatigue_proxy else None
     )
-    
-    # Cache for 5 minutes (best-effort)
-    if redis_client:
-        try:
-            redis_client.setex(cache_key, 300, json.dumps(analytics.dict()))
-        except Exception:
-            pass
-    
     return analytics
+
+@router.get("/analytics/history", response_model=HistoryAnalytics)
+def get_history_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Totals and punch mix over an arbitrary range of UTC days (default: the last 365).
+
+    Months moved to cold storage are read from their archive files and merged
+    with live rows, so answers do not change when punches are archived.
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    summary = punch_archiver.range_summary(
+        db, current_user.id, datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+    )
+    return HistoryAnalytics(start=start, end=end, **summary)
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, desc
-from database import get_db
+from database import get_db, get_read_db
 from models import User, CoachAthlete, Session, Punch
 from schemas import CoachInvite, CoachInviteResponse, CoachAcceptInvite, AthleteSummary, CoachAthletesResponse
 from auth import get_current_user, get_current_coach
+from services.daily_stats import daily_stats_service, day_window
 from datetime import datetime, timedelta
 import secrets
 import string
@@ -79,11 +80,11 @@ async def accept_invite(
     return {"message": "Invite accepted successfully"}
 
 @router.get("/athletes", response_model=CoachAthletesResponse)
-async def get_athletes(
+def get_athletes(
     current_user: User = Depends(get_current_coach),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Get list of athletes with their latest stats"""
+    """Get list of athletes with their latest stats (served from the read replica)"""
     
     # Get all athletes linked to this coach
     relationships = db.query(CoachAthlete).filter(
@@ -95,8 +96,10 @@ async def get_athletes(
     if not athlete_ids:
         return CoachAthletesResponse(athletes=[])
     
-    # Get athlete summaries with last 7 days stats
+    # Get athlete summaries with last 7 days stats (punch totals from the daily rollup)
     week_ago = datetime.utcnow() - timedelta(days=7)
+    first_day, last_day = day_window(7)
+    punch_totals = daily_stats_service.daily_totals(db, athlete_ids, first_day, last_day)
     
     athletes = []
     for athlete_id in athlete_ids:
@@ -112,15 +115,8 @@ async def get_athletes(
             )
         ).all()
         
-        recent_punches = db.query(Punch).join(Session).filter(
-            and_(
-                Session.user_id == athlete_id,
-                Punch.timestamp >= week_ago
-            )
-        ).all()
-        
-        total_punches = sum(p.count for p in recent_punches)
-        avg_speed = sum(p.speed * p.count for p in recent_punches) / max(len(recent_punches), 1)
+        week = daily_stats_service.window_totals(punch_totals[athlete_id], first_day, last_day)
+        total_punches, avg_speed = week["total_punches"], week["avg_speed"]
         
         last_session = db.query(Session).filter(
             Session.user_id == athlete_id
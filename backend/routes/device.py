@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Header, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User
 from auth import get_current_user
-from schemas import DeviceIngestRequest, ApiKeyCreate, ApiKeyCreateResponse, ApiKeyResponse
+from schemas import DeviceIngestRequest, DeviceEvent, ApiKeyCreate, ApiKeyCreateResponse, ApiKeyResponse
 from services.device import DeviceService
+from services.wire_format import decode_event_frame, is_binary_content_type, iter_ndjson_lines, LineTooLongError
+from services.compression import decompress_or_http_error, decompress_stream, UnsupportedEncodingError
 from typing import List, Optional
+import json
+import os
+import struct
 
 router = APIRouter()
 device_service = DeviceService()
@@ -13,30 +18,30 @@ device_service = DeviceService()
 @router.post("/device/keys", response_model=ApiKeyCreateResponse)
 async def create_api_key(
     key_data: ApiKeyCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new API key for device ingestion"""
-    result = device_service.create_api_key(db, current_user.id, key_data.name)
+    result = await db.run_sync(device_service.create_api_key, current_user.id, key_data.name)
     return ApiKeyCreateResponse(**result)
 
 @router.get("/device/keys", response_model=List[ApiKeyResponse])
 async def get_api_keys(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all API keys for the current user"""
-    keys = device_service.get_user_api_keys(db, current_user.id)
+    keys = await db.run_sync(device_service.get_user_api_keys, current_user.id)
     return [ApiKeyResponse(**key) for key in keys]
 
 @router.delete("/device/keys/{key_id}")
 async def delete_api_key(
     key_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete an API key"""
-    success = device_service.delete_api_key(db, current_user.id, key_id)
+    success = await db.run_sync(device_service.delete_api_key, current_user.id, key_id)
     if not success:
         raise HTTPException(status_code=404, detail="API key not found")
     
@@ -45,40 +50,182 @@ async def delete_api_key(
 @router.post("/device/ingest")
 async def ingest_device_data(
     request: Request,
+    response: Response,
     x_signature: Optional[str] = Header(None, alias="X-Signature"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Ingest device data via HMAC-signed webhook"""
+    """Ingest device data via HMAC-signed webhook (JSON or binary frame)"""
     # Get raw body for signature verification
     body = await request.body()
     
     if not x_signature:
         raise HTTPException(status_code=401, detail="Missing signature header")
     
-    # Parse request data
+    # HMAC covers the bytes as sent; only the parser sees the decompressed body
+    payload = decompress_or_http_error(body, request.headers.get("content-encoding"))
+    
+    # Parse request data: binary frames skip per-event model construction
+    binary = is_binary_content_type(request.headers.get("content-type"))
     try:
-        import json
-        data = json.loads(body.decode('utf-8'))
-        ingest_request = DeviceIngestRequest(**data)
+        if binary:
+            api_key, rows = decode_event_frame(payload)
+        else:
+            data = json.loads(payload.decode('utf-8'))
+            ingest_request = DeviceIngestRequest(**data)
+            api_key = ingest_request.user_api_key
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid request format: {str(e)}")
     
     # Verify API key
-    api_key_record = device_service.verify_api_key(db, ingest_request.user_api_key)
+    api_key_record = await db.run_sync(device_service.verify_api_key, api_key)
     if not api_key_record:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
     # Check rate limit
-    if not device_service.check_rate_limit(api_key_record.id):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    rate_limit = await device_service.check_rate_limit_async(api_key_record.id, api_key_record.user_id)
+    if not rate_limit:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=rate_limit.headers())
+    response.headers.update(rate_limit.headers())
     
-    # Verify HMAC signature
-    if not device_service.verify_hmac_signature(body, x_signature, ingest_request.user_api_key):
+    # Verify HMAC signature over the raw (possibly compressed) bytes
+    if not device_service.verify_hmac_signature(body, x_signature, api_key):
         raise HTTPException(status_code=401, detail="Invalid signature")
     
     # Process events
     try:
-        result = device_service.process_device_events(db, api_key_record.user_id, ingest_request.events)
+        if binary:
+            return await db.run_sync(device_service.process_device_rows, api_key_record.user_id, rows)
+        result = await db.run_sync(device_service.process_device_events, api_key_record.user_id, ingest_request.events)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process events: {str(e)}")
+
+@router.post("/device/ingest/stream")
+async def ingest_device_stream(
+    request: Request,
+    response: Response,
+    x_signature: Optional[str] = Header(None, alias="X-Signature"),
+    x_api_key: Optional[str] = Header(None, alias="X-Api-Key"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ingest a large NDJSON upload (one event per line) with bounded memory.
+
+    The signature is computed incrementally over the body as sent and rows
+    are only committed once it matches.
+    """
+    if not x_signature:
+        raise HTTPException(status_code=401, detail="Missing signature header")
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="Missing API key header")
+    
+    # Verify API key
+    api_key_record = await db.run_sync(device_service.verify_api_key, x_api_key)
+    if not api_key_record:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    # Check rate limit
+    rate_limit = await device_service.check_rate_limit_async(api_key_record.id, api_key_record.user_id)
+    if not rate_limit:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=rate_limit.headers())
+    response.headers.update(rate_limit.headers())
+    
+    mac = device_service.new_hmac(x_api_key)
+    
+    async def signed_body():
+        async for chunk in request.stream():
+            mac.update(chunk)
+            yield chunk
+    
+    lines = iter_ndjson_lines(
+        decompress_stream(signed_body(), request.headers.get("content-encoding")),
+        int(os.getenv("NDJSON_MAX_LINE_BYTES", "65536"))
+    )
+    try:
+        result = await device_service.process_ndjson_stream(db, api_key_record.user_id, lines)
+    except LineTooLongError as e:
+        await db.rollback()
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedEncodingError as e:
+        await db.rollback()
+        raise HTTPException(status_code=415, detail=str(e))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid stream: {str(e)}")
+    
+    # Verify HMAC signature over the whole upload before committing anything
+    if not device_service.verify_hmac_digest(mac, x_signature):
+        await db.rollback()
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
+    await db.commit()
+    return result
+
+@router.websocket("/device/ws")
+async def device_websocket(websocket: WebSocket, db: AsyncSession = Depends(get_async_db)):
+    """Persistent ingestion channel for connected gloves.
+
+    The API key (X-Api-Key header or api_key query param) is verified once at
+    connect; the active workout is resolved through the registry for every
+    batch, so a workout stopped mid-connection is not written to. Each frame is
+    one batch:
+    - text: {"seq": n, "events": [DeviceEvent, ...]}
+    - binary: 4-byte little-endian seq followed by a binary event frame
+    and is acknowledged with {"type": "ack", "seq": n, "punches_created": k}.
+    """
+    api_key = websocket.headers.get("x-api-key") or websocket.query_params.get("api_key")
+    api_key_record = await db.run_sync(device_service.verify_api_key, api_key) if api_key else None
+    if not api_key_record:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    workout_id = (await device_service.resolve_active_workout_async(db, api_key_record.user_id)).id
+    await db.commit()
+    await websocket.send_json({"type": "ready", "workout_id": workout_id})
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            seq = None
+            try:
+                if message.get("bytes") is not None:
+                    frame = message["bytes"]
+                    (seq,) = struct.unpack_from("<I", frame, 0)
+                    _, rows = decode_event_frame(frame[4:])
+                else:
+                    data = json.loads(message["text"])
+                    seq = data.get("seq")
+                    rows = [
+                        {"timestamp": e.ts, "punch_type": e.punch_type, "speed": e.speed, "count": e.count}
+                        for e in (DeviceEvent(**event) for event in data["events"])
+                    ]
+            except Exception as e:
+                await websocket.send_json({"type": "error", "seq": seq, "detail": f"Invalid frame: {str(e)}"})
+                continue
+            
+            rate_limit = await device_service.check_rate_limit_async(api_key_record.id, api_key_record.user_id)
+            if not rate_limit:
+                await websocket.send_json({
+                    "type": "error",
+                    "seq": seq,
+                    "detail": "Rate limit exceeded",
+                    "retry_after": rate_limit.retry_after
+                })
+                continue
+            
+            try:
+                # Usually a local registry hit; auto-starts a new workout after a stop or reap
+                workout_id = (await device_service.resolve_active_workout_async(db, api_key_record.user_id)).id
+                created = await db.run_sync(device_service.insert_rows, api_key_record.user_id, workout_id, rows)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                await websocket.send_json({"type": "error", "seq": seq, "detail": f"Failed to process events: {str(e)}"})
+                continue
+            
+            await websocket.send_json({"type": "ack", "seq": seq, "workout_id": workout_id, "punches_created": created})
+    except WebSocketDisconnect:
+        pass
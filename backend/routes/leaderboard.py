@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_read_db
 from models import User
 from auth import get_current_user
 from schemas import LeaderboardResponse, LeaderboardEntry
@@ -11,12 +11,12 @@ router = APIRouter()
 leaderboard_service = LeaderboardService()
 
 @router.get("/coach/leaderboard", response_model=LeaderboardResponse)
-async def get_leaderboard(
+def get_leaderboard(
     range: str = Query("week", description="Time range for leaderboard"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get weekly leaderboard for coach's athletes"""
+    """Get weekly leaderboard for coach's athletes (served from the read replica)"""
     if current_user.role != "coach":
         raise HTTPException(status_code=403, detail="Only coaches can access leaderboard")
     
@@ -1,34 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db, get_redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert, select
+from database import get_async_db, get_async_redis
 from models import Punch, Session, Workout
 from datetime import datetime, timedelta
 import os
-from schemas import PunchCreate, PunchResponse
-import json
+from schemas import PunchCreate, PunchResponse, PunchBatchResponse
+from services.session_stats import session_stats_service
+from services.daily_stats import daily_stats_service
+from services.compression import DecompressingRoute
+from services.workouts import WorkoutService
+from typing import List
 
-router = APIRouter()
+router = APIRouter(route_class=DecompressingRoute)
+workout_service = WorkoutService()
+
+def _batch_max() -> int:
+    return int(os.getenv("PUNCH_BATCH_MAX", "1000"))
 
 @router.post("/punches", response_model=PunchResponse)
-async def create_punch(punch: PunchCreate, db: Session = Depends(get_db), redis_client = Depends(get_redis)):
+async def create_punch(punch: PunchCreate, db: AsyncSession = Depends(get_async_db), redis_client = Depends(get_async_redis)):
     """Create a new punch record"""
     
     # Verify session exists
-    session = db.query(Session).filter(Session.id == punch.session_id).first()
+    session = await db.scalar(select(Session).where(Session.id == punch.session_id))
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Auto-start workout if none active for this user
-    active_workout = db.query(Workout).filter(Workout.user_id == session.user_id, Workout.ended_at == None).first()
-    if not active_workout:
-        active_workout = Workout(user_id=session.user_id, started_at=datetime.utcnow(), auto_detected=True)
-        db.add(active_workout)
-        db.commit()
-        db.refresh(active_workout)
+    # Auto-start workout if none active for this user (registry lookup, no DB hit when cached)
+    active_workout = await workout_service.get_or_start_workout_async(db, session.user_id)
 
     # Create punch record
     db_punch = Punch(
+        user_id=session.user_id,
         session_id=punch.session_id,
         workout_id=active_workout.id,
         punch_type=punch.punch_type,
@@ -38,75 +42,113 @@ async def create_punch(punch: PunchCreate, db: Session = Depends(get_db), redis_
     )
     
     db.add(db_punch)
-    db.commit()
-    db.refresh(db_punch)
+    await db.run_sync(daily_stats_service.add_punches, session.user_id, [
+        {"timestamp": None, "punch_type": punch.punch_type, "speed": punch.speed, "count": punch.count}
+    ])
+    await db.commit()
+    await db.refresh(db_punch)
     
-    # Update Redis cache with latest session stats (best-effort)
+    # Update cached session stats and invalidate the workout summary in one
+    # round trip (best-effort)
     try:
-        await update_session_cache(punch.session_id, db, redis_client)
+        await update_session_cache(
+            db, redis_client, {punch.session_id: [db_punch]}, db_punch.id, [f"workout:summary:{active_workout.id}"]
+        )
     except Exception:
         # If Redis is not available, ignore and continue
         pass
 
-    # Invalidate workout summary cache for this workout (best-effort)
-    try:
-        if redis_client and active_workout:
-            redis_client.delete(f"workout:summary:{active_workout.id}")
-    except Exception:
-        pass
+    # Inactive workouts are auto-stopped by the scheduled reaper (services/workouts.py)
+    return db_punch
+
+@router.post("/punches/batch", response_model=PunchBatchResponse)
+async def create_punches_batch(punches: List[PunchCreate], db: AsyncSession = Depends(get_async_db), redis_client = Depends(get_async_redis)):
+    """Create many punch records in a single transaction.
+
+    Sessions and the active workout are resolved once per batch, all rows are
+    written with one multi-row INSERT, and caches are refreshed once.
+    """
+    if not punches:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(punches) > _batch_max():
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {_batch_max()} punches")
+
+    # Verify all referenced sessions exist with one query
+    session_ids = sorted({p.session_id for p in punches})
+    sessions = (await db.scalars(select(Session).where(Session.id.in_(session_ids)))).all()
+    if len(sessions) != len(session_ids):
+        raise HTTPException(status_code=404, detail="Session not found")
+    user_ids = {s.user_id for s in sessions}
+    if len(user_ids) != 1:
+        raise HTTPException(status_code=400, detail="Batch must belong to a single user")
+    user_id = user_ids.pop()
+
+    # Auto-start workout if none active for this user
+    active_workout = await workout_service.get_or_start_workout_async(db, user_id)
+
+    rows = [
+        {
+            "user_id": user_id,
+            "session_id": p.session_id,
+            "workout_id": active_workout.id,
+            "punch_type": p.punch_type,
+            "speed": p.speed,
+            "count": p.count,
+            "notes": p.notes,
+        }
+        for p in punches
+    ]
+    punch_ids = (await db.scalars(insert(Punch).returning(Punch.id), rows)).all()
+    await db.run_sync(daily_stats_service.add_punches, user_id, rows)
+    await db.commit()
 
-    # Auto-stop workout if inactivity timer passes will be handled lazily: update last punch time
+    # Refresh caches once per batch, all sessions in one round trip (best-effort)
     try:
-        inactivity_mins = int(os.getenv('INACTIVITY_MINUTES', '3'))
-        # close any workouts for which last punch older than threshold
-        threshold = datetime.utcnow() - timedelta(minutes=inactivity_mins)
-        stale = db.query(Workout).filter(Workout.ended_at == None).all()
-        for w in stale:
-            last = db.query(Punch).filter(Punch.workout_id == w.id).order_by(Punch.timestamp.desc()).first()
-            if last and last.timestamp < threshold:
-                w.ended_at = datetime.utcnow()
-        db.commit()
+        await update_session_cache(
+            db,
+            redis_client,
+            {session_id: [p for p in punches if p.session_id == session_id] for session_id in session_ids},
+            min(punch_ids),
+            [f"workout:summary:{active_workout.id}"]
+        )
     except Exception:
         pass
-    
-    return db_punch
+
+    return PunchBatchResponse(
+        workout_id=active_workout.id,
+        punches_created=len(rows),
+        session_ids=session_ids
+    )
 
 @router.get("/punches/session/{session_id}", response_model=list[PunchResponse])
-async def get_session_punches(session_id: int, db: Session = Depends(get_db)):
-    """Get all punches for a specific session"""
-    
-    punches = db.query(Punch).filter(Punch.session_id == session_id).all()
-    return punches
+async def get_session_punches(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get all punches for a specific session, including rows moved to the punch archive"""
+    return await db.run_sync(_session_punches, session_id)
 
-async def update_session_cache(session_id: int, db: Session, redis_client):
-    """Update Redis cache with latest session statistics"""
-    
-    # Calculate session stats
-    punches = db.query(Punch).filter(Punch.session_id == session_id).all()
-    
-    if punches:
-        total_punches = sum(punch.count for punch in punches)
-        avg_speed = sum(punch.speed * punch.count for punch in punches) / total_punches
-        
-        punch_types = {}
-        for punch in punches:
-            punch_types[punch.punch_type] = punch_types.get(punch.punch_type, 0) + punch.count
-        
-        session_stats = {
-            "session_id": session_id,
-            "total_punches": total_punches,
-            "average_speed": round(avg_speed, 2),
-            "punch_types": punch_types,
-            "last_updated": punches[-1].timestamp.isoformat()
-        }
-        
-        # Cache for 1 hour (best-effort)
+def _session_punches(db, session_id: int) -> list:
+    punches = db.scalars(select(Punch).where(Punch.session_id == session_id)).all()
+    archived = session_stats_service.archived_punches(db, session_id)
+    if archived is None:
+        return punches
+    # Archived months are older than any live row
+    return archived.to_pylist() + list(punches)
+
+async def update_session_cache(db: AsyncSession, redis_client, punches_by_session: dict, first_punch_id: int, invalidate: list = ()):
+    """Apply new punches (ids from first_punch_id up) to the cached session aggregates in Redis and drop the `invalidate` keys"""
+    try:
+        await session_stats_service.increment_many_async(
+            db,
+            redis_client,
+            {
+                session_id: [(p.punch_type, p.speed, p.count) for p in punches]
+                for session_id, punches in punches_by_session.items()
+            },
+            first_punch_id,
+            invalidate
+        )
+    except Exception:
+        # Redis unavailable or stale value under a key; drop them so readers rebuild
         try:
-            redis_client.setex(
-                f"session_stats:{session_id}", 
-                3600, 
-                json.dumps(session_stats)
-            )
+            await redis_client.delete(*[session_stats_service.cache_key(s) for s in punches_by_session], *invalidate)
         except Exception:
-            # Redis unavailable; skip caching
             pass
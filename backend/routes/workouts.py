@@ -1,14 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timedelta
 import os
 
-from database import get_db, get_redis
-from models import Workout, WorkoutSegment, Punch, User
+from database import get_async_db, get_async_redis
+from models import Workout, WorkoutSegment, WorkoutStats, Punch, User
 from auth import get_current_user
 from schemas import WorkoutStartResponse, WorkoutSummary, WorkoutTemplate, WorkoutStartRequest
+from services.workouts import WorkoutService
+from services.workout_stats import workout_stats_service
+from services.active_workouts import active_workout_registry
 
 router = APIRouter()
+workout_service = WorkoutService()
 
 def _inactivity_minutes() -> int:
     return int(os.getenv("INACTIVITY_MINUTES", "3"))
@@ -51,53 +57,59 @@ async def get_workout_templates():
     return WORKOUT_TEMPLATES
 
 @router.post("/workouts/start", response_model=WorkoutStartResponse)
-async def start_workout(request: WorkoutStartRequest = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    active = db.query(Workout).filter(Workout.user_id == current_user.id, Workout.ended_at == None).first()
+async def start_workout(request: WorkoutStartRequest = None, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    active = await workout_service.get_active_workout_async(db, current_user.id)
     if active:
         template = WORKOUT_TEMPLATES.get(request.template_name) if request and request.template_name else None
         return {"id": active.id, "started_at": active.started_at, "template": template}
     
-    w = Workout(user_id=current_user.id, auto_detected=False, started_at=datetime.utcnow())
-    db.add(w)
-    db.commit()
-    db.refresh(w)
+    w = await workout_service.start_workout_async(db, current_user.id, auto_detected=False)
     
     # If template specified, create planned segments
     template = None
     if request and request.template_name:
         template = WORKOUT_TEMPLATES.get(request.template_name)
         if template:
-            _create_planned_segments(db, w, template)
+            await db.run_sync(_create_planned_segments, w, template)
     
     return {"id": w.id, "started_at": w.started_at, "template": template}
 
 @router.post("/workouts/stop", response_model=WorkoutStartResponse)
-async def stop_workout(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    active = db.query(Workout).filter(Workout.user_id == current_user.id, Workout.ended_at == None).first()
+async def stop_workout(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    ref = await workout_service.get_active_workout_async(db, current_user.id)
+    active = await db.scalar(select(Workout).where(Workout.id == ref.id, Workout.ended_at == None)) if ref else None
     if not active:
+        await active_workout_registry.clear_async(current_user.id)
         # Gracefully return the most recent workout so the UI can navigate
-        last = (
-            db.query(Workout)
-            .filter(Workout.user_id == current_user.id)
+        last = await db.scalar(
+            select(Workout)
+            .where(Workout.user_id == current_user.id)
             .order_by(Workout.started_at.desc())
-            .first()
+            .limit(1)
         )
         if not last:
             raise HTTPException(status_code=400, detail="No active workout")
         return {"id": last.id, "started_at": last.started_at}
     active.ended_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await active_workout_registry.clear_async(current_user.id)
 
-    # Generate segments upon stop (best-effort)
+    # Generate segments and store the closed workout's stats (best-effort;
+    # the summary computes missing stats on first read)
     try:
-        _generate_segments_for_workout(db, active)
+        await db.run_sync(_generate_segments_for_workout, active)
     except Exception:
-        pass
+        await db.rollback()
+    try:
+        await db.run_sync(workout_stats_service.record, active)
+    except Exception:
+        await db.rollback()
     return {"id": active.id, "started_at": active.started_at}
 
 @router.get("/workouts/active", response_model=WorkoutStartResponse | None)
-async def active_workout(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    active = db.query(Workout).filter(Workout.user_id == current_user.id, Workout.ended_at == None).first()
+async def active_workout(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    # Polled by the UI every few seconds; served from the active-workout registry
+    active = await workout_service.get_active_workout_async(db, current_user.id)
     if not active:
         return None
     return {"id": active.id, "started_at": active.started_at}
@@ -134,110 +146,116 @@ def _build_summary(workout: Workout, punches: list[Punch]) -> dict:
     }
 
 @router.get("/workouts/{workout_id}/summary", response_model=WorkoutSummary)
-async def workout_summary(workout_id: int, db: Session = Depends(get_db), redis = Depends(get_redis), current_user: User = Depends(get_current_user)):
+async def workout_summary(workout_id: int, db: AsyncSession = Depends(get_async_db), redis = Depends(get_async_redis), current_user: User = Depends(get_current_user)):
+    # Closed workouts never change: answer from their workout_stats row
+    stats = await db.get(WorkoutStats, workout_id)
+    if stats and stats.user_id == current_user.id:
+        return WorkoutSummary(**workout_stats_service.to_summary(stats))
+
     cache_key = f"workout:summary:{workout_id}"
     cached = None
     try:
-        cached = redis.get(cache_key)
+        cached = await redis.get(cache_key)
     except Exception:
         cached = None
     if cached:
         import json
         return WorkoutSummary(**json.loads(cached))
-    w = db.query(Workout).filter(Workout.id == workout_id, Workout.user_id == current_user.id).first()
+    w = await db.scalar(
+        select(Workout)
+        .where(Workout.id == workout_id, Workout.user_id == current_user.id)
+        .options(selectinload(Workout.segments))
+    )
     if not w:
         raise HTTPException(status_code=404, detail="Workout not found")
-    punches = db.query(Punch).filter(Punch.workout_id == w.id).all()
+    if w.ended_at:
+        # Closed before stats were recorded (or recording failed): store them now
+        stats = await db.run_sync(workout_stats_service.record, w)
+        return WorkoutSummary(**workout_stats_service.to_summary(stats))
+    punches = (await db.scalars(select(Punch).where(Punch.workout_id == w.id))).all()
     data = _build_summary(w, punches)
     try:
         import json
-        redis.setex(cache_key, 300, json.dumps(data, default=str))
+        await redis.setex(cache_key, 300, json.dumps(data, default=str))
     except Exception:
         pass
     return WorkoutSummary(**data)
 
 
 def _generate_segments_for_workout(db: Session, workout: Workout) -> None:
-    """Create simple active/rest segments based on punch gaps.
-
-    Rules:
-    - A gap >= SEGMENT_REST_MIN_S counts as a rest segment between punches
-    - Active segments are the punch clusters between rests
-    - Optionally drop too-short segments via SEGMENT_ACTIVE_MIN_S (default 40s)
-    """
-    rest_gap_s = int(os.getenv("SEGMENT_REST_MIN_S", "15"))
-    min_active_s = int(os.getenv("SEGMENT_ACTIVE_MIN_S", "40"))
-
+    """Create simple active/rest segments based on punch gaps (see _segment_spans)"""
     # Do not duplicate if segments already exist
     existing = db.query(WorkoutSegment).filter(WorkoutSegment.workout_id == workout.id).count()
     if existing:
         return
 
-    # Fetch punches ordered
-    punches = (
-        db.query(Punch)
+    # Fetch punch timestamps ordered
+    timestamps = [
+        ts for (ts,) in db.query(Punch.timestamp)
         .filter(Punch.workout_id == workout.id)
         .order_by(Punch.timestamp.asc())
         .all()
-    )
-    if not punches:
+    ]
+    if not timestamps:
         return
 
-    segments_to_add: list[WorkoutSegment] = []
+    segments_to_add = [
+        WorkoutSegment(
+            workout_id=workout.id,
+            kind=kind,
+            started_at=started_at,
+            ended_at=ended_at,
+            target_seconds=None,
+        )
+        for kind, started_at, ended_at in _segment_spans(timestamps, workout.ended_at)
+    ]
+    if segments_to_add:
+        db.add_all(segments_to_add)
+        db.commit()
+
+
+def _segment_spans(timestamps: list, workout_ended_at=None) -> list:
+    """Split ordered punch timestamps into (kind, started_at, ended_at) spans.
+
+    Rules:
+    - A gap >= SEGMENT_REST_MIN_S counts as a rest segment between punches
+    - Active segments are the punch clusters between rests
+    - Optionally drop too-short segments via SEGMENT_ACTIVE_MIN_S (default 40s)
+    """
+    rest_gap_s = int(os.getenv("SEGMENT_REST_MIN_S", "15"))
+    min_active_s = int(os.getenv("SEGMENT_ACTIVE_MIN_S", "40"))
+    if not timestamps:
+        return []
+
+    spans = []
 
     # Initialize first active segment
-    current_start = punches[0].timestamp
-    last_ts = punches[0].timestamp
+    current_start = timestamps[0]
+    last_ts = timestamps[0]
 
-    for p in punches[1:]:
-        gap = (p.timestamp - last_ts).total_seconds()
+    for ts in timestamps[1:]:
+        gap = (ts - last_ts).total_seconds()
         if gap >= rest_gap_s:
             # close active at last_ts
             active_end = last_ts
             active_duration = (active_end - current_start).total_seconds()
             if active_duration >= max(1, min_active_s):
-                segments_to_add.append(
-                    WorkoutSegment(
-                        workout_id=workout.id,
-                        kind="active",
-                        started_at=current_start,
-                        ended_at=active_end,
-                        target_seconds=None,
-                    )
-                )
-            # insert rest from last_ts to p.timestamp
-            segments_to_add.append(
-                WorkoutSegment(
-                    workout_id=workout.id,
-                    kind="rest",
-                    started_at=active_end,
-                    ended_at=p.timestamp,
-                    target_seconds=None,
-                )
-            )
+                spans.append(("active", current_start, active_end))
+            # insert rest from last_ts to this punch
+            spans.append(("rest", active_end, ts))
             # start new active at this punch
-            current_start = p.timestamp
-        last_ts = p.timestamp
+            current_start = ts
+        last_ts = ts
 
     # Close trailing active up to workout end (or last punch)
-    tail_end = workout.ended_at or last_ts
+    tail_end = workout_ended_at or last_ts
     if tail_end < last_ts:
         tail_end = last_ts
     tail_duration = (tail_end - current_start).total_seconds()
     if tail_duration >= 1:
-        segments_to_add.append(
-            WorkoutSegment(
-                workout_id=workout.id,
-                kind="active",
-                started_at=current_start,
-                ended_at=tail_end,
-                target_seconds=None,
-            )
-        )
+        spans.append(("active", current_start, tail_end))
 
-    if segments_to_add:
-        db.add_all(segments_to_add)
-        db.commit()
+    return spans
 
 
 def _create_planned_segments(db: Session, workout: Workout, template: WorkoutTemplate) -> None:
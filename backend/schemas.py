@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 from models import UserRole
 
@@ -36,6 +36,11 @@ class PunchCreate(BaseModel):
     count: int = 1
     notes: Optional[str] = None
 
+class PunchBatchResponse(BaseModel):
+    workout_id: int
+    punches_created: int
+    session_ids: List[int]
+
 class WorkoutTemplate(BaseModel):
     name: str
     rounds: int
@@ -62,6 +67,8 @@ class WorkoutSummary(BaseModel):
     rounds: int
     rests: int
     segments: list
+    max_speed: Optional[float] = None  # closed workouts only
+    punch_mix: Optional[dict] = None  # closed workouts only
 
 class PunchResponse(BaseModel):
     id: int
@@ -115,6 +122,15 @@ class WeeklyAnalytics(BaseModel):
     sparkline_data: List[dict]
     fatigue_proxy: Optional[float] = None
 
+class HistoryAnalytics(BaseModel):
+    start: date
+    end: date
+    total_punches: int
+    average_speed: float
+    max_speed: float
+    punch_types: dict
+    archived_rows: int
+
 # Notification schemas
 class NotificationPrefsUpdate(BaseModel):
     email_enabled: Optional[bool] = None
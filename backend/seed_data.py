@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal, engine
 from models import Base, User, Session, Punch
+from services.daily_stats import daily_stats_service
 from datetime import datetime, timedelta
 import random
 
@@ -44,6 +45,7 @@ def create_sample_data():
         
         for i in range(50):  # 50 sample punches
             punch = Punch(
+                user_id=user.id,
                 session_id=session.id,
                 punch_type=random.choice(punch_types),
                 speed=random.uniform(15.0, 35.0),  # 15-35 mph
@@ -54,6 +56,7 @@ def create_sample_data():
             db.add(punch)
         
         db.commit()
+        daily_stats_service.rebuild(db, user_id=user.id)
         
         print(f"✅ Created sample data:")
         print(f"   - User: {user.username} (ID: {user.id})")
@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Tuple, NamedTuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import get_redis, get_async_redis
+from models import Workout
+
+# Redis value stored for users known to have no open workout
+NO_WORKOUT = "none"
+
+
+class ActiveWorkoutRef(NamedTuple):
+    id: int
+    started_at: datetime
+
+
+class ActiveWorkoutRegistry:
+    """user_id -> open workout, cached in Redis and in process.
+
+    Reads go local cache -> Redis -> database. Every change (start, stop,
+    auto-start, reaping) writes Redis and publishes the user id on
+    INVALIDATE_CHANNEL so other workers drop their local entry.
+
+    The *_async variants serve async routes: they use the shared asyncio
+    Redis pool and an AsyncSession, so a cache miss never blocks the loop.
+
+    An entry can outlive its workout (a worker's local copy until local_ttl,
+    a clear() lost while Redis was down), so writers confirm the workout is
+    still open before inserting and evict() the entry when it is not.
+    """
+
+    INVALIDATE_CHANNEL = "active_workout:invalidate"
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or get_redis()
+        self.redis_ttl = int(os.getenv("ACTIVE_WORKOUT_TTL_SEC", "300"))
+        self.local_ttl = float(os.getenv("ACTIVE_WORKOUT_LOCAL_TTL_SEC", "10"))
+        # user_id -> (ActiveWorkoutRef or None, expires_at monotonic)
+        self._local: Dict[int, Tuple[Optional[ActiveWorkoutRef], float]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def cache_key(self, user_id: int) -> str:
+        return f"active_workout:{user_id}"
+
+    def get(self, db: Session, user_id: int) -> Optional[ActiveWorkoutRef]:
+        """Return the user's open workout without touching the database when cached"""
+        found, ref = self._get_local(user_id)
+        if found:
+            return ref
+
+        try:
+            cached = self.redis_client.get(self.cache_key(user_id))
+        except Exception:
+            cached = None
+        if cached is not None:
+            ref = self._decode(cached)
+            self._set_local(user_id, ref)
+            return ref
+
+        row = db.execute(self._open_workout_query(user_id)).first()
+        ref = ActiveWorkoutRef(id=row.id, started_at=row.started_at) if row else None
+        # Populate only if absent so a concurrent start/stop is never overwritten
+        self._store(user_id, ref, publish=False, only_if_missing=True)
+        return ref
+
+    async def get_async(self, db: AsyncSession, user_id: int) -> Optional[ActiveWorkoutRef]:
+        """get() for async routes"""
+        found, ref = self._get_local(user_id)
+        if found:
+            return ref
+
+        try:
+            cached = await (await get_async_redis()).get(self.cache_key(user_id))
+        except Exception:
+            cached = None
+        if cached is not None:
+            ref = self._decode(cached)
+            self._set_local(user_id, ref)
+            return ref
+
+        row = (await db.execute(self._open_workout_query(user_id))).first()
+        ref = ActiveWorkoutRef(id=row.id, started_at=row.started_at) if row else None
+        await self._store_async(user_id, ref, publish=False, only_if_missing=True)
+        return ref
+
+    def set(self, user_id: int, workout_id: int, started_at: datetime) -> ActiveWorkoutRef:
+        """Record a newly started workout (call after it is committed)"""
+        ref = ActiveWorkoutRef(id=workout_id, started_at=started_at)
+        self._store(user_id, ref, publish=True)
+        return ref
+
+    def clear(self, user_id: int) -> None:
+        """Record that the user has no open workout (call after it is closed)"""
+        self._store(user_id, None, publish=True)
+
+    async def set_async(self, user_id: int, workout_id: int, started_at: datetime) -> ActiveWorkoutRef:
+        """set() for async routes"""
+        ref = ActiveWorkoutRef(id=workout_id, started_at=started_at)
+        await self._store_async(user_id, ref, publish=True)
+        return ref
+
+    async def clear_async(self, user_id: int) -> None:
+        """clear() for async routes"""
+        await self._store_async(user_id, None, publish=True)
+
+    def evict(self, user_id: int) -> None:
+        """Drop a stale entry everywhere so the next get() reads the database"""
+        with self._lock:
+            self._local.pop(user_id, None)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(self.cache_key(user_id))
+            pipe.publish(self.INVALIDATE_CHANNEL, user_id)
+            pipe.execute()
+        except Exception:
+            pass
+
+    async def evict_async(self, user_id: int) -> None:
+        """evict() for async routes"""
+        with self._lock:
+            self._local.pop(user_id, None)
+        try:
+            pipe = (await get_async_redis()).pipeline(transaction=False)
+            pipe.delete(self.cache_key(user_id))
+            pipe.publish(self.INVALIDATE_CHANNEL, user_id)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    def start_listener(self) -> None:
+        """Subscribe to invalidations from other workers in a daemon thread"""
+        if self._listener is not None:
+            return
+        self._stop_event.clear()
+        self._listener = threading.Thread(target=self._listen, name="active-workout-listener", daemon=True)
+        self._listener.start()
+
+    def stop_listener(self) -> None:
+        self._stop_event.set()
+        self._listener = None
+
+    def _listen(self) -> None:
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.INVALIDATE_CHANNEL)
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        with self._lock:
+                            self._local.pop(int(message["data"]), None)
+            except Exception:
+                # Redis unavailable; local entries still expire after local_ttl
+                with self._lock:
+                    self._local.clear()
+                self._stop_event.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _store(self, user_id: int, ref: Optional[ActiveWorkoutRef], publish: bool, only_if_missing: bool = False) -> None:
+        self._set_local(user_id, ref)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(self.cache_key(user_id), self._encode(ref), ex=self.redis_ttl, nx=only_if_missing)
+            if publish:
+                pipe.publish(self.INVALIDATE_CHANNEL, user_id)
+            pipe.execute()
+        except Exception:
+            pass
+
+    async def _store_async(self, user_id: int, ref: Optional[ActiveWorkoutRef], publish: bool, only_if_missing: bool = False) -> None:
+        self._set_local(user_id, ref)
+        try:
+            pipe = (await get_async_redis()).pipeline(transaction=False)
+            pipe.set(self.cache_key(user_id), self._encode(ref), ex=self.redis_ttl, nx=only_if_missing)
+            if publish:
+                pipe.publish(self.INVALIDATE_CHANNEL, user_id)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    def _get_local(self, user_id: int) -> Tuple[bool, Optional[ActiveWorkoutRef]]:
+        """(True, ref) while a fresh local entry exists; a None ref means no open workout"""
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry and entry[1] > time.monotonic():
+                return True, entry[0]
+        return False, None
+
+    @staticmethod
+    def _open_workout_query(user_id: int):
+        return select(Workout.id, Workout.started_at).where(
+            Workout.user_id == user_id,
+            Workout.ended_at == None
+        ).order_by(Workout.started_at.desc()).limit(1)
+
+    def _set_local(self, user_id: int, ref: Optional[ActiveWorkoutRef]) -> None:
+        with self._lock:
+            self._local[user_id] = (ref, time.monotonic() + self.local_ttl)
+
+    @staticmethod
+    def _encode(ref: Optional[ActiveWorkoutRef]) -> str:
+        if ref is None:
+            return NO_WORKOUT
+        started_at = ref.started_at.isoformat() if ref.started_at else None
+        return json.dumps({"id": ref.id, "started_at": started_at})
+
+    @staticmethod
+    def _decode(value: str) -> Optional[ActiveWorkoutRef]:
+        if value == NO_WORKOUT:
+            return None
+        data = json.loads(value)
+        started_at = datetime.fromisoformat(data["started_at"]) if data.get("started_at") else None
+        return ActiveWorkoutRef(id=data["id"], started_at=started_at)
+
+
+active_workout_registry = ActiveWorkoutRegistry()
@@ -0,0 +1,303 @@
+"""
+Cold storage for old punch rows.
+
+Punches older than PUNCH_ARCHIVE_AFTER_DAYS are moved, one user-month at a
+time, into compressed Parquet files under PUNCH_ARCHIVE_URI: a local
+directory, or s3://bucket/prefix for S3 and S3-compatible stores (add
+?endpoint_override=host:port; credentials come from the usual AWS_*
+variables). Every file is recorded in the punch_archives manifest.
+
+Readers ask the manifest which archived months overlap a range and read only
+those files (memory-mapped when local), then merge them with live rows.
+Requires the optional 'pyarrow' package.
+"""
+import os
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.orm import Session
+
+from models import Punch, PunchArchive, Workout, WorkoutStats
+from metrics import record_punch_archive
+from services.daily_stats import month_expr
+from services.partitions import add_months, month_start
+from services.workout_stats import workout_stats_service
+
+ARCHIVE_COLUMNS = (
+    "id", "user_id", "session_id", "workout_id", "segment_id",
+    "punch_type", "speed", "count", "timestamp", "notes",
+)
+
+
+class ArchiveError(RuntimeError):
+    """Archive storage is unavailable or misconfigured"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.fs as pafs
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ArchiveError("Punch archival requires the 'pyarrow' package") from exc
+    return pa, pc, pafs, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("session_id", pa.int64()),
+        ("workout_id", pa.int64()),
+        ("segment_id", pa.int64()),
+        ("punch_type", pa.string()),
+        ("speed", pa.float64()),
+        ("count", pa.int64()),
+        ("timestamp", pa.timestamp("us")),  # naive UTC
+        ("notes", pa.string()),
+    ])
+
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Archive files and the manifest hold naive UTC timestamps"""
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def archive_path(user_id: int, month: date, token: str) -> str:
+    return f"user_id={user_id}/month={month:%Y-%m}/punches-{token}.parquet"
+
+
+class PunchArchiver:
+    """Moves old punches to per-user, per-month archive files and reads them back"""
+
+    def __init__(self):
+        self.after_days = int(os.getenv("PUNCH_ARCHIVE_AFTER_DAYS", "0"))  # 0 = never archive
+        self.uri = os.getenv("PUNCH_ARCHIVE_URI", "./punch_archive")
+        self.compression = os.getenv("PUNCH_ARCHIVE_COMPRESSION", "zstd")
+        self._fs = None
+
+    def _filesystem(self):
+        """(filesystem, root, is_local) for PUNCH_ARCHIVE_URI"""
+        if self._fs is None:
+            _, _, pafs, _ = _pyarrow()
+            if "://" in self.uri:
+                fs, root = pafs.FileSystem.from_uri(self.uri)
+            else:
+                fs, root = pafs.LocalFileSystem(), os.path.abspath(self.uri)
+            self._fs = (fs, root.rstrip("/"), isinstance(fs, pafs.LocalFileSystem))
+        return self._fs
+
+    def _write_file(self, path: str, table) -> None:
+        _, _, _, pq = _pyarrow()
+        fs, root, _ = self._filesystem()
+        full = f"{root}/{path}"
+        fs.create_dir(full.rsplit("/", 1)[0], recursive=True)
+        pq.write_table(table, full, filesystem=fs, compression=self.compression)
+
+    def _read_file(self, path: str, filters=None):
+        _, _, _, pq = _pyarrow()
+        fs, root, local = self._filesystem()
+        full = f"{root}/{path}"
+        if local:
+            return pq.read_table(full, memory_map=True, filters=filters)
+        return pq.read_table(full, filesystem=fs, filters=filters)
+
+    def _delete_file(self, path: str) -> None:
+        fs, root, _ = self._filesystem()
+        try:
+            fs.delete_file(f"{root}/{path}")
+        except (OSError, FileNotFoundError):
+            pass
+
+    # Archival
+
+    def cutoff(self, today: Optional[date] = None) -> date:
+        """First month that stays live; whole months before it are archived"""
+        today = today or datetime.utcnow().date()
+        return month_start(today - timedelta(days=self.after_days))
+
+    def pending_months(self, db: Session, cutoff: date) -> List[Tuple[int, date]]:
+        """(user_id, month) pairs with live punches older than the cutoff"""
+        month = month_expr(db, Punch.timestamp)
+        rows = db.execute(
+            select(Punch.user_id, month)
+            .where(Punch.user_id != None, Punch.timestamp < datetime.combine(cutoff, dt_time.min))
+            .group_by(Punch.user_id, month)
+            .order_by(Punch.user_id, month)
+        ).all()
+        return [(user_id, month_start(value)) for user_id, value in rows]
+
+    def archive_month(self, db: Session, user_id: int, month: date) -> int:
+        """Move one user's punches of one month into its archive file; returns rows moved.
+
+        A month archived earlier is rewritten as a new file with the late rows
+        added. The manifest update and the row deletes commit together, and
+        only then is the superseded file removed, so a crash at any point
+        leaves every punch either live or in the manifest's file.
+        """
+        pa, pc, _, _ = _pyarrow()
+        start = datetime.combine(month, dt_time.min)
+        end = datetime.combine(add_months(month, 1), dt_time.min)
+        in_month = and_(Punch.user_id == user_id, Punch.timestamp >= start, Punch.timestamp < end)
+
+        self._pin_workout_stats(db, in_month)
+
+        rows = db.execute(
+            select(*[getattr(Punch, column) for column in ARCHIVE_COLUMNS]).where(in_month).order_by(Punch.timestamp)
+        ).all()
+        if not rows:
+            return 0
+        table = pa.Table.from_pylist(
+            [dict(row._mapping, timestamp=naive_utc(row.timestamp)) for row in rows],
+            schema=_schema(pa),
+        )
+
+        entry = db.scalar(select(PunchArchive).where(PunchArchive.user_id == user_id, PunchArchive.month == month))
+        superseded = entry.path if entry else None
+        if entry:
+            table = pa.concat_tables([self._read_file(entry.path), table]).sort_by("timestamp")
+
+        path = archive_path(user_id, month, uuid.uuid4().hex[:12])
+        self._write_file(path, table)
+
+        bounds = pc.min_max(table["timestamp"]).as_py()
+        entry = entry or PunchArchive(user_id=user_id, month=month)
+        entry.path = path
+        entry.row_count = table.num_rows
+        entry.min_timestamp, entry.max_timestamp = bounds["min"], bounds["max"]
+        db.add(entry)
+
+        ids = [row.id for row in rows]
+        for offset in range(0, len(ids), 1000):
+            db.execute(
+                delete(Punch)
+                .where(in_month, Punch.id.in_(ids[offset:offset + 1000]))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+
+        if superseded:
+            self._delete_file(superseded)
+        return len(rows)
+
+    def _pin_workout_stats(self, db: Session, in_month) -> None:
+        """Store stats for closed workouts about to lose punches, so their summaries stay the same"""
+        workouts = db.query(Workout).filter(
+            Workout.id.in_(select(Punch.workout_id).where(in_month, Punch.workout_id != None)),
+            Workout.ended_at != None,
+            ~select(WorkoutStats.workout_id).where(WorkoutStats.workout_id == Workout.id).exists(),
+        ).all()
+        for workout in workouts:
+            workout_stats_service.record(db, workout)
+
+    def run(self, db: Session, today: Optional[date] = None) -> Dict[str, Any]:
+        """Archive every whole month older than PUNCH_ARCHIVE_AFTER_DAYS"""
+        if self.after_days <= 0:
+            return {"enabled": False, "months": 0, "rows": 0}
+
+        start = time.perf_counter()
+        cutoff = self.cutoff(today)
+        months = self.pending_months(db, cutoff)
+        rows = 0
+        for user_id, month in months:
+            rows += self.archive_month(db, user_id, month)
+
+        duration = time.perf_counter() - start
+        record_punch_archive(rows, duration)
+        return {
+            "enabled": True,
+            "cutoff": cutoff.isoformat(),
+            "months": len(months),
+            "rows": rows,
+            "duration_seconds": duration,
+        }
+
+    # Query-through
+
+    def read_punches(
+        self,
+        db: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        **equals: Any,
+    ):
+        """Archived punches of a user in [start, end) as an Arrow table, or None if no archived month overlaps.
+
+        Keyword arguments add equality filters (e.g. session_id=3), pushed down to the file reader.
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        query = select(PunchArchive.path).where(PunchArchive.user_id == user_id)
+        if start is not None:
+            query = query.where(PunchArchive.max_timestamp >= start)
+        if end is not None:
+            query = query.where(PunchArchive.min_timestamp < end)
+        paths = db.scalars(query.order_by(PunchArchive.month)).all()
+        if not paths:
+            return None
+
+        pa, _, _, _ = _pyarrow()
+        filters = [(column, "==", value) for column, value in equals.items()]
+        if start is not None:
+            filters.append(("timestamp", ">=", start))
+        if end is not None:
+            filters.append(("timestamp", "<", end))
+        return pa.concat_tables([self._read_file(path, filters or None) for path in paths])
+
+    @staticmethod
+    def aggregate_by_type(table) -> Dict[str, Dict[str, Any]]:
+        """{punch_type: {count, speed_sum, speed_max, last_timestamp}} of archived rows (SQL SUM semantics)"""
+        _, pc, _, _ = _pyarrow()
+        if table is None or table.num_rows == 0:
+            return {}
+        weighted = table.append_column("weighted", pc.multiply(table["speed"], pc.cast(table["count"], "float64")))
+        grouped = weighted.group_by("punch_type").aggregate([
+            ("count", "sum"), ("weighted", "sum"), ("speed", "max"), ("timestamp", "max"),
+        ])
+        return {
+            row["punch_type"]: {
+                "count": int(row["count_sum"] or 0),
+                "speed_sum": float(row["weighted_sum"] or 0.0),
+                "speed_max": float(row["speed_max"] or 0.0),
+                "last_timestamp": row["timestamp_max"],
+            }
+            for row in grouped.to_pylist()
+        }
+
+    def range_summary(self, db: Session, user_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Totals and punch mix of a user's punches in [start, end), live rows merged with archived ones"""
+        per_type: Dict[str, Dict[str, Any]] = {}
+        live = db.execute(
+            select(Punch.punch_type, func.sum(Punch.count), func.sum(Punch.speed * Punch.count), func.max(Punch.speed))
+            .where(Punch.user_id == user_id, Punch.timestamp >= start, Punch.timestamp < end)
+            .group_by(Punch.punch_type)
+        ).all()
+        for punch_type, count, speed_sum, speed_max in live:
+            per_type[punch_type] = {
+                "count": int(count or 0), "speed_sum": float(speed_sum or 0.0), "speed_max": float(speed_max or 0.0),
+            }
+
+        archived = self.read_punches(db, user_id, start, end)
+        for punch_type, agg in self.aggregate_by_type(archived).items():
+            merged = per_type.setdefault(punch_type, {"count": 0, "speed_sum": 0.0, "speed_max": 0.0})
+            merged["count"] += agg["count"]
+            merged["speed_sum"] += agg["speed_sum"]
+            merged["speed_max"] = max(merged["speed_max"], agg["speed_max"])
+
+        total = sum(t["count"] for t in per_type.values())
+        return {
+            "total_punches": total,
+            "average_speed": round(sum(t["speed_sum"] for t in per_type.values()) / total, 2) if total else 0.0,
+            "max_speed": max((t["speed_max"] for t in per_type.values()), default=0.0),
+            "punch_types": {punch_type: t["count"] for punch_type, t in sorted(per_type.items())},
+            "archived_rows": archived.num_rows if archived is not None else 0,
+        }
+
+
+punch_archiver = PunchArchiver()
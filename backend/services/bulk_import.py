@@ -0,0 +1,345 @@
+"""
+Bulk import of historical punch data (CSV or Parquet exports).
+
+The import runs in three set-based phases on a single connection:
+
+1. Stream the file into a TEMPORARY staging table. Postgres uses
+   ``COPY ... FROM STDIN`` via psycopg2 ``copy_expert``; other dialects
+   (SQLite) fall back to one ``executemany`` per batch.
+2. Walk the staged rows ordered by (user_id, timestamp), splitting them into
+   workouts on INACTIVITY_MINUTES gaps and into active/rest segments with the
+   same rules as live workouts. Only timestamps are read in this pass.
+3. Insert the derived Workout / WorkoutSegment rows, then move every staged
+   punch into ``punches`` with one ``INSERT ... SELECT`` joined on the
+   workout time ranges, and fold per-day totals into ``user_daily_stats``.
+
+Input rows need ``user`` (id, email or username), ``timestamp`` (ISO 8601 or
+unix seconds), ``punch_type`` and ``speed``; ``count`` defaults to 1.
+"""
+import csv
+import gzip
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, MetaData, String, Table,
+    and_, func, insert, literal, or_, select, text,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from models import Punch, User, Workout, WorkoutSegment
+from services.wire_format import PUNCH_TYPES
+from services.daily_stats import daily_stats_service, day_expr, ALL_TYPES
+
+IMPORT_WORKOUT_NAME = "Imported"
+
+_staging_meta = MetaData()
+
+staging_punches = Table(
+    "import_staging_punches",
+    _staging_meta,
+    Column("user_id", Integer, nullable=False),
+    Column("ts", DateTime, nullable=False),
+    Column("punch_type", String(50), nullable=False),
+    Column("speed", Float, nullable=False),
+    Column("count", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+staging_workouts = Table(
+    "import_staging_workouts",
+    _staging_meta,
+    Column("workout_id", Integer, nullable=False),
+    Column("user_id", Integer, nullable=False),
+    Column("started_at", DateTime, nullable=False),
+    Column("ended_at", DateTime, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+# Built after loading so COPY does not maintain it row by row
+_STAGING_ORDER_INDEX = (
+    "CREATE INDEX ix_import_staging_punches_user_ts ON import_staging_punches (user_id, ts)"
+)
+
+_STAGING_COLUMNS = ("user_id", "ts", "punch_type", "speed", "count")
+
+
+class BulkImportError(ValueError):
+    """Raised for unusable input (missing columns, unknown format)"""
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """ISO 8601 string or unix seconds -> naive UTC datetime"""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(float(value))
+    else:
+        text = str(value).strip()
+        try:
+            return datetime.utcfromtimestamp(float(text))
+        except ValueError:
+            pass
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        dt = datetime.fromisoformat(text)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def iter_csv_records(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_parquet_records(path: str, batch_size: int) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # optional dependency
+        raise BulkImportError("Parquet input requires the 'pyarrow' package") from exc
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_records(path: str, fmt: Optional[str] = None, batch_size: int = 50000) -> Iterator[Dict[str, Any]]:
+    fmt = fmt or ("parquet" if path.endswith((".parquet", ".pq")) else "csv")
+    if fmt == "csv":
+        return iter_csv_records(path)
+    if fmt == "parquet":
+        return iter_parquet_records(path, batch_size)
+    raise BulkImportError(f"Unsupported input format: {fmt}")
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: Optional[int] = None,
+        user_column: str = "user",
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size or int(os.getenv("IMPORT_BATCH_SIZE", "50000"))
+        self.user_column = user_column
+        self.progress = progress
+        self.inactivity = timedelta(minutes=int(os.getenv("INACTIVITY_MINUTES", "3")))
+        self._user_ids: Dict[str, Optional[int]] = {}
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        stats = {
+            "rows_read": 0,
+            "rows_loaded": 0,
+            "rows_rejected": 0,
+            "unknown_users": 0,
+            "workouts_created": 0,
+            "segments_created": 0,
+        }
+        started = time.perf_counter()
+
+        with self.engine.begin() as conn:
+            _staging_meta.create_all(conn)
+            try:
+                load = self._copy_batch if conn.dialect.name == "postgresql" else self._executemany_batch
+                batch: List[Tuple] = []
+                for record in records:
+                    stats["rows_read"] += 1
+                    row = self._to_row(conn, record, stats)
+                    if row is None:
+                        continue
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        load(conn, batch)
+                        stats["rows_loaded"] += len(batch)
+                        batch = []
+                        self._report(stats, started)
+                if batch:
+                    load(conn, batch)
+                    stats["rows_loaded"] += len(batch)
+
+                conn.execute(text(_STAGING_ORDER_INDEX))
+                workouts = self._derive_workouts(conn)
+                stats["workouts_created"], stats["segments_created"] = self._insert_workouts(conn, workouts)
+                self._move_punches(conn)
+                self._update_daily_stats(conn)
+            finally:
+                _staging_meta.drop_all(conn)
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows_loaded"] / elapsed, 1) if elapsed > 0 else 0.0
+        return stats
+
+    def _report(self, stats: Dict[str, Any], started: float) -> None:
+        if not self.progress:
+            return
+        elapsed = time.perf_counter() - started
+        self.progress({
+            **stats,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(stats["rows_loaded"] / elapsed, 1) if elapsed > 0 else 0.0,
+        })
+
+    # --- phase 1: staging ---
+
+    def _resolve_user(self, conn: Connection, key: Any) -> Optional[int]:
+        key = str(key).strip()
+        if key in self._user_ids:
+            return self._user_ids[key]
+        conditions = [User.email == key, User.username == key]
+        if key.isdigit():
+            conditions.append(User.id == int(key))
+        user_id = conn.execute(select(User.id).where(or_(*conditions)).limit(1)).scalar()
+        self._user_ids[key] = user_id
+        return user_id
+
+    def _to_row(self, conn: Connection, record: Dict[str, Any], stats: Dict[str, Any]) -> Optional[Tuple]:
+        if self.user_column not in record or "timestamp" not in record:
+            raise BulkImportError(f"Input needs '{self.user_column}', 'timestamp', 'punch_type' and 'speed' columns")
+        user_id = self._resolve_user(conn, record[self.user_column])
+        if user_id is None:
+            stats["unknown_users"] += 1
+            stats["rows_rejected"] += 1
+            return None
+        try:
+            punch_type = str(record["punch_type"]).strip().lower()
+            if punch_type not in PUNCH_TYPES:
+                raise ValueError(punch_type)
+            count = record.get("count")
+            return (
+                user_id,
+                parse_timestamp(record["timestamp"]),
+                punch_type,
+                float(record["speed"]),
+                int(count) if count not in (None, "") else 1,
+            )
+        except (KeyError, TypeError, ValueError):
+            stats["rows_rejected"] += 1
+            return None
+
+    def _copy_batch(self, conn: Connection, batch: List[Tuple]) -> None:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for user_id, ts, punch_type, speed, count in batch:
+            writer.writerow((user_id, ts.isoformat(), punch_type, speed, count))
+        buf.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {staging_punches.name} ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cursor.close()
+
+    def _executemany_batch(self, conn: Connection, batch: List[Tuple]) -> None:
+        conn.execute(
+            insert(staging_punches),
+            [dict(zip(_STAGING_COLUMNS, row)) for row in batch],
+        )
+
+    # --- phase 2: derive workouts and segments ---
+
+    def _derive_workouts(self, conn: Connection) -> List[Tuple[int, datetime, datetime, list]]:
+        from routes.workouts import _segment_spans
+
+        workouts = []
+        current_user = None
+        timestamps: List[datetime] = []
+
+        def close():
+            if timestamps:
+                spans = _segment_spans(timestamps, timestamps[-1])
+                workouts.append((current_user, timestamps[0], timestamps[-1], spans))
+
+        result = conn.execute(
+            select(staging_punches.c.user_id, staging_punches.c.ts)
+            .order_by(staging_punches.c.user_id, staging_punches.c.ts)
+            .execution_options(yield_per=self.batch_size)
+        )
+        for user_id, ts in result:
+            if user_id != current_user or ts - timestamps[-1] > self.inactivity:
+                close()
+                current_user = user_id
+                timestamps = []
+            timestamps.append(ts)
+        close()
+        return workouts
+
+    # --- phase 3: persist ---
+
+    def _insert_workouts(self, conn: Connection, workouts: List[Tuple[int, datetime, datetime, list]]) -> Tuple[int, int]:
+        if not workouts:
+            return 0, 0
+        segments_created = 0
+        for offset in range(0, len(workouts), self.batch_size):
+            chunk = workouts[offset:offset + self.batch_size]
+            ids = conn.execute(
+                insert(Workout).returning(Workout.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "user_id": user_id,
+                        "name": IMPORT_WORKOUT_NAME,
+                        "started_at": started_at,
+                        "ended_at": ended_at,
+                        "auto_detected": True,
+                    }
+                    for user_id, started_at, ended_at, _ in chunk
+                ],
+            ).scalars().all()
+
+            conn.execute(
+                insert(staging_workouts),
+                [
+                    {"workout_id": workout_id, "user_id": user_id, "started_at": started_at, "ended_at": ended_at}
+                    for workout_id, (user_id, started_at, ended_at, _) in zip(ids, chunk)
+                ],
+            )
+            segment_rows = [
+                {"workout_id": workout_id, "kind": kind, "started_at": seg_start, "ended_at": seg_end, "target_seconds": None}
+                for workout_id, (_, _, _, spans) in zip(ids, chunk)
+                for kind, seg_start, seg_end in spans
+            ]
+            if segment_rows:
+                conn.execute(insert(WorkoutSegment), segment_rows)
+                segments_created += len(segment_rows)
+        return len(workouts), segments_created
+
+    def _move_punches(self, conn: Connection) -> None:
+        s, w = staging_punches.c, staging_workouts.c
+        source = (
+            select(s.user_id, w.workout_id, s.punch_type, s.speed, s.count, s.ts)
+            .select_from(
+                staging_punches.join(
+                    staging_workouts,
+                    and_(s.user_id == w.user_id, s.ts >= w.started_at, s.ts <= w.ended_at),
+                )
+            )
+        )
+        conn.execute(
+            insert(Punch).from_select(
+                [Punch.user_id, Punch.workout_id, Punch.punch_type, Punch.speed, Punch.count, Punch.timestamp],
+                source,
+            )
+        )
+
+    def _update_daily_stats(self, conn: Connection) -> None:
+        """Upsert the staged rows' per-day totals (one row per user, day and type)"""
+        s, w = staging_punches.c, staging_workouts.c
+        punch_day, workout_day = day_expr(conn, s.ts), day_expr(conn, w.started_at)
+        columns = ("user_id", "day", "punch_type", "count", "speed_sum", "speed_max", "workout_count")
+        grouped = [
+            select(s.user_id, punch_day, s.punch_type, func.sum(s.count), func.sum(s.speed * s.count), func.max(s.speed), literal(0))
+            .group_by(s.user_id, punch_day, s.punch_type),
+            select(w.user_id, workout_day, literal(ALL_TYPES), literal(0), literal(0.0), literal(0.0), func.count())
+            .group_by(w.user_id, workout_day),
+        ]
+        for query in grouped:
+            rows = [dict(zip(columns, row)) for row in conn.execute(query)]
+            for offset in range(0, len(rows), self.batch_size):
+                daily_stats_service.upsert(conn, rows[offset:offset + self.batch_size])
@@ -0,0 +1,207 @@
+"""
+Request body decompression for bulk write routes.
+
+Supports Content-Encoding gzip and deflate, plus zstd when the optional
+``zstandard`` package is installed. Decompression streams in bounded chunks
+and stops as soon as the output passes REQUEST_MAX_DECOMPRESSED_BYTES, so a
+small compressed bomb cannot expand into memory.
+"""
+import os
+import zlib
+from typing import AsyncIterator, Callable, Iterator, Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from metrics import record_request_body_sizes
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLargeError(ValueError):
+    """Decompressed body exceeds the configured cap"""
+
+
+class UnsupportedEncodingError(ValueError):
+    """Content-Encoding is not supported by this server"""
+
+
+def max_decompressed_bytes() -> int:
+    return int(os.getenv("REQUEST_MAX_DECOMPRESSED_BYTES", str(10 * 1024 * 1024)))
+
+
+def supported_encodings() -> list:
+    encodings = ["gzip", "deflate"]
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+class _Decoder:
+    """Incremental decoder for one Content-Encoding.
+
+    Shared by decompress_body and decompress_stream so both accept the same
+    encodings. Output comes in pieces of at most CHUNK_SIZE and decoding
+    stops with BodyTooLargeError once it passes `limit`. Without a limit a
+    single zstd input chunk may still expand to at most
+    REQUEST_MAX_DECOMPRESSED_BYTES.
+    """
+
+    def __init__(self, encoding: str, limit: Optional[int], raw_deflate: bool = False):
+        self.encoding = encoding
+        self.limit = limit
+        self.compressed = 0
+        self.decompressed = 0
+        self._zstd = None
+        self._zlib = None
+        # Bytes fed before the zlib header could be checked, replayed as raw deflate
+        self._head: Optional[bytes] = None
+        if encoding in ("gzip", "x-gzip"):
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate" and raw_deflate:
+            self._zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            # RFC 9110 deflate is zlib-wrapped, but many clients send raw deflate
+            self._zlib = zlib.decompressobj(zlib.MAX_WBITS)
+            self._head = b""
+        elif encoding == "zstd" and zstandard is not None:
+            self._pieces: list = []
+            self._feed_limit = limit if limit is not None else max_decompressed_bytes()
+            self._feed_size = 0
+            self._zstd = zstandard.ZstdDecompressor().stream_writer(self, write_size=CHUNK_SIZE)
+        else:
+            raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {encoding}")
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        self.compressed += len(data)
+        if self._zstd is not None:
+            self._feed_size = 0
+            self._zstd.write(data)
+            pieces, self._pieces = self._pieces, []
+            yield from pieces
+            return
+
+        if self._head is not None:
+            try:
+                out = self._zlib.decompress(data, CHUNK_SIZE)
+            except zlib.error:
+                self._zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+                data, self._head = self._head + data, None
+                out = self._zlib.decompress(data, CHUNK_SIZE)
+            else:
+                self._head += data
+                if len(self._head) >= 2:
+                    self._head = None
+            data = self._zlib.unconsumed_tail
+            if out:
+                yield self._count(out)
+        while data:
+            out = self._zlib.decompress(data, CHUNK_SIZE)
+            data = self._zlib.unconsumed_tail
+            if out:
+                yield self._count(out)
+
+    def finish(self) -> Iterator[bytes]:
+        """Emit buffered output, reject a truncated body and record the size metrics"""
+        if self._zlib is not None:
+            tail = self._zlib.flush()
+            if tail:
+                yield self._count(tail)
+            if not self._zlib.eof:
+                raise zlib.error("Truncated compressed body")
+        record_request_body_sizes(self.encoding, self.compressed, self.decompressed)
+
+    def write(self, piece: bytes) -> int:
+        """zstd stream_writer sink"""
+        self._feed_size += len(piece)
+        if self._feed_size > self._feed_limit:
+            raise BodyTooLargeError("Decompressed body too large")
+        self._pieces.append(self._count(bytes(piece)))
+        return len(piece)
+
+    def _count(self, out: bytes) -> bytes:
+        self.decompressed += len(out)
+        if self.limit is not None and self.decompressed > self.limit:
+            raise BodyTooLargeError("Decompressed body too large")
+        return out
+
+
+def _decode_all(decoder: _Decoder, body: bytes) -> bytes:
+    out = bytearray()
+    for piece in decoder.decode(body):
+        out += piece
+    for piece in decoder.finish():
+        out += piece
+    return bytes(out)
+
+
+def decompress_body(body: bytes, encoding: Optional[str], limit: Optional[int] = None) -> bytes:
+    """Decode a request body according to its Content-Encoding header"""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+
+    limit = max_decompressed_bytes() if limit is None else limit
+    try:
+        return _decode_all(_Decoder(encoding, limit), body)
+    except zlib.error:
+        if encoding != "deflate":
+            raise
+        # Raw deflate whose first bytes happen to form a valid zlib header
+        return _decode_all(_Decoder(encoding, limit, raw_deflate=True), body)
+
+
+async def decompress_stream(chunks: AsyncIterator[bytes], encoding: Optional[str]) -> AsyncIterator[bytes]:
+    """Incrementally decode a streamed body with the same decoders as decompress_body.
+
+    Streams have no total size cap; callers bound memory per line instead.
+    Size metrics are recorded once the stream has been fully decoded.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    decoder = _Decoder(encoding, None)
+    async for chunk in chunks:
+        for piece in decoder.decode(chunk):
+            yield piece
+    for piece in decoder.finish():
+        yield piece
+
+
+def decompress_or_http_error(body: bytes, encoding: Optional[str]) -> bytes:
+    """decompress_body with failures mapped to HTTP errors"""
+    try:
+        return decompress_body(body, encoding)
+    except BodyTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid compressed body: {str(e)}")
+
+
+class DecompressedRequest(Request):
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            self._body = decompress_or_http_error(body, self.headers.get("content-encoding"))
+        return self._body
+
+
+class DecompressingRoute(APIRoute):
+    """Route class that transparently decodes compressed request bodies"""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def custom_route_handler(request: Request) -> Response:
+            request = DecompressedRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return custom_route_handler
@@ -0,0 +1,242 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from sqlalchemy import func, select, delete, case, cast, type_coerce, Date, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import Punch, PunchArchive, UserDailyStats, Workout
+
+# punch_type of the per-day row that carries workout_count (its punch totals stay 0)
+ALL_TYPES = "*"
+
+
+def utc_day(ts: Optional[datetime]) -> date:
+    """UTC calendar day of a timestamp (None means now, as for server-defaulted rows)"""
+    if ts is None:
+        return datetime.utcnow().date()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.date()
+
+
+def dialect_name(db) -> str:
+    """Dialect of a Session or a Connection"""
+    bind = db.get_bind() if isinstance(db, Session) else db
+    return bind.dialect.name
+
+
+def day_expr(db, column):
+    """SQL UTC day of a DateTime column (timestamptz is converted to UTC first)"""
+    if dialect_name(db) == "postgresql":
+        if getattr(column.type, "timezone", False):
+            column = func.timezone("UTC", column)
+        return cast(column, Date)
+    # SQLite: no SQL CAST, which would give the string NUMERIC affinity (2024-01-31 -> 2024)
+    return type_coerce(func.date(column), Date)
+
+
+def month_expr(db, column):
+    """SQL first day of the UTC month of a Date/DateTime column"""
+    if dialect_name(db) == "postgresql":
+        if getattr(column.type, "timezone", False):
+            column = func.timezone("UTC", column)
+        return cast(func.date_trunc("month", column), Date)
+    return type_coerce(func.strftime("%Y-%m-01", column), Date)
+
+
+def day_window(days: int, end: Optional[date] = None, offset_days: int = 0) -> Tuple[date, date]:
+    """Inclusive (first_day, last_day) of a window of whole UTC days ending today - offset_days"""
+    last = (end or datetime.utcnow().date()) - timedelta(days=offset_days)
+    return last - timedelta(days=days - 1), last
+
+
+class DailyStatsService:
+    """Per-user, per-day, per-punch-type rollup kept in user_daily_stats.
+
+    Writers call add_punches / add_workout inside their own transaction so the
+    rollup commits (or rolls back) with the rows it summarizes.
+    """
+
+    def add_punches(self, db: Session, user_id: int, rows: Iterable[Dict[str, Any]]) -> None:
+        """Fold punch rows (timestamp, punch_type, speed, count) into the rollup with one upsert"""
+        deltas: Dict[Tuple[date, str], Dict[str, Any]] = {}
+        for row in rows:
+            count = row.get("count") or 1
+            key = (utc_day(row.get("timestamp")), row["punch_type"])
+            delta = deltas.setdefault(key, {"count": 0, "speed_sum": 0.0, "speed_max": 0.0, "workout_count": 0})
+            delta["count"] += count
+            delta["speed_sum"] += row["speed"] * count
+            delta["speed_max"] = max(delta["speed_max"], row["speed"])
+        self.upsert(db, [
+            dict(user_id=user_id, day=day, punch_type=punch_type, **delta)
+            for (day, punch_type), delta in sorted(deltas.items())
+        ])
+
+    def add_workout(self, db: Session, user_id: int, started_at: Optional[datetime]) -> None:
+        """Count a newly started workout on its start day"""
+        self.upsert(db, [dict(
+            user_id=user_id, day=utc_day(started_at), punch_type=ALL_TYPES,
+            count=0, speed_sum=0.0, speed_max=0.0, workout_count=1
+        )])
+
+    def upsert(self, db, values: List[Dict[str, Any]]) -> None:
+        """Add full rollup rows (user_id, day, punch_type, count, speed_sum, speed_max, workout_count)"""
+        if not values:
+            return
+        dialect = dialect_name(db)
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        greatest = func.greatest if dialect == "postgresql" else func.max
+        stmt = dialect_insert(UserDailyStats).values(values)
+        table = UserDailyStats.__table__.c
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.user_id, table.day, table.punch_type],
+            set_={
+                "count": table.count + stmt.excluded.count,
+                "speed_sum": table.speed_sum + stmt.excluded.speed_sum,
+                "speed_max": greatest(table.speed_max, stmt.excluded.speed_max),
+                "workout_count": table.workout_count + stmt.excluded.workout_count,
+            }
+        ))
+
+    def rebuild(self, db: Session, user_id: Optional[int] = None, since: Optional[date] = None) -> int:
+        """Recompute rollup rows from punches and workouts (optionally one user / from a day on).
+
+        Months moved to cold storage (services/archive.py) are left as they
+        are: their punches are no longer in the table and their rows were
+        already final when archived.
+        """
+        punch_day = day_expr(db, Punch.timestamp)
+        workout_day = day_expr(db, Workout.started_at)
+
+        def archived(user_id_column, month):
+            return select(PunchArchive.id).where(
+                PunchArchive.user_id == user_id_column, PunchArchive.month == month
+            ).exists()
+
+        clear = delete(UserDailyStats).where(~archived(UserDailyStats.user_id, month_expr(db, UserDailyStats.day)))
+        punches = select(
+            Punch.user_id, punch_day, Punch.punch_type,
+            func.sum(func.coalesce(Punch.count, 1)), func.sum(Punch.speed * func.coalesce(Punch.count, 1)),
+            func.max(Punch.speed), literal(0)
+        ).where(Punch.user_id != None, ~archived(Punch.user_id, month_expr(db, Punch.timestamp)))
+        workouts = select(
+            Workout.user_id, workout_day, literal(ALL_TYPES),
+            literal(0), literal(0.0), literal(0.0), func.count(Workout.id)
+        ).where(~archived(Workout.user_id, month_expr(db, Workout.started_at)))
+        if user_id is not None:
+            clear = clear.where(UserDailyStats.user_id == user_id)
+            punches = punches.where(Punch.user_id == user_id)
+            workouts = workouts.where(Workout.user_id == user_id)
+        if since is not None:
+            clear = clear.where(UserDailyStats.day >= since)
+            punches = punches.where(punch_day >= since)
+            workouts = workouts.where(workout_day >= since)
+
+        columns = ["user_id", "day", "punch_type", "count", "speed_sum", "speed_max", "workout_count"]
+        db.execute(clear)
+        inserted = 0
+        for source in (
+            punches.group_by(Punch.user_id, punch_day, Punch.punch_type),
+            workouts.group_by(Workout.user_id, workout_day),
+        ):
+            inserted += db.execute(UserDailyStats.__table__.insert().from_select(columns, source)).rowcount
+        db.commit()
+        return inserted
+
+    def daily_totals(self, db: Session, user_ids: List[int], first_day: date, last_day: date) -> Dict[int, Dict[date, Dict[str, Any]]]:
+        """{user_id: {day: totals}} across punch types, from at most one row per user/day/type"""
+        rows = db.execute(
+            select(
+                UserDailyStats.user_id,
+                UserDailyStats.day,
+                func.sum(UserDailyStats.count),
+                func.sum(UserDailyStats.speed_sum),
+                func.max(UserDailyStats.speed_max),
+                func.sum(UserDailyStats.workout_count),
+            )
+            .where(
+                UserDailyStats.user_id.in_(user_ids),
+                UserDailyStats.day >= first_day,
+                UserDailyStats.day <= last_day,
+            )
+            .group_by(UserDailyStats.user_id, UserDailyStats.day)
+        ).all()
+
+        totals: Dict[int, Dict[date, Dict[str, Any]]] = {user_id: {} for user_id in user_ids}
+        for user_id, day, count, speed_sum, speed_max, workout_count in rows:
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            totals[user_id][day] = {
+                "total_punches": int(count or 0),
+                "speed_sum": float(speed_sum or 0.0),
+                "speed_max": float(speed_max or 0.0),
+                "workout_count": int(workout_count or 0),
+            }
+        return totals
+
+    def week_buckets(self, db: Session, user_id: int, weeks: int, end: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Totals of the last `weeks` 7-day windows ending on `end` (default today), newest first.
+
+        One query: each rollup day is assigned its week with a CASE expression
+        and the weeks are summed with GROUP BY, matching window_totals over
+        day_window(7, end, offset_days=7 * i).
+        """
+        last = end or datetime.utcnow().date()
+        first_day = last - timedelta(days=7 * weeks - 1)
+        week = case(
+            *[(UserDailyStats.day >= last - timedelta(days=7 * i + 6), i) for i in range(weeks)],
+            else_=weeks
+        )
+        # Group on the subquery column: a repeated CASE would carry fresh bind
+        # parameters, which Postgres does not match against the select list
+        days = select(
+            week.label("week"),
+            UserDailyStats.count,
+            UserDailyStats.speed_sum,
+            UserDailyStats.speed_max,
+            UserDailyStats.workout_count,
+        ).where(
+            UserDailyStats.user_id == user_id,
+            UserDailyStats.day >= first_day,
+            UserDailyStats.day <= last,
+        ).subquery()
+        rows = db.execute(
+            select(
+                days.c.week,
+                func.sum(days.c.count),
+                func.sum(days.c.speed_sum),
+                func.max(days.c.speed_max),
+                func.sum(days.c.workout_count),
+            ).group_by(days.c.week)
+        ).all()
+
+        by_week = {int(week_index): row for week_index, *row in rows}
+        buckets = []
+        for i in range(weeks):
+            week_first, week_last = day_window(7, last, offset_days=7 * i)
+            count, speed_sum, speed_max, workout_count = by_week.get(i, (0, 0.0, 0.0, 0))
+            total = int(count or 0)
+            buckets.append({
+                "first_day": week_first,
+                "last_day": week_last,
+                "total_punches": total,
+                "avg_speed": round(float(speed_sum or 0.0) / total, 2) if total else 0.0,
+                "speed_max": float(speed_max or 0.0),
+                "workout_count": int(workout_count or 0),
+            })
+        return buckets
+
+    @staticmethod
+    def window_totals(days: Dict[date, Dict[str, Any]], first_day: date, last_day: date) -> Dict[str, Any]:
+        """Sum per-day totals over an inclusive day range"""
+        in_range = [t for day, t in days.items() if first_day <= day <= last_day]
+        total = sum(t["total_punches"] for t in in_range)
+        speed_sum = sum(t["speed_sum"] for t in in_range)
+        return {
+            "total_punches": total,
+            "avg_speed": round(speed_sum / total, 2) if total else 0.0,
+            "speed_max": max((t["speed_max"] for t in in_range), default=0.0),
+            "workout_count": sum(t["workout_count"] for t in in_range),
+        }
+
+
+daily_stats_service = DailyStatsService()
@@ -1,21 +1,58 @@
 import os
+import json
 import hmac
 import hashlib
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, NamedTuple, AsyncIterator
+from sqlalchemy import update, bindparam, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import User, ApiKey, Punch, Workout
 from schemas import DeviceEvent, DeviceIngestRequest
 from database import get_redis
+from services.ingest_queue import IngestQueue
+from services.rate_limit import RateLimiter, RateLimitResult
+from services.workouts import WorkoutService
+from services.active_workouts import ActiveWorkoutRef
+from services.daily_stats import daily_stats_service
 import redis
 
+# Number of leading secret characters stored in plain text as an indexed lookup id
+KEY_PREFIX_LEN = 12
+
+class VerifiedApiKey(NamedTuple):
+    """Minimal view of a verified ApiKey, safe to keep across DB sessions"""
+    id: int
+    user_id: int
+
 class DeviceService:
     def __init__(self):
         self.redis_client = get_redis()
-        self.rate_limit_per_min = int(os.getenv("RATE_LIMIT_PER_MIN", "60"))
         self.webhook_hmac_header = os.getenv("WEBHOOK_HMAC_HEADER", "X-Signature")
         self.webhook_drift_sec = int(os.getenv("WEBHOOK_DRIFT_SEC", "120"))
+        self.api_key_cache_size = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+        self.api_key_cache_ttl = int(os.getenv("API_KEY_CACHE_TTL_SEC", "60"))
+        self.api_key_miss_cache_ttl = int(os.getenv("API_KEY_MISS_CACHE_TTL_SEC", "30"))
+        # Turn off once every key created before key_prefix existed has been rotated
+        self.api_key_legacy_lookup = os.getenv("API_KEY_LEGACY_LOOKUP", "true").lower() == "true"
+        self.last_used_flush_sec = int(os.getenv("API_KEY_LAST_USED_FLUSH_SEC", "60"))
+        self.ingest_queue = IngestQueue(self.redis_client)
+        self.rate_limiter = RateLimiter(self.redis_client)
+        self.ndjson_chunk_size = int(os.getenv("NDJSON_CHUNK_SIZE", "500"))
+        self.workout_service = WorkoutService()
+
+        # secret hash -> (VerifiedApiKey, expires_at monotonic)
+        self._key_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # secret hash -> expires_at monotonic, for keys that matched nothing
+        self._miss_cache: "OrderedDict[str, float]" = OrderedDict()
+        # api key id -> last used datetime, written out in one batch per flush interval
+        self._pending_last_used: Dict[int, datetime] = {}
+        self._last_used_flushed_at = time.monotonic()
+        self._lock = threading.Lock()
 
     def create_api_key(self, db: Session, user_id: int, name: str) -> Dict[str, Any]:
         """Create a new API key for a user"""
@@ -27,6 +64,7 @@ class DeviceService:
         api_key = ApiKey(
             user_id=user_id,
             name=name,
+            key_prefix=secret[:KEY_PREFIX_LEN],
             secret_hash=secret_hash
         )
         db.add(api_key)
@@ -66,103 +104,279 @@ class DeviceService:
         
         db.delete(key)
         db.commit()
+        self._evict_cached_key(key_id)
         return True
 
-    def verify_api_key(self, db: Session, api_key: str) -> Optional[ApiKey]:
-        """Verify API key and return the key record"""
-        # Find key by checking all hashes
-        keys = db.query(ApiKey).all()
-        
-        for key in keys:
-            if self._verify_secret(api_key, key.secret_hash):
-                # Update last used timestamp
-                key.last_used_at = datetime.utcnow()
+    def verify_api_key(self, db: Session, api_key: str) -> Optional[VerifiedApiKey]:
+        """Verify API key and return the key id and owner"""
+        secret_hash = self._hash_secret(api_key)
+
+        verified = self._get_cached_key(secret_hash)
+        if verified is None:
+            if self._is_cached_miss(secret_hash):
+                return None
+            verified = self._lookup_api_key(db, api_key, secret_hash)
+            if verified is None:
+                self._cache_miss(secret_hash)
+                return None
+            self._cache_key(secret_hash, verified)
+
+        self._touch_last_used(db, verified.id)
+        return verified
+
+    def flush_last_used(self, db: Session) -> int:
+        """Write pending last_used_at timestamps in one batched UPDATE"""
+        with self._lock:
+            pending = self._pending_last_used
+            self._pending_last_used = {}
+            self._last_used_flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            db.connection().execute(
+                update(ApiKey.__table__)
+                .where(ApiKey.__table__.c.id == bindparam("key_id"))
+                .values(last_used_at=bindparam("used_at")),
+                [{"key_id": key_id, "used_at": used_at} for key_id, used_at in pending.items()]
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Keep the timestamps for the next flush unless newer ones arrived
+            with self._lock:
+                for key_id, used_at in pending.items():
+                    self._pending_last_used.setdefault(key_id, used_at)
+            return 0
+        return len(pending)
+
+    def _lookup_api_key(self, db: Session, api_key: str, secret_hash: str) -> Optional[VerifiedApiKey]:
+        """Find a key by its indexed prefix, falling back to legacy keys without one"""
+        prefix = api_key[:KEY_PREFIX_LEN]
+        candidates = db.query(ApiKey).filter(ApiKey.key_prefix == prefix).all()
+        for key in candidates:
+            if hmac.compare_digest(secret_hash, key.secret_hash):
+                return VerifiedApiKey(id=key.id, user_id=key.user_id)
+
+        if not self.api_key_legacy_lookup:
+            return None
+
+        # Keys created before key_prefix existed: match once, then backfill the prefix
+        legacy = db.query(ApiKey).filter(ApiKey.key_prefix == None).all()
+        for key in legacy:
+            if hmac.compare_digest(secret_hash, key.secret_hash):
+                key.key_prefix = prefix
                 db.commit()
-                return key
-        
+                return VerifiedApiKey(id=key.id, user_id=key.user_id)
+
         return None
 
-    def check_rate_limit(self, api_key_id: int) -> bool:
-        """Check if API key is within rate limits"""
-        try:
-            key = f"rate_limit:{api_key_id}"
-            current = self.redis_client.get(key)
-            
-            if current is None:
-                # First request in this minute
-                self.redis_client.setex(key, 60, 1)
-                return True
-            
-            current_count = int(current)
-            if current_count >= self.rate_limit_per_min:
+    def _get_cached_key(self, secret_hash: str) -> Optional[VerifiedApiKey]:
+        with self._lock:
+            entry = self._key_cache.get(secret_hash)
+            if entry is None:
+                return None
+            verified, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._key_cache[secret_hash]
+                return None
+            self._key_cache.move_to_end(secret_hash)
+            return verified
+
+    def _cache_key(self, secret_hash: str, verified: VerifiedApiKey) -> None:
+        with self._lock:
+            self._key_cache[secret_hash] = (verified, time.monotonic() + self.api_key_cache_ttl)
+            self._key_cache.move_to_end(secret_hash)
+            while len(self._key_cache) > self.api_key_cache_size:
+                self._key_cache.popitem(last=False)
+
+    def _is_cached_miss(self, secret_hash: str) -> bool:
+        with self._lock:
+            expires_at = self._miss_cache.get(secret_hash)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._miss_cache[secret_hash]
                 return False
-            
-            # Increment counter
-            self.redis_client.incr(key)
-            return True
-        except Exception:
-            # If Redis fails, allow the request
             return True
 
+    def _cache_miss(self, secret_hash: str) -> None:
+        if self.api_key_miss_cache_ttl <= 0:
+            return
+        with self._lock:
+            self._miss_cache[secret_hash] = time.monotonic() + self.api_key_miss_cache_ttl
+            self._miss_cache.move_to_end(secret_hash)
+            while len(self._miss_cache) > self.api_key_cache_size:
+                self._miss_cache.popitem(last=False)
+
+    def _evict_cached_key(self, key_id: int) -> None:
+        with self._lock:
+            stale = [h for h, (verified, _) in self._key_cache.items() if verified.id == key_id]
+            for h in stale:
+                del self._key_cache[h]
+            self._pending_last_used.pop(key_id, None)
+
+    def _touch_last_used(self, db: Session, key_id: int) -> None:
+        """Record key usage in memory and flush at most once per interval"""
+        with self._lock:
+            self._pending_last_used[key_id] = datetime.utcnow()
+            due = time.monotonic() - self._last_used_flushed_at >= self.last_used_flush_sec
+        if due:
+            self.flush_last_used(db)
+
+    def check_rate_limit(self, api_key_id: int, user_id: Optional[int] = None) -> RateLimitResult:
+        """Check if API key (and its owner) is within rate limits"""
+        return self.rate_limiter.check(api_key_id, user_id)
+
+    async def check_rate_limit_async(self, api_key_id: int, user_id: Optional[int] = None) -> RateLimitResult:
+        """check_rate_limit() for async routes"""
+        return await self.rate_limiter.check_async(api_key_id, user_id)
+
     def verify_hmac_signature(self, payload: bytes, signature: str, secret: str) -> bool:
         """Verify HMAC signature for webhook payload"""
+        mac = self.new_hmac(secret)
+        mac.update(payload)
+        return self.verify_hmac_digest(mac, signature)
+
+    def new_hmac(self, secret: str):
+        """Start an incremental HMAC-SHA256 for streamed payloads"""
+        return hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+
+    def verify_hmac_digest(self, mac, signature: str) -> bool:
+        """Compare a finished HMAC against a "sha256=<hex>" signature header"""
         try:
             # Parse signature format: sha256=hash
-            if not signature.startswith("sha256="):
+            if not signature or not signature.startswith("sha256="):
                 return False
             
             expected_hash = signature[7:]  # Remove "sha256=" prefix
             
-            # Calculate HMAC
-            calculated_hash = hmac.new(
-                secret.encode('utf-8'),
-                payload,
-                hashlib.sha256
-            ).hexdigest()
-            
             # Compare hashes
-            return hmac.compare_digest(expected_hash, calculated_hash)
+            return hmac.compare_digest(expected_hash, mac.hexdigest())
         except Exception:
             return False
 
     def process_device_events(self, db: Session, user_id: int, events: List[DeviceEvent]) -> Dict[str, Any]:
         """Process device events and create punches"""
-        # Get or create active workout
-        active_workout = db.query(Workout).filter(
-            Workout.user_id == user_id,
-            Workout.ended_at == None
-        ).first()
-        
-        if not active_workout:
-            # Auto-start workout
-            active_workout = Workout(
-                user_id=user_id,
-                auto_detected=True,
-                started_at=datetime.utcnow()
-            )
-            db.add(active_workout)
+        rows = [
+            {
+                "timestamp": event.ts,
+                "punch_type": event.punch_type,
+                "speed": event.speed,
+                "count": event.count
+            }
+            for event in events
+        ]
+        return self.process_device_rows(db, user_id, rows)
+
+    def process_device_rows(self, db: Session, user_id: int, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Process already-decoded punch rows (timestamp, punch_type, speed, count)"""
+        # Write-behind mode: buffer in the Redis Stream and ack immediately
+        if self.ingest_queue.enabled:
+            try:
+                self.ingest_queue.enqueue(user_id, rows)
+                return {
+                    "workout_id": None,
+                    "punches_created": 0,
+                    "punches_queued": len(rows),
+                    "message": "Events queued for processing"
+                }
+            except Exception:
+                # Redis unavailable; fall back to a direct write
+                pass
+
+        active_workout = self.insert_events(db, user_id, rows)
+        return {
+            "workout_id": active_workout.id,
+            "punches_created": len(rows),
+            "message": "Events processed successfully"
+        }
+
+    def resolve_active_workout(self, db: Session, user_id: int) -> ActiveWorkoutRef:
+        """Return the user's open workout, auto-starting (and committing) one if needed"""
+        return self.workout_service.get_or_start_workout(db, user_id)
+
+    async def resolve_active_workout_async(self, db: AsyncSession, user_id: int) -> ActiveWorkoutRef:
+        """resolve_active_workout() for async routes"""
+        return await self.workout_service.get_or_start_workout_async(db, user_id)
+
+    def insert_events(self, db: Session, user_id: int, rows: List[Dict[str, Any]], commit: bool = True) -> ActiveWorkoutRef:
+        """Insert punch rows for a user's active workout with one multi-row INSERT"""
+        active_workout = self.resolve_active_workout(db, user_id)
+        self.insert_rows(db, user_id, active_workout.id, rows)
+        if commit:
             db.commit()
-            db.refresh(active_workout)
-        
-        # Process events
+        return active_workout
+
+    def insert_rows(self, db: Session, user_id: int, workout_id: int, rows: List[Dict[str, Any]]) -> int:
+        """Insert a user's punch rows into an already resolved workout (not committed)"""
+        if rows:
+            db.execute(insert(Punch), [dict(row, user_id=user_id, workout_id=workout_id) for row in rows])
+            daily_stats_service.add_punches(db, user_id, rows)
+        return len(rows)
+
+    async def process_ndjson_stream(self, db: AsyncSession, user_id: int, lines: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Validate NDJSON event lines incrementally and insert them in chunks.
+
+        A failing chunk does not undo the others. Nothing is committed here: the caller commits only once
+        the signature over the whole upload has been verified.
+        """
+        active_workout = await self.resolve_active_workout_async(db, user_id)
+        # Postgres aborts the whole transaction on an error, so each chunk gets a
+        # SAVEPOINT there. SQLite already undoes just the failed statement (and
+        # pysqlite would autocommit a SAVEPOINT opened outside a transaction).
+        use_savepoints = db.get_bind().dialect.name != "sqlite"
+        chunks: List[Dict[str, Any]] = []
+        rows: List[Dict[str, Any]] = []
+        rejected = 0
+        errors: List[str] = []
         punches_created = 0
-        for event in events:
-            punch = Punch(
-                workout_id=active_workout.id,
-                punch_type=event.punch_type,
-                speed=event.speed,
-                count=event.count,
-                timestamp=event.ts
-            )
-            db.add(punch)
-            punches_created += 1
-        
-        db.commit()
-        
+
+        async def flush_chunk() -> None:
+            nonlocal rows, rejected, errors, punches_created
+            chunk = {"chunk": len(chunks), "accepted": 0, "rejected": rejected, "status": "ok"}
+            if rows:
+                try:
+                    if use_savepoints:
+                        async with db.begin_nested():
+                            await db.run_sync(self.insert_rows, user_id, active_workout.id, rows)
+                    else:
+                        await db.run_sync(self.insert_rows, user_id, active_workout.id, rows)
+                    chunk["accepted"] = len(rows)
+                    punches_created += len(rows)
+                except Exception as e:
+                    chunk["status"] = "failed"
+                    chunk["rejected"] += len(rows)
+                    errors.append(f"insert failed: {str(e)[:200]}")
+            if errors:
+                chunk["errors"] = errors[:5]
+            chunks.append(chunk)
+            rows, rejected, errors = [], 0, []
+
+        async for line in lines:
+            try:
+                event = DeviceEvent(**json.loads(line))
+                rows.append({
+                    "timestamp": event.ts,
+                    "punch_type": event.punch_type,
+                    "speed": event.speed,
+                    "count": event.count
+                })
+            except Exception as e:
+                rejected += 1
+                if len(errors) < 5:
+                    errors.append(str(e)[:200])
+            if len(rows) + rejected >= self.ndjson_chunk_size:
+                await flush_chunk()
+        if rows or rejected:
+            await flush_chunk()
+
         return {
             "workout_id": active_workout.id,
             "punches_created": punches_created,
-            "message": "Events processed successfully"
+            "lines_rejected": sum(c["rejected"] for c in chunks),
+            "chunks": chunks,
+            "message": "Stream processed"
         }
 
     def _hash_secret(self, secret: str) -> str:
@@ -0,0 +1,288 @@
+import os
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable
+import redis
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from database import get_redis
+from metrics import record_ingest_flush, update_ingest_queue_depth
+
+
+class IngestQueue:
+    """Write-behind buffer for device events backed by a Redis Stream.
+
+    Enabled with DEVICE_INGEST_MODE=stream. Each ingest request becomes one
+    stream entry holding the user id and its events; IngestWorker threads
+    drain the stream through a consumer group.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or get_redis()
+        self.mode = os.getenv("DEVICE_INGEST_MODE", "direct")
+        self.stream = os.getenv("INGEST_STREAM", "device:ingest")
+        self.group = os.getenv("INGEST_GROUP", "ingest-writers")
+        self.dead_letter_stream = f"{self.stream}:dead"
+        self.max_len = int(os.getenv("INGEST_STREAM_MAXLEN", "1000000"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "stream"
+
+    def enqueue(self, user_id: int, events: List[Dict[str, Any]]) -> str:
+        """Append one batch of events; returns the stream entry id"""
+        payload = [
+            {
+                "ts": e["timestamp"].isoformat() if isinstance(e["timestamp"], datetime) else e["timestamp"],
+                "punch_type": e["punch_type"],
+                "speed": e["speed"],
+                "count": e["count"],
+            }
+            for e in events
+        ]
+        return self.redis_client.xadd(
+            self.stream,
+            {"user_id": user_id, "n": len(payload), "events": json.dumps(payload)},
+            maxlen=self.max_len,
+            approximate=True
+        )
+
+    def ensure_group(self) -> None:
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            # BUSYGROUP: group already exists
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def depth(self) -> int:
+        try:
+            depth = self.redis_client.xlen(self.stream)
+        except Exception:
+            return 0
+        update_ingest_queue_depth(depth)
+        return depth
+
+    @staticmethod
+    def decode_entry(fields: Dict[str, Any]) -> tuple:
+        """Turn a stream entry back into (user_id, punch rows)"""
+        rows = [
+            {
+                "timestamp": datetime.fromisoformat(e["ts"]),
+                "punch_type": e["punch_type"],
+                "speed": float(e["speed"]),
+                "count": int(e["count"]),
+            }
+            for e in json.loads(fields["events"])
+        ]
+        return int(fields["user_id"]), rows
+
+
+def is_transient_error(e: Exception) -> bool:
+    """True for outages (database or Redis unreachable) rather than bad entries"""
+    if isinstance(e, (OperationalError, PoolTimeoutError, redis.ConnectionError, redis.TimeoutError)):
+        return True
+    return isinstance(e, DBAPIError) and e.connection_invalidated
+
+
+class IngestWorker(threading.Thread):
+    """Consumer-group worker that drains the ingest stream in bounded batches.
+
+    A batch is flushed when it reaches INGEST_BATCH_SIZE events or
+    INGEST_FLUSH_MS has passed since its first entry. Entries are acked only
+    after their rows commit; entries left unacked by a crashed worker are
+    reclaimed with XAUTOCLAIM once idle for INGEST_RECLAIM_IDLE_MS.
+
+    Entries that fail because the database is unavailable stay pending and
+    are retried through the same reclaim path; entries that fail on their
+    own data, or have been delivered INGEST_MAX_DELIVERIES times, are moved
+    to the dead letter stream.
+    """
+
+    def __init__(
+        self,
+        queue: IngestQueue,
+        session_factory: Callable[[], Session],
+        resolve_fn: Callable[[Session, int], Any],
+        insert_fn: Callable[[Session, int, int, List[Dict[str, Any]]], int],
+        index: int = 0
+    ):
+        super().__init__(name=f"ingest-worker-{index}", daemon=True)
+        self.queue = queue
+        self.session_factory = session_factory
+        self.resolve_fn = resolve_fn
+        self.insert_fn = insert_fn
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{index}"
+        self.batch_size = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+        self.flush_ms = int(os.getenv("INGEST_FLUSH_MS", "250"))
+        # Blocking reads must return well before the shared pool's socket timeout,
+        # or an idle stream would look like an outage to the circuit breaker
+        socket_timeout = queue.redis_client.connection_pool.connection_kwargs.get("socket_timeout")
+        if socket_timeout:
+            self.flush_ms = min(self.flush_ms, max(1, int(socket_timeout * 1000) // 2))
+        self.reclaim_idle_ms = int(os.getenv("INGEST_RECLAIM_IDLE_MS", "60000"))
+        self.max_deliveries = int(os.getenv("INGEST_MAX_DELIVERIES", "5"))
+        self._stop_event = threading.Event()
+        self._last_reclaim = 0.0
+
+    def request_stop(self) -> None:
+        self._stop_event.set()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop reading new entries, drain what is buffered and join"""
+        self.request_stop()
+        self.join(timeout)
+
+    def run(self) -> None:
+        try:
+            self.queue.ensure_group()
+            # Entries delivered to this consumer before a restart come first
+            self._drain(start_id="0")
+        except Exception as e:
+            print(f"Ingest worker {self.consumer} could not recover pending entries: {e}")
+
+        while not self._stop_event.is_set():
+            try:
+                self._maybe_reclaim()
+                self._collect_and_flush()
+            except Exception as e:
+                print(f"Ingest worker {self.consumer} error: {e}")
+                time.sleep(1)
+
+        # Graceful shutdown: flush everything already delivered or waiting
+        try:
+            self._drain(start_id=">")
+        except Exception as e:
+            print(f"Ingest worker {self.consumer} shutdown drain failed: {e}")
+
+    def _collect_and_flush(self) -> None:
+        entries = []
+        events = 0
+        deadline = None
+        while events < self.batch_size and not self._stop_event.is_set():
+            block_ms = self.flush_ms if deadline is None else max(1, int((deadline - time.monotonic()) * 1000))
+            read = self._read(">", block_ms)
+            if not read:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_ms / 1000
+            entries.extend(read)
+            events += sum(int(fields.get("n", 1)) for _, fields in read)
+            if time.monotonic() >= deadline:
+                break
+        if entries:
+            self._flush(entries)
+        self.queue.depth()
+
+    def _drain(self, start_id: str) -> None:
+        while True:
+            entries = self._read(start_id, None)
+            if not entries:
+                return
+            if not self._flush(entries):
+                # Some entries stay pending (database unavailable); leave them to XAUTOCLAIM
+                return
+
+    def _read(self, start_id: str, block_ms: Optional[int]) -> list:
+        response = self.queue.redis_client.xreadgroup(
+            self.queue.group,
+            self.consumer,
+            {self.queue.stream: start_id},
+            count=self.batch_size,
+            block=block_ms
+        )
+        if not response:
+            return []
+        return [(entry_id, fields) for entry_id, fields in response[0][1] if fields]
+
+    def _maybe_reclaim(self) -> None:
+        now = time.monotonic()
+        if now - self._last_reclaim < self.reclaim_idle_ms / 1000:
+            return
+        self._last_reclaim = now
+        claimed = self.queue.redis_client.xautoclaim(
+            self.queue.stream,
+            self.queue.group,
+            self.consumer,
+            min_idle_time=self.reclaim_idle_ms,
+            start_id="0-0",
+            count=self.batch_size
+        )
+        entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+        if entries:
+            self._flush(entries)
+
+    def _flush(self, entries: list) -> bool:
+        """Insert all entries in one transaction, then ack them; False if any stay pending"""
+        start = time.perf_counter()
+        by_user: Dict[int, List[Dict[str, Any]]] = {}
+        db = self.session_factory()
+        try:
+            for _, fields in entries:
+                user_id, rows = IngestQueue.decode_entry(fields)
+                by_user.setdefault(user_id, []).extend(rows)
+            # Resolve (and auto-start) workouts before any insert so the rows
+            # of the whole batch commit in one transaction; sorted so concurrent
+            # workers lock the users' workout rows in the same order
+            workout_ids = {user_id: self.resolve_fn(db, user_id).id for user_id in sorted(by_user)}
+            for user_id, rows in by_user.items():
+                self.insert_fn(db, user_id, workout_ids[user_id], rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Ingest batch flush failed, retrying entries individually: {e}")
+            return self._flush_individually(db, entries)
+        finally:
+            db.close()
+
+        self.queue.redis_client.xack(self.queue.stream, self.queue.group, *[entry_id for entry_id, _ in entries])
+        record_ingest_flush(sum(len(rows) for rows in by_user.values()), time.perf_counter() - start)
+        return True
+
+    def _flush_individually(self, db: Session, entries: list) -> bool:
+        """Isolate poison entries so one bad batch cannot block the stream"""
+        for entry_id, fields in entries:
+            try:
+                user_id, rows = IngestQueue.decode_entry(fields)
+                self.insert_fn(db, user_id, self.resolve_fn(db, user_id).id, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                if is_transient_error(e) and self._delivery_count(entry_id) < self.max_deliveries:
+                    # The database is unavailable: this and the remaining entries stay pending
+                    print(f"Ingest entry {entry_id} left pending: {e}")
+                    return False
+                print(f"Moving ingest entry {entry_id} to dead letter stream: {e}")
+                self.queue.redis_client.xadd(self.queue.dead_letter_stream, dict(fields, error=str(e)[:500]))
+            self.queue.redis_client.xack(self.queue.stream, self.queue.group, entry_id)
+        return True
+
+    def _delivery_count(self, entry_id) -> int:
+        """How many times the group has delivered an entry (1 on first read)"""
+        pending = self.queue.redis_client.xpending_range(
+            self.queue.stream, self.queue.group, min=entry_id, max=entry_id, count=1
+        )
+        return int(pending[0]["times_delivered"]) if pending else 1
+
+
+def start_ingest_workers(queue: IngestQueue, session_factory, resolve_fn, insert_fn) -> List[IngestWorker]:
+    """Start INGEST_WORKERS consumer threads when the stream mode is enabled"""
+    if not queue.enabled:
+        return []
+    workers = [
+        IngestWorker(queue, session_factory, resolve_fn, insert_fn, index=i)
+        for i in range(int(os.getenv("INGEST_WORKERS", "1")))
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop_ingest_workers(workers: List[IngestWorker]) -> None:
+    for worker in workers:
+        worker.request_stop()
+    for worker in workers:
+        worker.join(10.0)
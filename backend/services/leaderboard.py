@@ -1,16 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from models import User, CoachAthlete, Punch, Workout
+from models import User, CoachAthlete
+from services.daily_stats import daily_stats_service, day_window
 
 class LeaderboardService:
     def get_weekly_leaderboard(self, db: Session, coach_id: int) -> List[Dict[str, Any]]:
         """Get weekly leaderboard for coach's athletes"""
-        # Calculate week boundaries
-        now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
-        
         # Get coach's athletes
         athletes = db.query(User).join(CoachAthlete).filter(
             CoachAthlete.coach_id == coach_id,
@@ -22,43 +18,21 @@ class LeaderboardService:
         
         athlete_ids = [athlete.id for athlete in athletes]
         
-        # Get weekly punch data for each athlete
-        leaderboard_data = []
+        # One rollup query covers every athlete's last 7 UTC days
+        first_day, last_day = day_window(7)
+        totals = daily_stats_service.daily_totals(db, athlete_ids, first_day, last_day)
+        week_days = [first_day + timedelta(days=i) for i in range(7)]
         
+        leaderboard_data = []
         for athlete in athletes:
-            # Get punches for this week
-            punches = db.query(Punch).join(Workout).filter(
-                Workout.user_id == athlete.id,
-                Punch.timestamp >= week_start
-            ).all()
-            
-            total_punches = sum(punch.count for punch in punches)
-            avg_speed = 0
-            if punches:
-                total_speed_weighted = sum(punch.speed * punch.count for punch in punches)
-                avg_speed = total_speed_weighted / total_punches
-            
-            # Get daily punches for sparkline (last 7 days)
-            daily_punches = []
-            for i in range(7):
-                day_start = week_start + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                day_punches = db.query(Punch).join(Workout).filter(
-                    Workout.user_id == athlete.id,
-                    Punch.timestamp >= day_start,
-                    Punch.timestamp < day_end
-                ).all()
-                
-                daily_total = sum(punch.count for punch in day_punches)
-                daily_punches.append(daily_total)
-            
+            days = totals[athlete.id]
+            week = daily_stats_service.window_totals(days, first_day, last_day)
             leaderboard_data.append({
                 "athlete_id": athlete.id,
                 "athlete_name": athlete.username,
-                "total_punches": total_punches,
-                "avg_speed": round(avg_speed, 2),
-                "daily_punches": daily_punches
+                "total_punches": week["total_punches"],
+                "avg_speed": week["avg_speed"],
+                "daily_punches": [days.get(day, {}).get("total_punches", 0) for day in week_days]
             })
         
         # Sort by total punches (descending)
@@ -1,14 +1,15 @@
 import os
 import smtplib
-import requests
 import hashlib
 import hmac
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from typing import Optional, Dict, Any
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from models import User, NotificationPrefs, Punch, Workout
+from services.daily_stats import daily_stats_service, day_window
 from schemas import WeeklyReportData
 
 
@@ -48,40 +49,26 @@ class NotificationService:
     def generate_weekly_report(self, db: Session, user_id: int) -> WeeklyReportData:
         """Generate weekly progress report data for a user"""
         now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
-        prior_week_start = week_start - timedelta(days=7)
+        first_day, last_day = day_window(7)
+        week_start = datetime.combine(first_day, time.min)
         
-        # Current week data
-        current_punches = db.query(Punch).join(Workout).filter(
-            Workout.user_id == user_id,
-            Punch.timestamp >= week_start
-        ).all()
-        
-        current_workouts = db.query(Workout).filter(
-            Workout.user_id == user_id,
-            Workout.started_at >= week_start
-        ).all()
-        
-        # Prior week data
-        prior_punches = db.query(Punch).join(Workout).filter(
-            Workout.user_id == user_id,
-            Punch.timestamp >= prior_week_start,
-            Punch.timestamp < week_start
-        ).all()
-        
-        # Calculate metrics
-        total_punches = sum(p.count for p in current_punches)
-        avg_speed = sum(p.speed * p.count for p in current_punches) / total_punches if total_punches > 0 else 0
-        workouts_count = len(current_workouts)
+        # Totals, workout counts and the prior week from 14 days of rollup rows
+        days = daily_stats_service.daily_totals(db, [user_id], first_day - timedelta(days=7), last_day)[user_id]
+        current = daily_stats_service.window_totals(days, first_day, last_day)
+        prior = daily_stats_service.window_totals(days, *day_window(7, last_day, offset_days=7))
+        total_punches, avg_speed = current["total_punches"], current["avg_speed"]
+        workouts_count = current["workout_count"]
         
-        # Best session (workout with most punches)
-        best_session_punches = 0
-        for workout in current_workouts:
-            workout_punches = sum(p.count for p in current_punches if p.workout_id == workout.id)
-            best_session_punches = max(best_session_punches, workout_punches)
+        # Best session (workout started this week with most punches)
+        best_session_punches = db.query(func.sum(Punch.count)).filter(
+            Punch.user_id == user_id,
+            Punch.workout_id.in_(
+                select(Workout.id).where(Workout.user_id == user_id, Workout.started_at >= week_start)
+            )
+        ).group_by(Punch.workout_id).order_by(func.sum(Punch.count).desc()).limit(1).scalar() or 0
         
         # Calculate change percentage
-        prior_total = sum(p.count for p in prior_punches)
+        prior_total = prior["total_punches"]
         change_percent = 0
         if prior_total > 0:
             change_percent = ((total_punches - prior_total) / prior_total) * 100
@@ -152,6 +139,8 @@ class NotificationService:
                 "content": [{"type": "text/html", "value": html_content}]
             }
             
+            import requests  # deferred: only needed when a message is actually sent
+
             response = requests.post(url, headers=headers, json=data)
             return response.status_code == 202
         except Exception as e:
@@ -198,6 +187,8 @@ class NotificationService:
                 }
             }
             
+            import requests
+
             response = requests.post(webhook_url, json=payload, timeout=10)
             return response.status_code in [200, 201, 202]
         except Exception as e:
@@ -0,0 +1,129 @@
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Monthly partitions of punches are named punches_pYYYY_MM; punches_default
+# catches rows outside every attached range.
+PARENT_TABLE = "punches"
+DEFAULT_PARTITION = "punches_default"
+PARTITION_NAME_RE = re.compile(r"^punches_p(\d{4})_(\d{2})$")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"punches_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Month covered by a partition name, or None for the default / foreign tables"""
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def expired_partitions(names: List[str], today: date, retention_months: int) -> List[str]:
+    """Partitions whose whole month is older than the retention window"""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today), -retention_months)
+    return sorted(
+        name for name in names
+        if partition_month(name) is not None and partition_month(name) < cutoff
+    )
+
+
+class PunchPartitionManager:
+    """Keeps monthly range partitions of punches ahead of time and enforces retention.
+
+    Only acts on Postgres when punches is a partitioned table (see migration
+    006); otherwise every call is a no-op.
+    """
+
+    def __init__(self):
+        self.months_ahead = int(os.getenv("PUNCH_PARTITION_MONTHS_AHEAD", "3"))
+        self.retention_months = int(os.getenv("PUNCH_RETENTION_MONTHS", "0"))  # 0 = keep forever
+        self.retention_action = os.getenv("PUNCH_RETENTION_ACTION", "detach")  # detach | drop
+
+    def is_partitioned(self, db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+        ), {"table": PARENT_TABLE}).scalar()
+
+    def attached_partitions(self, db: Session) -> List[str]:
+        return [
+            name for (name,) in db.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table)"
+            ), {"table": PARENT_TABLE})
+        ]
+
+    def ensure_partition(self, db: Session, month: date) -> bool:
+        """Create and attach the partition for a month; False if it already exists.
+
+        Rows already routed to the default partition for that month are moved
+        into the new partition first, otherwise ATTACH would be rejected.
+        """
+        name = partition_name(month)
+        if name in self.attached_partitions(db):
+            return False
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        # Hold off inserts into the default partition until the new range is attached
+        db.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+        db.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE \"timestamp\" >= :start AND \"timestamp\" < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), {"start": start, "end": end})
+        db.execute(text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        db.commit()
+        return True
+
+    def manage(self, db: Session, today: Optional[date] = None) -> Dict[str, Any]:
+        """Pre-create upcoming partitions and detach (or drop) expired ones"""
+        if not self.is_partitioned(db):
+            return {"partitioned": False, "created": [], "expired": []}
+
+        start = time.perf_counter()
+        today = today or datetime.utcnow().date()
+        current = month_start(today)
+        created = []
+        for offset in range(self.months_ahead + 1):
+            month = add_months(current, offset)
+            if self.ensure_partition(db, month):
+                created.append(partition_name(month))
+
+        expired = expired_partitions(self.attached_partitions(db), today, self.retention_months)
+        for name in expired:
+            # Detaching is metadata-only; the detached table can be archived or dropped later
+            db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if self.retention_action == "drop":
+                db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+
+        return {
+            "partitioned": True,
+            "created": created,
+            "expired": expired,
+            "action": self.retention_action,
+            "duration_seconds": time.perf_counter() - start,
+        }
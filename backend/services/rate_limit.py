@@ -0,0 +1,187 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from database import get_redis, get_async_redis
+
+# Token bucket over one or more keys, checked and consumed atomically.
+# KEYS: bucket keys. ARGV[1]: now in ms, then (capacity, refill per ms) per key.
+# A request is allowed only if every bucket has a token; tokens are taken from
+# all buckets or none. Returns {allowed, remaining, retry_after_ms, reset_ms, limiting_index}.
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local tokens = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1])
+    local ts = tonumber(state[2])
+    if current == nil or ts == nil then
+        current = capacity
+        ts = now
+    end
+    current = math.min(capacity, current + math.max(0, now - ts) * rate)
+    tokens[i] = current
+    if current < 1 then
+        allowed = 0
+        local wait = math.ceil((1 - current) / rate)
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+end
+local remaining = nil
+local limiting = 1
+local reset = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local current = tokens[i]
+    if allowed == 1 then
+        current = current - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(current), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate) + 1000)
+    local left = math.floor(current)
+    if remaining == nil or left < remaining then
+        remaining = left
+        limiting = i
+    end
+    local full = math.ceil((capacity - current) / rate)
+    if full > reset then
+        reset = full
+    end
+end
+return {allowed, remaining, retry_after, reset, limiting}
+"""
+
+
+class RateLimitResult:
+    """Outcome of a rate limit check; truthy when the request is allowed"""
+
+    __slots__ = ("allowed", "limit", "remaining", "retry_after", "reset_after")
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float, reset_after: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, remaining)
+        self.retry_after = retry_after
+        self.reset_after = reset_after
+
+    def __bool__(self) -> bool:
+        return self.allowed
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(max(0.0, self.reset_after))),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class RateLimiter:
+    """Token bucket limiter run as one Lua script per check (EVALSHA).
+
+    Limits are per minute and apply per API key (RATE_LIMIT_PER_MIN) and,
+    optionally, per user across all of their keys (RATE_LIMIT_USER_PER_MIN,
+    0 disables). If Redis cannot be reached, an in-process bucket enforces
+    the same limits for this worker instead of allowing everything.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or get_redis()
+        self.per_key_per_min = int(os.getenv("RATE_LIMIT_PER_MIN", "60"))
+        self.per_user_per_min = int(os.getenv("RATE_LIMIT_USER_PER_MIN", "0"))
+        self._script = None
+        self._async_script = None
+        self._local_buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def check(self, api_key_id: int, user_id: Optional[int] = None) -> RateLimitResult:
+        buckets = self._buckets(api_key_id, user_id)
+        try:
+            return self._check_redis(buckets)
+        except Exception:
+            return self._check_local(buckets)
+
+    async def check_async(self, api_key_id: int, user_id: Optional[int] = None) -> RateLimitResult:
+        """check() for async routes, through the shared asyncio Redis pool"""
+        buckets = self._buckets(api_key_id, user_id)
+        try:
+            return await self._check_redis_async(buckets)
+        except Exception:
+            return self._check_local(buckets)
+
+    def _buckets(self, api_key_id: int, user_id: Optional[int]) -> List[Tuple[str, int]]:
+        buckets = [(f"rate_limit:key:{api_key_id}", self.per_key_per_min)]
+        if user_id is not None and self.per_user_per_min > 0:
+            buckets.append((f"rate_limit:user:{user_id}", self.per_user_per_min))
+        return buckets
+
+    def _check_redis(self, buckets: List[Tuple[str, int]]) -> RateLimitResult:
+        if self._script is None:
+            # register_script uses EVALSHA and reloads the script on NOSCRIPT
+            self._script = self.redis_client.register_script(TOKEN_BUCKET_LUA)
+        return self._result(buckets, self._script(keys=[key for key, _ in buckets], args=self._script_args(buckets)))
+
+    async def _check_redis_async(self, buckets: List[Tuple[str, int]]) -> RateLimitResult:
+        client = await get_async_redis()
+        # Scripts are bound to one client, and the asyncio client is per event loop
+        if self._async_script is None or self._async_script.registered_client is not client:
+            self._async_script = client.register_script(TOKEN_BUCKET_LUA)
+        reply = await self._async_script(keys=[key for key, _ in buckets], args=self._script_args(buckets))
+        return self._result(buckets, reply)
+
+    @staticmethod
+    def _script_args(buckets: List[Tuple[str, int]]) -> list:
+        args = [int(time.time() * 1000)]
+        for _, limit in buckets:
+            args.extend([limit, limit / 60000.0])
+        return args
+
+    @staticmethod
+    def _result(buckets: List[Tuple[str, int]], reply: list) -> RateLimitResult:
+        allowed, remaining, retry_ms, reset_ms, limiting = reply
+        return RateLimitResult(
+            allowed=bool(int(allowed)),
+            limit=buckets[int(limiting) - 1][1],
+            remaining=int(remaining),
+            retry_after=int(retry_ms) / 1000,
+            reset_after=int(reset_ms) / 1000
+        )
+
+    def _check_local(self, buckets: List[Tuple[str, int]]) -> RateLimitResult:
+        """Same token bucket in process memory, used while Redis is unreachable"""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            retry_after = 0.0
+            for key, limit in buckets:
+                rate = limit / 60.0
+                tokens, ts = self._local_buckets.get(key, (float(limit), now))
+                tokens = min(float(limit), tokens + (now - ts) * rate)
+                levels.append(tokens)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+            allowed = retry_after == 0.0
+
+            remaining = None
+            limit_reported = buckets[0][1]
+            reset_after = 0.0
+            for (key, limit), tokens in zip(buckets, levels):
+                if allowed:
+                    tokens -= 1
+                self._local_buckets[key] = (tokens, now)
+                if remaining is None or int(tokens) < remaining:
+                    remaining = int(tokens)
+                    limit_reported = limit
+                reset_after = max(reset_after, (limit - tokens) / (limit / 60.0))
+
+        return RateLimitResult(allowed, limit_reported, remaining, retry_after, reset_after)
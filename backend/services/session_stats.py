@@ -0,0 +1,312 @@
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Punch, Session as SessionModel
+from services.archive import punch_archiver, naive_utc
+
+# Hash fields: total_punches, speed_sum (sum of speed * count), last_updated,
+# max_punch_id (newest punch the SQL rebuild saw) and one "type:<punch_type>"
+# tally per punch type.
+TYPE_PREFIX = "type:"
+
+# Applies one session's deltas, only to a hash a rebuild already stored, and
+# skips punches that rebuild had counted. The TTL is not refreshed, so any
+# drift is corrected by the next rebuild.
+# KEYS[1]: hash. ARGV: first punch id of the write, total, speed_sum,
+# last_updated, then (field, count) per punch type. Returns 0 if the hash is missing.
+INCREMENT_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if tonumber(ARGV[1]) <= tonumber(redis.call('HGET', KEYS[1], 'max_punch_id') or '0') then
+    return 1
+end
+redis.call('HINCRBY', KEYS[1], 'total_punches', ARGV[2])
+redis.call('HINCRBYFLOAT', KEYS[1], 'speed_sum', ARGV[3])
+redis.call('HSET', KEYS[1], 'last_updated', ARGV[4])
+for i = 5, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+# Replaces the hash with a rebuilt one unless a rebuild that saw newer punches
+# already stored it. KEYS[1]: hash. ARGV: max_punch_id, ttl, then field/value pairs.
+STORE_LUA = """
+if tonumber(ARGV[1]) < tonumber(redis.call('HGET', KEYS[1], 'max_punch_id') or '-1') then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'max_punch_id', ARGV[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class SessionStatsService:
+    """Per-session aggregates kept in a Redis hash at session_stats:{id}.
+
+    Only a rebuild from SQL creates the hash; increments apply to an existing
+    hash and skip punches the rebuild already counted (id <= max_punch_id),
+    so a rebuild racing an increment never counts a punch twice.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        # Scripts are bound to one client, and the asyncio client is per event loop
+        self._scripts: Dict[str, Any] = {}
+
+    def cache_key(self, session_id: int) -> str:
+        return f"session_stats:{session_id}"
+
+    def aggregate(self, db: Session, session_id: int) -> Dict[str, Any]:
+        """Compute session totals with one GROUP BY punch_type query, plus any archived rows"""
+        rows = db.query(
+            Punch.punch_type,
+            func.sum(Punch.count),
+            func.sum(Punch.speed * Punch.count),
+            func.max(Punch.timestamp),
+            func.max(Punch.id)
+        ).filter(Punch.session_id == session_id).group_by(Punch.punch_type).all()
+
+        punch_types = {}
+        speed_sum = 0.0
+        last_updated = None
+        max_punch_id = 0
+        for punch_type, count, weighted_speed, last_ts, last_id in rows:
+            punch_types[punch_type] = int(count or 0)
+            max_punch_id = max(max_punch_id, last_id or 0)
+            speed_sum += float(weighted_speed or 0.0)
+            last_ts = naive_utc(last_ts)
+            if last_ts and (last_updated is None or last_ts > last_updated):
+                last_updated = last_ts
+
+        archived = self.archived_punches(db, session_id)
+        if archived is not None:
+            for punch_type, agg in punch_archiver.aggregate_by_type(archived).items():
+                punch_types[punch_type] = punch_types.get(punch_type, 0) + agg["count"]
+                speed_sum += agg["speed_sum"]
+                if last_updated is None or agg["last_timestamp"] > last_updated:
+                    last_updated = agg["last_timestamp"]
+
+        return {
+            "total_punches": sum(punch_types.values()),
+            "speed_sum": speed_sum,
+            "punch_types": punch_types,
+            "last_updated": last_updated,
+            "max_punch_id": max_punch_id,
+        }
+
+    def archived_punches(self, db: Session, session_id: int):
+        """The session's rows moved to cold storage as an Arrow table, or None; only its months are read"""
+        session = db.get(SessionModel, session_id)
+        if not session or not session.started_at:
+            return None
+        return punch_archiver.read_punches(
+            db, session.user_id,
+            session.started_at - timedelta(days=1),
+            (session.ended_at or session.started_at) + timedelta(days=1),
+            session_id=session_id,
+        )
+
+    def increment(
+        self,
+        db: Session,
+        redis_client,
+        session_id: int,
+        punches: Iterable[Tuple[str, float, int]],
+        first_punch_id: int,
+        invalidate: Iterable[str] = (),
+    ) -> None:
+        """Apply (punch_type, speed, count) deltas to one session; see increment_many"""
+        self.increment_many(db, redis_client, {session_id: punches}, first_punch_id, invalidate)
+
+    def increment_many(
+        self,
+        db: Session,
+        redis_client,
+        punches_by_session: Dict[int, Iterable[Tuple[str, float, int]]],
+        first_punch_id: int,
+        invalidate: Iterable[str] = (),
+    ) -> None:
+        """Apply deltas to several sessions and delete the `invalidate` keys in one pipelined round trip.
+
+        `first_punch_id` is the lowest id the write committed. Sessions
+        without a cached hash are rebuilt from SQL instead.
+        """
+        increment_script = self._script(redis_client, INCREMENT_LUA)
+        pipe = redis_client.pipeline(transaction=False)
+        increments = self._increment_args(punches_by_session, first_punch_id)
+        for session_id, args in increments:
+            increment_script(keys=[self.cache_key(session_id)], args=args, client=pipe)
+        self._queue_invalidate(pipe, invalidate)
+        if not len(pipe):
+            return
+
+        results = pipe.execute()
+        for (session_id, _), applied in zip(increments, results):
+            if not applied:
+                self.rebuild(db, redis_client, session_id)
+
+    async def increment_many_async(
+        self,
+        db: AsyncSession,
+        redis_client,
+        punches_by_session: Dict[int, Iterable[Tuple[str, float, int]]],
+        first_punch_id: int,
+        invalidate: Iterable[str] = (),
+    ) -> None:
+        """increment_many with a redis.asyncio client"""
+        increment_script = self._script(redis_client, INCREMENT_LUA)
+        pipe = redis_client.pipeline(transaction=False)
+        increments = self._increment_args(punches_by_session, first_punch_id)
+        for session_id, args in increments:
+            await increment_script(keys=[self.cache_key(session_id)], args=args, client=pipe)
+        self._queue_invalidate(pipe, invalidate)
+        if not len(pipe):
+            return
+
+        results = await pipe.execute()
+        for (session_id, _), applied in zip(increments, results):
+            if not applied:
+                await self.rebuild_async(db, redis_client, session_id)
+
+    @staticmethod
+    def _increment_args(punches_by_session, first_punch_id: int) -> List[Tuple[int, list]]:
+        """(session_id, increment script ARGV) for each session with punches"""
+        increments = []
+        last_updated = datetime.utcnow().isoformat()
+        for session_id, punches in punches_by_session.items():
+            total = 0
+            speed_sum = 0.0
+            per_type: Dict[str, int] = {}
+            for punch_type, speed, count in punches:
+                total += count
+                speed_sum += speed * count
+                per_type[punch_type] = per_type.get(punch_type, 0) + count
+            if not total:
+                continue
+
+            args = [first_punch_id, total, speed_sum, last_updated]
+            for punch_type, count in per_type.items():
+                args.extend([f"{TYPE_PREFIX}{punch_type}", count])
+            increments.append((session_id, args))
+        return increments
+
+    @staticmethod
+    def _queue_invalidate(pipe, invalidate: Iterable[str]) -> None:
+        invalidate = list(invalidate)
+        if invalidate:
+            pipe.delete(*invalidate)
+
+    def rebuild(self, db: Session, redis_client, session_id: int) -> Dict[str, Any]:
+        """Recompute the hash from a SQL aggregate and store it"""
+        stats = self.aggregate(db, session_id)
+        try:
+            self._script(redis_client, STORE_LUA)(keys=[self.cache_key(session_id)], args=self._store_args(stats))
+        except Exception:
+            # Redis unavailable; callers still get the computed stats
+            pass
+        return stats
+
+    async def rebuild_async(self, db: AsyncSession, redis_client, session_id: int) -> Dict[str, Any]:
+        """rebuild with an AsyncSession and a redis.asyncio client"""
+        stats = await db.run_sync(self.aggregate, session_id)
+        try:
+            await self._script(redis_client, STORE_LUA)(keys=[self.cache_key(session_id)], args=self._store_args(stats))
+        except Exception:
+            pass
+        return stats
+
+    def _store_args(self, stats: Dict[str, Any]) -> list:
+        args = [
+            stats["max_punch_id"],
+            self.ttl_seconds,
+            "total_punches", stats["total_punches"],
+            "speed_sum", stats["speed_sum"],
+            "last_updated", stats["last_updated"].isoformat() if stats["last_updated"] else "",
+        ]
+        for punch_type, count in stats["punch_types"].items():
+            args.extend([f"{TYPE_PREFIX}{punch_type}", count])
+        return args
+
+    def _script(self, redis_client, lua: str):
+        """register_script once per client (EVALSHA, reloaded on NOSCRIPT)"""
+        script = self._scripts.get(lua)
+        if script is None or script.registered_client is not redis_client:
+            script = self._scripts[lua] = redis_client.register_script(lua)
+        return script
+
+    def read(self, redis_client, session_id: int) -> Optional[Dict[str, Any]]:
+        """Read the cached hash, or None on a miss"""
+        return self._parse(redis_client.hgetall(self.cache_key(session_id)))
+
+    async def read_async(self, redis_client, session_id: int) -> Optional[Dict[str, Any]]:
+        """read with a redis.asyncio client"""
+        return self._parse(await redis_client.hgetall(self.cache_key(session_id)))
+
+    @staticmethod
+    def _parse(raw: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not raw or "total_punches" not in raw:
+            return None
+
+        punch_types = {
+            field[len(TYPE_PREFIX):]: int(value)
+            for field, value in raw.items()
+            if field.startswith(TYPE_PREFIX)
+        }
+        return {
+            "total_punches": int(raw["total_punches"]),
+            "speed_sum": float(raw.get("speed_sum", 0.0)),
+            "punch_types": punch_types,
+            "last_updated": raw.get("last_updated") or None,
+        }
+
+    def speed_slope(self, db: Session, session_id: int) -> Optional[float]:
+        """Least-squares slope of punch speed against punch order (0, 1, 2, ...) in a session.
+
+        Computed in the database: regr_slope on Postgres; elsewhere the
+        sums are aggregated in SQL and the slope is finished in Python.
+        Sessions with archived rows are ordered and summed in Python over
+        live and archived punches together. None with fewer than two punches.
+        """
+        archived = self.archived_punches(db, session_id)
+        if archived is not None and archived.num_rows:
+            live = db.execute(select(Punch.timestamp, Punch.id, Punch.speed).where(Punch.session_id == session_id)).all()
+            ordered_rows = sorted(
+                [(naive_utc(timestamp), punch_id, speed) for timestamp, punch_id, speed in live]
+                + [(r["timestamp"], r["id"], r["speed"]) for r in archived.select(["timestamp", "id", "speed"]).to_pylist()]
+            )
+            speeds = [speed for _, _, speed in ordered_rows]
+            return self._slope(len(speeds), sum(speeds), sum(x * y for x, y in enumerate(speeds)))
+
+        position = (func.row_number().over(order_by=(Punch.timestamp, Punch.id)) - 1).label("x")
+        ordered = select(position, Punch.speed.label("y")).where(Punch.session_id == session_id).subquery()
+
+        if db.get_bind().dialect.name == "postgresql":
+            slope = db.scalar(select(func.regr_slope(ordered.c.y, ordered.c.x)))
+            return float(slope) if slope is not None else None
+
+        n, sum_y, sum_xy = db.execute(
+            select(func.count(), func.sum(ordered.c.y), func.sum(ordered.c.x * ordered.c.y))
+        ).one()
+        return self._slope(n, sum_y, sum_xy)
+
+    @staticmethod
+    def _slope(n: int, sum_y: float, sum_xy: float) -> Optional[float]:
+        if not n or n < 2:
+            return None
+        # x runs 0..n-1, so its sums have closed forms
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
+
+    @staticmethod
+    def average_speed(stats: Dict[str, Any]) -> float:
+        total = stats["total_punches"]
+        return round(stats["speed_sum"] / total, 2) if total else 0.0
+
+
+session_stats_service = SessionStatsService()
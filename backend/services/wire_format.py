@@ -0,0 +1,129 @@
+"""
+Compact binary wire format for device event batches.
+
+A frame is little-endian and columnar so each column is parsed with a single
+struct call instead of one JSON object and one pydantic model per event:
+
+    offset  size        field
+    0       4           magic b"PTB1"
+    4       2  (H)      api key length K
+    6       4  (I)      event count N
+    10      K           api key (utf-8)
+    ...     8N (d)      timestamps, unix seconds (UTC)
+    ...     N  (B)      punch type codes (see PUNCH_TYPE_CODES)
+    ...     8N (d)      speeds
+    ...     2N (H)      counts
+
+Speeds are float64 like JSON numbers, so a binary and a JSON upload of the
+same events store identical values.
+
+Devices sign the raw frame bytes exactly like JSON bodies.
+
+Large backfills use newline-delimited JSON instead (one DeviceEvent object
+per line), split incrementally by iter_ndjson_lines.
+"""
+import math
+import struct
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Tuple
+
+CONTENT_TYPE = "application/vnd.punchtracker.events+binary"
+MAGIC = b"PTB1"
+PUNCH_TYPES = ["jab", "cross", "hook", "uppercut"]
+PUNCH_TYPE_CODES = {name: code for code, name in enumerate(PUNCH_TYPES)}
+
+_HEADER = struct.Struct("<4sHI")
+_ROW_BYTES = 8 + 1 + 8 + 2
+
+
+class FrameError(ValueError):
+    """Raised when a binary frame is malformed"""
+
+
+class LineTooLongError(ValueError):
+    """Raised when an NDJSON line exceeds the per-line cap"""
+
+
+def is_binary_content_type(content_type: str) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() == CONTENT_TYPE
+
+
+def encode_event_frame(api_key: str, events: List[Dict[str, Any]]) -> bytes:
+    """Pack events (ts datetime or unix seconds, punch_type, speed, count) into a frame"""
+    key = api_key.encode("utf-8")
+    n = len(events)
+    timestamps = [
+        e["ts"].timestamp() if isinstance(e["ts"], datetime) else float(e["ts"])
+        for e in events
+    ]
+    return b"".join([
+        _HEADER.pack(MAGIC, len(key), n),
+        key,
+        struct.pack(f"<{n}d", *timestamps),
+        struct.pack(f"<{n}B", *(PUNCH_TYPE_CODES[e["punch_type"]] for e in events)),
+        struct.pack(f"<{n}d", *(e["speed"] for e in events)),
+        struct.pack(f"<{n}H", *(e.get("count", 1) for e in events)),
+    ])
+
+
+def decode_event_frame(body: bytes) -> Tuple[str, List[Dict[str, Any]]]:
+    """Unpack a frame into (api_key, punch rows) without per-event model construction"""
+    buf = memoryview(body)
+    if len(buf) < _HEADER.size:
+        raise FrameError("Frame too short")
+    magic, key_len, n = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise FrameError("Bad frame magic")
+    offset = _HEADER.size
+    if len(buf) != offset + key_len + n * _ROW_BYTES:
+        raise FrameError("Frame length does not match header")
+
+    api_key = bytes(buf[offset:offset + key_len]).decode("utf-8")
+    offset += key_len
+    timestamps = struct.unpack_from(f"<{n}d", buf, offset)
+    offset += 8 * n
+    type_codes = struct.unpack_from(f"<{n}B", buf, offset)
+    offset += n
+    speeds = struct.unpack_from(f"<{n}d", buf, offset)
+    offset += 8 * n
+    counts = struct.unpack_from(f"<{n}H", buf, offset)
+
+    if type_codes and max(type_codes) >= len(PUNCH_TYPES):
+        raise FrameError("Unknown punch type code")
+
+    rows = []
+    utcfromtimestamp = datetime.utcfromtimestamp
+    for ts, code, speed, count in zip(timestamps, type_codes, speeds, counts):
+        if not math.isfinite(ts) or not math.isfinite(speed):
+            raise FrameError("Non-finite timestamp or speed")
+        rows.append({
+            "timestamp": utcfromtimestamp(ts),
+            "punch_type": PUNCH_TYPES[code],
+            "speed": speed,
+            "count": count,
+        })
+    return api_key, rows
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Split a byte stream into non-empty NDJSON lines, holding at most one partial line"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).strip()
+            if len(line) > max_line_bytes:
+                raise LineTooLongError("NDJSON line too long")
+            if line:
+                yield line
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLongError("NDJSON line too long")
+    line = bytes(buffer).strip()
+    if line:
+        yield line
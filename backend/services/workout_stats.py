@@ -0,0 +1,106 @@
+from typing import Dict, Any
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from models import Workout, WorkoutSegment, WorkoutStats, Punch
+
+
+class WorkoutStatsService:
+    """Computes a closed workout's aggregates once and stores them in workout_stats.
+
+    A closed workout never changes (punch writers lock the workout row and
+    check it is still open, see WorkoutService.get_or_start_workout), so its
+    summary becomes a primary-key lookup instead of re-summing every punch.
+    """
+
+    def record(self, db: Session, workout: Workout) -> WorkoutStats:
+        """Aggregate a closed workout's punches (totals, type mix, per segment) and commit"""
+        totals = db.execute(
+            select(func.sum(Punch.count), func.sum(Punch.speed * Punch.count), func.max(Punch.speed))
+            .where(Punch.workout_id == workout.id)
+        ).one()
+        total = int(totals[0] or 0)
+
+        punch_mix = {
+            punch_type: int(count or 0)
+            for punch_type, count in db.execute(
+                select(Punch.punch_type, func.sum(Punch.count))
+                .where(Punch.workout_id == workout.id)
+                .group_by(Punch.punch_type)
+            )
+        }
+
+        segments = (
+            db.query(WorkoutSegment)
+            .filter(WorkoutSegment.workout_id == workout.id)
+            .order_by(WorkoutSegment.started_at)
+            .all()
+        )
+        # Generated segments share boundaries: the punch on a boundary belongs to the
+        # active segment, so rests only count punches strictly inside them
+        by_segment = {
+            segment_id: (int(count or 0), speed_sum or 0.0, speed_max or 0.0)
+            for segment_id, count, speed_sum, speed_max in db.execute(
+                select(WorkoutSegment.id, func.sum(Punch.count), func.sum(Punch.speed * Punch.count), func.max(Punch.speed))
+                .join(Punch, and_(
+                    Punch.workout_id == WorkoutSegment.workout_id,
+                    Punch.timestamp >= WorkoutSegment.started_at,
+                    Punch.timestamp <= WorkoutSegment.ended_at,
+                    or_(
+                        WorkoutSegment.kind != "rest",
+                        and_(Punch.timestamp > WorkoutSegment.started_at, Punch.timestamp < WorkoutSegment.ended_at),
+                    ),
+                ))
+                .where(WorkoutSegment.workout_id == workout.id)
+                .group_by(WorkoutSegment.id)
+            )
+        }
+        segment_stats = []
+        for s in segments:
+            count, speed_sum, speed_max = by_segment.get(s.id, (0, 0.0, 0.0))
+            segment_stats.append({
+                "id": s.id,
+                "kind": s.kind,
+                "started_at": s.started_at.isoformat(),
+                "ended_at": s.ended_at.isoformat(),
+                "target_seconds": s.target_seconds,
+                "punches": count,
+                "average_speed": round(speed_sum / count, 2) if count else 0.0,
+                "max_speed": float(speed_max),
+            })
+
+        stats = db.get(WorkoutStats, workout.id) or WorkoutStats(workout_id=workout.id)
+        stats.user_id = workout.user_id
+        stats.started_at = workout.started_at
+        stats.ended_at = workout.ended_at
+        stats.duration_seconds = int((workout.ended_at - workout.started_at).total_seconds())
+        stats.total_punches = total
+        stats.average_speed = round((totals[1] or 0.0) / total, 2) if total else 0.0
+        stats.max_speed = float(totals[2] or 0.0)
+        stats.rounds = len([s for s in segments if s.kind == "active"])
+        stats.rests = len([s for s in segments if s.kind == "rest"])
+        stats.punch_mix = punch_mix
+        stats.segments = segment_stats
+        db.add(stats)
+        db.commit()
+        return stats
+
+    @staticmethod
+    def to_summary(stats: WorkoutStats) -> Dict[str, Any]:
+        """WorkoutSummary fields from a stored stats row"""
+        return {
+            "id": stats.workout_id,
+            "user_id": stats.user_id,
+            "started_at": stats.started_at,
+            "ended_at": stats.ended_at,
+            "total_punches": stats.total_punches,
+            "average_speed": stats.average_speed,
+            "max_speed": stats.max_speed,
+            "duration_seconds": stats.duration_seconds,
+            "rounds": stats.rounds,
+            "rests": stats.rests,
+            "punch_mix": stats.punch_mix,
+            "segments": stats.segments,
+        }
+
+
+workout_stats_service = WorkoutStatsService()
@@ -0,0 +1,135 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Workout, Punch
+from metrics import record_workouts_reaped
+from services.active_workouts import active_workout_registry, ActiveWorkoutRef
+from services.daily_stats import daily_stats_service
+from services.workout_stats import workout_stats_service
+
+
+class WorkoutService:
+    def __init__(self):
+        self.inactivity_minutes = int(os.getenv("INACTIVITY_MINUTES", "3"))
+
+    def get_active_workout(self, db: Session, user_id: int) -> Optional[ActiveWorkoutRef]:
+        """Open workout for a user, served from the active-workout registry"""
+        return active_workout_registry.get(db, user_id)
+
+    def get_or_start_workout(self, db: Session, user_id: int) -> ActiveWorkoutRef:
+        """Return the open workout, auto-starting (and committing) one if none exists.
+
+        The workout row is locked and checked open in the caller's transaction,
+        so punches inserted before its commit never land in a closed workout.
+        """
+        active = active_workout_registry.get(db, user_id)
+        if active and not db.execute(self._lock_open_workout(active.id)).first():
+            # Stale registry entry: the workout was stopped or reaped
+            active_workout_registry.evict(user_id)
+            active = active_workout_registry.get(db, user_id)
+            if active and not db.execute(self._lock_open_workout(active.id)).first():
+                active = None
+        if active:
+            return active
+        return self.start_workout(db, user_id, auto_detected=True)
+
+    async def get_active_workout_async(self, db: AsyncSession, user_id: int) -> Optional[ActiveWorkoutRef]:
+        """get_active_workout() for async routes"""
+        return await active_workout_registry.get_async(db, user_id)
+
+    async def get_or_start_workout_async(self, db: AsyncSession, user_id: int) -> ActiveWorkoutRef:
+        """get_or_start_workout() for async routes"""
+        active = await active_workout_registry.get_async(db, user_id)
+        if active and not (await db.execute(self._lock_open_workout(active.id))).first():
+            await active_workout_registry.evict_async(user_id)
+            active = await active_workout_registry.get_async(db, user_id)
+            if active and not (await db.execute(self._lock_open_workout(active.id))).first():
+                active = None
+        if active:
+            return active
+        return await self.start_workout_async(db, user_id, auto_detected=True)
+
+    def start_workout(self, db: Session, user_id: int, auto_detected: bool = False) -> ActiveWorkoutRef:
+        return active_workout_registry.set(user_id, *self._open_workout(db, user_id, auto_detected))
+
+    async def start_workout_async(self, db: AsyncSession, user_id: int, auto_detected: bool = False) -> ActiveWorkoutRef:
+        """start_workout() for async routes"""
+        ref = await db.run_sync(self._open_workout, user_id, auto_detected)
+        return await active_workout_registry.set_async(user_id, *ref)
+
+    @staticmethod
+    def _lock_open_workout(workout_id: int):
+        # FOR UPDATE holds off a concurrent stop or reap until the punches commit
+        return select(Workout.id).where(Workout.id == workout_id, Workout.ended_at == None).with_for_update()
+
+    def _open_workout(self, db: Session, user_id: int, auto_detected: bool) -> ActiveWorkoutRef:
+        """Insert and commit an open workout (the registry is updated by the caller)"""
+        workout = Workout(user_id=user_id, started_at=datetime.utcnow(), auto_detected=auto_detected)
+        db.add(workout)
+        daily_stats_service.add_workout(db, user_id, workout.started_at)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request opened one first (ux_workouts_open_user_id): use that one
+            db.rollback()
+            row = db.query(Workout.id, Workout.started_at).filter(
+                Workout.user_id == user_id,
+                Workout.ended_at == None
+            ).one()
+            return ActiveWorkoutRef(id=row.id, started_at=row.started_at)
+        db.refresh(workout)
+        return ActiveWorkoutRef(id=workout.id, started_at=workout.started_at)
+
+    def reap_stale_workouts(self, db: Session) -> Dict[str, Any]:
+        """Close open workouts whose last punch is older than the inactivity window.
+
+        Runs as one set-based UPDATE instead of a per-workout "last punch"
+        query, then generates segments and stores stats for the workouts it closed.
+        """
+        # Imported here to keep services free of route imports at module load
+        from routes.workouts import _generate_segments_for_workout
+
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        threshold = now - timedelta(minutes=self.inactivity_minutes)
+
+        # "Has punches, none since threshold" is the same as "last punch before
+        # threshold", but the recent-punch probe only touches the newest partitions
+        has_punches = select(Punch.id).where(Punch.workout_id == Workout.id).exists()
+        recent_punch = (
+            select(Punch.id)
+            .where(Punch.workout_id == Workout.id, Punch.timestamp >= threshold)
+            .exists()
+        )
+        reaped = db.execute(
+            update(Workout)
+            .where(Workout.ended_at == None, has_punches, ~recent_punch)
+            .values(ended_at=now)
+            .returning(Workout.id, Workout.user_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        reaped_ids = [row.id for row in reaped]
+        for row in reaped:
+            active_workout_registry.clear(row.user_id)
+
+        # Generate segments and stats for the closed workouts (best-effort)
+        if reaped_ids:
+            for workout in db.query(Workout).filter(Workout.id.in_(reaped_ids)).all():
+                try:
+                    _generate_segments_for_workout(db, workout)
+                except Exception:
+                    db.rollback()
+                try:
+                    workout_stats_service.record(db, workout)
+                except Exception:
+                    db.rollback()
+
+        duration = time.perf_counter() - start
+        record_workouts_reaped(len(reaped_ids), duration)
+        return {"reaped": len(reaped_ids), "workout_ids": list(reaped_ids), "duration_seconds": duration}
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+@pytest.fixture(scope="module", autouse=True)
+def app_database(request):
+    """Route the app's database dependencies to the module's SQLALCHEMY_DATABASE_URL.
+
+    Installed per test module and cleared on teardown, so modules sharing one
+    pytest run never see each other's database.
+    """
+    url = getattr(request.module, "SQLALCHEMY_DATABASE_URL", None)
+    if url is None:
+        yield
+        return
+
+    from main import app
+    from database import get_db, get_read_db, get_async_db, get_async_read_db
+
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # TestClient runs each request on a fresh event loop, so async connections are not pooled
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), poolclass=NullPool)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+    yield
+    app.dependency_overrides.clear()
+    engine.dispose()
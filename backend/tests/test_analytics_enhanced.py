@@ -3,9 +3,11 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from database import get_db, Base
+from database import Base
 from models import User, Session, Punch
 from auth import get_password_hash
+from services.device import DeviceService
+from services.daily_stats import daily_stats_service
 from datetime import datetime, timedelta
 
 # Test database setup
@@ -13,15 +15,6 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test_analytics.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
 client = TestClient(app)
 
 @pytest.fixture(scope="module")
@@ -108,6 +101,164 @@ def test_weekly_analytics_with_data(test_user):
     assert data["this_week"]["avg_speed"] > 0
     assert len(data["sparkline_data"]) == 4  # 4 weeks of data
 
+def test_weekly_analytics_includes_device_punches(test_user):
+    """Test punches logged by a device without a session still count for the user"""
+    headers = {"Authorization": f"Bearer {test_user}"}
+    before = client.get("/api/analytics/weekly", headers=headers).json()["this_week"]["total_punches"]
+
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.email == "analytics@example.com").first()
+    DeviceService().insert_rows(db, user.id, None, [
+        {"punch_type": "hook", "speed": 30.0, "count": 2, "timestamp": datetime.utcnow()}
+        for _ in range(3)
+    ])
+    db.commit()
+    db.close()
+
+    after = client.get("/api/analytics/weekly", headers=headers).json()["this_week"]["total_punches"]
+    assert after == before + 6
+
+def test_history_analytics_range(test_user):
+    """Test range totals over explicit days and rejection of an inverted range"""
+    headers = {"Authorization": f"Bearer {test_user}"}
+    today = datetime.utcnow().date()
+    response = client.get(f"/api/analytics/history?start={today - timedelta(days=30)}&end={today}", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_punches"] == sum(data["punch_types"].values())
+    assert data["archived_rows"] == 0
+
+    response = client.get(f"/api/analytics/history?start={today}&end={today - timedelta(days=1)}", headers=headers)
+    assert response.status_code == 400
+
+def _per_row_weekly(db, user_id, now):
+    """Weekly analytics recomputed row by row with the endpoint's semantics.
+
+    Weeks are seven whole UTC days ending today and average speed is weighted
+    by punch count, as served from the daily rollup.
+    """
+    sessions = db.query(Session).filter(Session.user_id == user_id).all()
+    this_week_sessions = [s for s in sessions if s.started_at >= now - timedelta(days=7)]
+    last_week_sessions = [s for s in sessions if now - timedelta(days=14) <= s.started_at < now - timedelta(days=7)]
+    punches = db.query(Punch).filter(Punch.user_id == user_id).all()
+
+    def week(offset):
+        last = now.date() - timedelta(days=offset)
+        rows = [p for p in punches if last - timedelta(days=6) <= p.timestamp.date() <= last]
+        total = sum(p.count for p in rows)
+        avg = round(sum(p.speed * p.count for p in rows) / total, 2) if total else 0.0
+        return last, total, avg
+
+    weeks = [week(7 * i) for i in range(4)]
+    (_, this_total, this_avg), (_, last_total, last_avg) = weeks[0], weeks[1]
+    delta = ((this_total - last_total) / last_total) * 100 if last_total else (100 if this_total else 0)
+
+    latest = max(this_week_sessions, key=lambda s: s.started_at)
+    speeds = [p.speed for p in sorted((p for p in punches if p.session_id == latest.id), key=lambda p: p.timestamp)]
+    x_mean, y_mean = (len(speeds) - 1) / 2, sum(speeds) / len(speeds)
+    slope = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(speeds)) / sum((x - x_mean) ** 2 for x in range(len(speeds)))
+
+    return {
+        "this_week": {"total_punches": this_total, "avg_speed": this_avg, "sessions_count": len(this_week_sessions)},
+        "last_week": {"total_punches": last_total, "avg_speed": last_avg, "sessions_count": len(last_week_sessions)},
+        "delta_percent": round(delta, 1),
+        "sparkline_data": [{"date": last.strftime("%Y-%m-%d"), "total_punches": total} for last, total, _ in weeks],
+        "fatigue_proxy": round(-slope, 3),
+    }
+
+def _baseline_weekly(db, user_id, now):
+    """Weekly analytics as the endpoint computed them before the daily rollup.
+
+    Weeks were rolling 168-hour windows ending now, and average speed divided
+    the weighted speed sum by the number of punch rows rather than by punches.
+    """
+    sessions = db.query(Session).filter(Session.user_id == user_id).all()
+    punches = db.query(Punch).join(Session).filter(Session.user_id == user_id).all()
+
+    def window(end):
+        rows = [p for p in punches if end - timedelta(days=7) <= p.timestamp < end]
+        return sum(p.count for p in rows), round(sum(p.speed * p.count for p in rows) / max(len(rows), 1), 2)
+
+    this_week_sessions = [s for s in sessions if s.started_at >= now - timedelta(days=7)]
+    last_week_sessions = [s for s in sessions if now - timedelta(days=14) <= s.started_at < now - timedelta(days=7)]
+    (this_total, this_avg), (last_total, last_avg) = window(now), window(now - timedelta(days=7))
+    delta = ((this_total - last_total) / last_total) * 100 if last_total else (100 if this_total else 0)
+
+    latest = max(this_week_sessions, key=lambda s: s.started_at)
+    speeds = [p.speed for p in sorted((p for p in punches if p.session_id == latest.id), key=lambda p: p.timestamp)]
+    x_mean, y_mean = (len(speeds) - 1) / 2, sum(speeds) / len(speeds)
+    slope = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(speeds)) / sum((x - x_mean) ** 2 for x in range(len(speeds)))
+
+    return {
+        "this_week": {"total_punches": this_total, "avg_speed": this_avg, "sessions_count": len(this_week_sessions)},
+        "last_week": {"total_punches": last_total, "avg_speed": last_avg, "sessions_count": len(last_week_sessions)},
+        "delta_percent": round(delta, 1),
+        "sparkline_data": [
+            {"date": (now - timedelta(days=7 * i)).strftime("%Y-%m-%d"), "total_punches": window(now - timedelta(days=7 * i))[0]}
+            for i in range(4)
+        ],
+        "fatigue_proxy": round(-slope, 3),
+    }
+
+@pytest.fixture
+def weekly_user(setup_database):
+    """A user with seven sessions over four weeks, none near a day boundary of the windows; yields (token, user_id, now)"""
+    client.post("/auth/signup", json={
+        "username": "weeklyref", "email": "weeklyref@example.com", "password": "testpassword123", "role": "athlete"
+    })
+    token = client.post("/auth/login", json={
+        "email": "weeklyref@example.com", "password": "testpassword123"
+    }).json()["access_token"]
+
+    now = datetime.utcnow()
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.email == "weeklyref@example.com").one()
+    for days_ago, n in ((1, 40), (2, 15), (3, 8), (9, 20), (11, 5), (16, 12), (24, 30)):
+        started = now - timedelta(days=days_ago, hours=1)
+        session = Session(user_id=user.id, name=f"{days_ago} days ago", started_at=started)
+        db.add(session)
+        db.commit()
+        db.add_all([
+            Punch(user_id=user.id, session_id=session.id, punch_type=("jab", "cross", "hook")[i % 3],
+                  speed=30.0 - 0.1 * i + (i % 3) * 0.7, count=1 + i % 2,
+                  timestamp=started + timedelta(seconds=5 * i))
+            for i in range(n)
+        ])
+        db.commit()
+    daily_stats_service.rebuild(db, user_id=user.id)
+    user_id = user.id
+    db.close()
+    yield token, user_id, now
+
+def test_weekly_analytics_matches_per_row_day_buckets(weekly_user):
+    """Test the bucketed queries return what a per-row computation of the same day-bucket semantics does"""
+    token, user_id, now = weekly_user
+    response = client.get("/api/analytics/weekly", headers={"Authorization": f"Bearer {token}"})
+    db = TestingSessionLocal()
+    expected = _per_row_weekly(db, user_id, now)
+    db.close()
+
+    assert response.status_code == 200
+    assert response.json() == expected
+    assert expected["this_week"]["sessions_count"] == 3 and expected["last_week"]["sessions_count"] == 2
+
+def test_weekly_analytics_differs_from_baseline_only_in_average_speed(weekly_user):
+    """Test that, away from day boundaries, only avg_speed differs from the pre-rollup endpoint.
+
+    avg_speed is now weighted by punch count; the baseline divided by row count.
+    """
+    token, user_id, now = weekly_user
+    data = client.get("/api/analytics/weekly", headers={"Authorization": f"Bearer {token}"}).json()
+    db = TestingSessionLocal()
+    baseline = _baseline_weekly(db, user_id, now)
+    db.close()
+
+    for week in ("this_week", "last_week"):
+        new_avg, old_avg = data[week].pop("avg_speed"), baseline[week].pop("avg_speed")
+        # Every other row has count 2, which inflated the per-row average
+        assert new_avg < old_avg
+    assert data == baseline
+
 def test_weekly_analytics_unauthorized():
     """Test weekly analytics without authentication"""
     response = client.get("/api/analytics/weekly")
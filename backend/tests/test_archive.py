@@ -0,0 +1,144 @@
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Session as SessionModel, Punch, PunchArchive, UserDailyStats, Workout, WorkoutStats
+from services.archive import PunchArchiver, punch_archiver
+from services.daily_stats import daily_stats_service
+from services.session_stats import session_stats_service
+
+pytest.importorskip("pyarrow")
+
+engine = create_engine("sqlite:///./test_archive.db", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TODAY = date(2026, 6, 15)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def archiver(tmp_path, monkeypatch):
+    # Configure the shared instance: session analytics read through it too
+    monkeypatch.setattr(punch_archiver, "after_days", 60)
+    monkeypatch.setattr(punch_archiver, "uri", str(tmp_path))
+    monkeypatch.setattr(punch_archiver, "_fs", None)
+    return punch_archiver
+
+def _history(db):
+    """A user with one session / workout in Jan, one in Feb and live punches in June"""
+    user = User(username="archived", email="archived@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    sessions = {}
+    for month in (1, 2, 6):
+        started = datetime(2026, month, 10, 18, 0)
+        session = SessionModel(user_id=user.id, name=f"Month {month}", started_at=started)
+        workout = Workout(user_id=user.id, started_at=started, ended_at=started + timedelta(minutes=10))
+        db.add_all([session, workout])
+        db.commit()
+        db.add_all([
+            Punch(user_id=user.id, session_id=session.id, workout_id=workout.id,
+                  punch_type=("jab", "cross", "hook")[i % 3], speed=15.0 + i, count=1 + i % 2,
+                  timestamp=started + timedelta(seconds=10 * i))
+            for i in range(12)
+        ])
+        db.commit()
+        sessions[month] = session.id
+    daily_stats_service.rebuild(db)
+    return user.id, sessions
+
+def test_archive_moves_whole_old_months(db, archiver, tmp_path):
+    """Test months before the cutoff leave the punches table and land in manifest-listed files"""
+    user_id, _ = _history(db)
+
+    result = archiver.run(db, today=TODAY)
+
+    assert result["cutoff"] == "2026-04-01"
+    assert (result["months"], result["rows"]) == (2, 24)
+    assert db.query(Punch).count() == 12
+    entries = db.query(PunchArchive).order_by(PunchArchive.month).all()
+    assert [(e.month, e.row_count) for e in entries] == [(date(2026, 1, 1), 12), (date(2026, 2, 1), 12)]
+    assert all((tmp_path / e.path).exists() for e in entries)
+
+def test_range_answers_unchanged_by_archival(db, archiver):
+    """Test range totals, session analytics and rollups are identical before and after archival"""
+    user_id, sessions = _history(db)
+    start, end = datetime(2026, 1, 1), datetime(2026, 7, 1)
+    before = archiver.range_summary(db, user_id, start, end)
+    session_before = session_stats_service.aggregate(db, sessions[1])
+    rollup_before = db.query(UserDailyStats).count()
+
+    archiver.run(db, today=TODAY)
+    after = archiver.range_summary(db, user_id, start, end)
+    session_after = session_stats_service.aggregate(db, sessions[1])
+    daily_stats_service.rebuild(db)
+
+    assert after.pop("archived_rows") == 24
+    before.pop("archived_rows")
+    assert after == before
+    assert session_after["punch_types"] == session_before["punch_types"]
+    assert session_after["speed_sum"] == pytest.approx(session_before["speed_sum"])
+    assert db.query(UserDailyStats).count() == rollup_before
+
+def test_session_punches_and_slope_include_archived_rows(db, archiver):
+    """Test the session punch list and speed slope read archived rows alongside live ones"""
+    from routes.punches import _session_punches
+    from schemas import PunchResponse
+
+    user_id, sessions = _history(db)
+    session_id = sessions[1]
+
+    def punch_list():
+        return [PunchResponse.model_validate(p).model_dump() for p in _session_punches(db, session_id)]
+
+    listed_before = punch_list()
+    slope_before = session_stats_service.speed_slope(db, session_id)
+    archiver.run(db, today=TODAY)
+
+    assert db.query(Punch).filter(Punch.session_id == session_id).count() == 0
+    assert punch_list() == listed_before
+    assert session_stats_service.speed_slope(db, session_id) == pytest.approx(slope_before)
+
+    # A late live row is listed after the archived ones and joins the regression
+    db.add(Punch(user_id=user_id, session_id=session_id, punch_type="jab", speed=5.0, count=1,
+                 timestamp=datetime(2026, 1, 10, 18, 5)))
+    db.commit()
+    assert [p["speed"] for p in punch_list()][-1] == 5.0
+    assert session_stats_service.speed_slope(db, session_id) < slope_before
+
+def test_archival_pins_workout_stats(db, archiver):
+    """Test closed workouts get their stats stored before their punches are archived"""
+    _history(db)
+    archiver.run(db, today=TODAY)
+
+    stats = db.query(WorkoutStats).order_by(WorkoutStats.started_at).all()
+    assert [s.total_punches for s in stats] == [18, 18]
+
+def test_late_rows_rewrite_the_month_file(db, archiver, tmp_path):
+    """Test re-archiving a month merges late rows into a new file and removes the old one"""
+    user_id, _ = _history(db)
+    archiver.run(db, today=TODAY)
+    old_path = db.query(PunchArchive).filter(PunchArchive.month == date(2026, 1, 1)).one().path
+
+    db.add(Punch(user_id=user_id, punch_type="jab", speed=40.0, count=1, timestamp=datetime(2026, 1, 20, 9, 0)))
+    db.commit()
+    result = archiver.run(db, today=TODAY)
+
+    entry = db.query(PunchArchive).filter(PunchArchive.month == date(2026, 1, 1)).one()
+    assert result["rows"] == 1
+    assert entry.row_count == 13
+    assert entry.max_timestamp == datetime(2026, 1, 20, 9, 0)
+    assert not (tmp_path / old_path).exists()
+    assert archiver.read_punches(db, user_id, datetime(2026, 1, 1), datetime(2026, 2, 1)).num_rows == 13
+
+def test_disabled_by_default(db):
+    """Test archival is a no-op unless PUNCH_ARCHIVE_AFTER_DAYS is set"""
+    _history(db)
+    assert PunchArchiver().run(db, today=TODAY)["enabled"] is False
+    assert db.query(Punch).count() == 36
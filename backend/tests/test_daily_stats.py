@@ -0,0 +1,85 @@
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Punch, UserDailyStats
+from services.daily_stats import daily_stats_service, day_window, ALL_TYPES
+from services.device import DeviceService
+from services.workouts import WorkoutService
+
+engine = create_engine("sqlite:///./test_daily_stats.db", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    user = User(username="rollup", email="rollup@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _user_id(db):
+    return db.query(User).filter(User.username == "rollup").one().id
+
+def _rows(db, user_id):
+    return {
+        (r.day, r.punch_type): (r.count, r.speed_sum, r.speed_max, r.workout_count)
+        for r in db.query(UserDailyStats).filter(UserDailyStats.user_id == user_id)
+    }
+
+def test_upserts_accumulate_and_keep_max_speed(db):
+    """Test repeated ingests add counts and speed sums and keep the highest speed"""
+    user_id = _user_id(db)
+    ts = datetime(2026, 3, 2, 10, 0)
+    daily_stats_service.add_punches(db, user_id, [
+        {"timestamp": ts, "punch_type": "jab", "speed": 20.0, "count": 2},
+        {"timestamp": ts, "punch_type": "jab", "speed": 30.0, "count": 1},
+    ])
+    daily_stats_service.add_punches(db, user_id, [
+        {"timestamp": ts + timedelta(hours=1), "punch_type": "jab", "speed": 25.0, "count": 1},
+        {"timestamp": ts + timedelta(days=1), "punch_type": "hook", "speed": 10.0, "count": 1},
+    ])
+    db.commit()
+
+    rows = _rows(db, user_id)
+    assert rows[(date(2026, 3, 2), "jab")] == (4, 95.0, 30.0, 0)
+    assert rows[(date(2026, 3, 3), "hook")] == (1, 10.0, 10.0, 0)
+
+def test_rebuild_matches_incremental_rollup(db):
+    """Test rebuilding from punches and workouts reproduces what ingest maintained"""
+    user_id = _user_id(db)
+    workout = WorkoutService().start_workout(db, user_id)
+    now = datetime.utcnow()
+    DeviceService().insert_rows(db, user_id, workout.id, [
+        {"timestamp": now - timedelta(days=offset), "punch_type": punch_type, "speed": speed, "count": 1}
+        for offset in range(3)
+        for punch_type, speed in (("jab", 21.0), ("cross", 27.5))
+    ])
+    db.commit()
+    incremental = _rows(db, user_id)
+    assert incremental[(now.date(), ALL_TYPES)][3] == 1
+
+    assert daily_stats_service.rebuild(db, user_id=user_id) == len(incremental)
+    assert _rows(db, user_id) == incremental
+
+def test_window_totals_are_count_weighted(db):
+    """Test window totals sum days in range and weight the average by punch count"""
+    user_id = _user_id(db)
+    first_day, today = day_window(7)
+    db.add_all([
+        Punch(user_id=user_id, punch_type="jab", speed=10.0, count=3, timestamp=datetime.utcnow()),
+        Punch(user_id=user_id, punch_type="jab", speed=30.0, count=1, timestamp=datetime.utcnow() - timedelta(days=2)),
+        Punch(user_id=user_id, punch_type="jab", speed=99.0, count=5, timestamp=datetime.utcnow() - timedelta(days=9)),
+    ])
+    db.commit()
+    daily_stats_service.rebuild(db)
+
+    days = daily_stats_service.daily_totals(db, [user_id], first_day, today)[user_id]
+    week = daily_stats_service.window_totals(days, first_day, today)
+    assert week["total_punches"] == 4
+    assert week["avg_speed"] == 15.0
+    assert week["speed_max"] == 30.0
@@ -0,0 +1,264 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, ApiKey
+from services.device import DeviceService
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_device.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def user(db):
+    user = User(username="deviceuser", email="device@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_verify_api_key_by_prefix(db, user):
+    """Test a created key is found through its indexed prefix"""
+    service = DeviceService()
+    created = service.create_api_key(db, user.id, "glove")
+
+    stored = db.query(ApiKey).filter(ApiKey.id == created["id"]).first()
+    assert stored.key_prefix == created["secret"][:12]
+
+    verified = service.verify_api_key(db, created["secret"])
+    assert verified.id == created["id"]
+    assert verified.user_id == user.id
+    assert service.verify_api_key(db, created["secret"][:12] + "wrong") is None
+
+def test_verify_api_key_legacy_backfill(db, user):
+    """Test keys without a prefix are still accepted and get backfilled"""
+    service = DeviceService()
+    secret = "legacy-secret-value-1234567890"
+    db.add(ApiKey(user_id=user.id, name="old", secret_hash=service._hash_secret(secret)))
+    db.commit()
+
+    verified = service.verify_api_key(db, secret)
+    assert verified is not None
+    stored = db.query(ApiKey).filter(ApiKey.id == verified.id).first()
+    assert stored.key_prefix == secret[:12]
+
+def test_verify_api_key_miss_is_cached(db, user, monkeypatch):
+    """Test an unknown key is rejected from cache without repeating the lookup"""
+    service = DeviceService()
+    calls = []
+    lookup = service._lookup_api_key
+    monkeypatch.setattr(service, "_lookup_api_key", lambda *args: calls.append(1) or lookup(*args))
+
+    assert service.verify_api_key(db, "not-a-real-key-0123456789") is None
+    assert service.verify_api_key(db, "not-a-real-key-0123456789") is None
+    assert len(calls) == 1
+
+def test_verify_api_key_legacy_lookup_disabled(db, user, monkeypatch):
+    """Test keys without a prefix are rejected once the legacy scan is switched off"""
+    monkeypatch.setenv("API_KEY_LEGACY_LOOKUP", "false")
+    service = DeviceService()
+    secret = "legacy-secret-value-1234567890"
+    db.add(ApiKey(user_id=user.id, name="old", secret_hash=service._hash_secret(secret)))
+    db.commit()
+
+    assert service.verify_api_key(db, secret) is None
+
+def test_verify_api_key_cached_and_evicted(db, user):
+    """Test verified keys are served from cache until the key is deleted"""
+    service = DeviceService()
+    created = service.create_api_key(db, user.id, "glove")
+    service.verify_api_key(db, created["secret"])
+
+    assert service._get_cached_key(service._hash_secret(created["secret"])) is not None
+    assert service.delete_api_key(db, user.id, created["id"])
+    assert service.verify_api_key(db, created["secret"]) is None
+
+def test_last_used_is_coalesced(db, user):
+    """Test last_used_at is written once per flush, not per request"""
+    service = DeviceService()
+    service.last_used_flush_sec = 3600
+    created = service.create_api_key(db, user.id, "glove")
+
+    for _ in range(5):
+        service.verify_api_key(db, created["secret"])
+    stored = db.query(ApiKey).filter(ApiKey.id == created["id"]).first()
+    assert stored.last_used_at is None
+
+    assert service.flush_last_used(db) == 1
+    db.expire_all()
+    stored = db.query(ApiKey).filter(ApiKey.id == created["id"]).first()
+    assert stored.last_used_at is not None
+
+def test_binary_frame_roundtrip():
+    """Test the binary frame decodes back to the original events"""
+    from datetime import datetime
+    from services.wire_format import encode_event_frame, decode_event_frame
+
+    ts = datetime(2026, 1, 1, 12, 0, 0)
+    events = [
+        {"ts": ts, "punch_type": "jab", "speed": 23.7, "count": 1},
+        {"ts": ts, "punch_type": "uppercut", "speed": 31.25, "count": 3},
+    ]
+    frame = encode_event_frame("secret-key", events)
+    api_key, rows = decode_event_frame(frame)
+
+    assert api_key == "secret-key"
+    assert [r["punch_type"] for r in rows] == ["jab", "uppercut"]
+    # Same float64 value a JSON upload would store (23.7 is not exact in float32)
+    assert [r["speed"] for r in rows] == [23.7, 31.25]
+    assert [r["count"] for r in rows] == [1, 3]
+    assert rows[0]["timestamp"] == datetime.utcfromtimestamp(ts.timestamp())
+
+def test_binary_frame_rejects_truncated():
+    """Test a truncated frame is rejected instead of partially parsed"""
+    from datetime import datetime
+    from services.wire_format import encode_event_frame, decode_event_frame, FrameError
+
+    frame = encode_event_frame("k", [{"ts": datetime.utcnow(), "punch_type": "jab", "speed": 20.0}])
+    with pytest.raises(FrameError):
+        decode_event_frame(frame[:-1])
+
+def test_rate_limit_local_fallback():
+    """Test the limiter still enforces limits when Redis is unreachable"""
+    import redis
+    from services.rate_limit import RateLimiter
+
+    limiter = RateLimiter(redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1))
+    limiter.per_key_per_min = 3
+
+    results = [limiter.check(42) for _ in range(4)]
+    assert [bool(r) for r in results] == [True, True, True, False]
+
+    headers = results[-1].headers()
+    assert headers["X-RateLimit-Limit"] == "3"
+    assert headers["X-RateLimit-Remaining"] == "0"
+    assert int(headers["Retry-After"]) >= 1
+
+def test_rate_limit_async_local_fallback(monkeypatch):
+    """Test the async check uses the same in-process bucket when Redis is unreachable"""
+    import asyncio
+    import redis.asyncio
+    import services.rate_limit as rate_limit
+    from services.rate_limit import RateLimiter
+
+    async def get_unreachable_redis():
+        return redis.asyncio.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1)
+
+    monkeypatch.setattr(rate_limit, "get_async_redis", get_unreachable_redis)
+    limiter = RateLimiter(redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1))
+    limiter.per_key_per_min = 2
+
+    async def run():
+        return [bool(await limiter.check_async(43)) for _ in range(3)]
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert not limiter.check(43)
+
+def _ingest_client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    return TestClient(app)
+
+def test_ndjson_stream_ingest(db, user):
+    """Test NDJSON uploads are chunked, validated per line and committed once signed"""
+    import gzip
+    import hashlib
+    import hmac
+    import json
+    from models import Punch
+    from routes.device import device_service
+
+    secret = device_service.create_api_key(db, user.id, "glove")["secret"]
+    lines = [json.dumps({"ts": "2026-01-01T12:00:00", "punch_type": "jab", "speed": 20.0}) for _ in range(1200)]
+    lines.insert(10, "not json")
+    body = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+    signature = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+    client = _ingest_client()
+    headers = {"X-Api-Key": secret, "Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"}
+
+    response = client.post("/api/device/ingest/stream", content=body, headers=dict(headers, **{"X-Signature": "sha256=bad"}))
+    assert response.status_code == 401
+    assert db.query(Punch).count() == 0
+
+    response = client.post("/api/device/ingest/stream", content=body, headers=dict(headers, **{"X-Signature": signature}))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["punches_created"] == 1200
+    assert data["lines_rejected"] == 1
+    assert len(data["chunks"]) == 3
+    assert db.query(Punch).count() == 1200
+
+def test_websocket_ingest(db, user):
+    """Test a glove authenticates once and streams acked batches over one socket"""
+    from datetime import datetime
+    from models import Punch
+    from routes.device import device_service
+    from services.wire_format import encode_event_frame
+    import struct
+
+    secret = device_service.create_api_key(db, user.id, "glove")["secret"]
+    client = _ingest_client()
+
+    with client.websocket_connect("/api/device/ws", headers={"X-Api-Key": secret}) as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready"
+
+        ws.send_json({"seq": 1, "events": [{"ts": "2026-01-01T12:00:00", "punch_type": "jab", "speed": 21.0}] * 3})
+        ack = ws.receive_json()
+        assert ack == {"type": "ack", "seq": 1, "workout_id": ready["workout_id"], "punches_created": 3}
+
+        frame = encode_event_frame("", [{"ts": datetime.utcnow(), "punch_type": "hook", "speed": 25.0}] * 2)
+        ws.send_bytes(struct.pack("<I", 2) + frame)
+        ack = ws.receive_json()
+        assert ack["seq"] == 2 and ack["punches_created"] == 2
+
+    assert db.query(Punch).filter(Punch.workout_id == ready["workout_id"]).count() == 5
+    assert db.query(Punch).filter(Punch.user_id == user.id).count() == 5
+
+def test_websocket_follows_stopped_workout(db, user):
+    """Test batches after a mid-connection stop go to a new workout, not the closed one"""
+    from datetime import datetime
+    from models import Punch, Workout
+    from routes.device import device_service
+    from services.active_workouts import active_workout_registry
+
+    active_workout_registry.clear(user.id)
+    secret = device_service.create_api_key(db, user.id, "glove")["secret"]
+    client = _ingest_client()
+    event = {"ts": "2026-01-01T12:00:00", "punch_type": "jab", "speed": 21.0}
+
+    with client.websocket_connect("/api/device/ws", headers={"X-Api-Key": secret}) as ws:
+        first = ws.receive_json()["workout_id"]
+        ws.send_json({"seq": 1, "events": [event]})
+        assert ws.receive_json()["workout_id"] == first
+
+        # Stopped elsewhere (e.g. POST /workouts/stop) while the glove stays connected
+        db.query(Workout).filter(Workout.id == first).update({"ended_at": datetime.utcnow()})
+        db.commit()
+        active_workout_registry.clear(user.id)
+
+        ws.send_json({"seq": 2, "events": [event]})
+        second = ws.receive_json()["workout_id"]
+
+    assert second != first
+    assert db.query(Punch).filter(Punch.workout_id == first).count() == 1
+    assert db.query(Punch).filter(Punch.workout_id == second).count() == 1
+
+def test_websocket_rejects_bad_key(db, user):
+    """Test connections without a valid key are closed before accept"""
+    from starlette.websockets import WebSocketDisconnect
+
+    client = _ingest_client()
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/device/ws", headers={"X-Api-Key": "nope"}) as ws:
+            ws.receive_json()
@@ -0,0 +1,73 @@
+import csv
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Workout, WorkoutSegment, Punch
+from services.bulk_import import BulkImporter, iter_records
+from datetime import datetime, timedelta
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_import.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_import_csv_builds_workouts_and_segments(db, tmp_path):
+    """Test a CSV export is staged, split into workouts and moved into punches"""
+    alice = User(username="alice", email="alice@example.com", password_hash="x")
+    bob = User(username="bob", email="bob@example.com", password_hash="x")
+    db.add_all([alice, bob])
+    db.commit()
+
+    start = datetime(2023, 1, 1, 9, 0, 0)
+    path = tmp_path / "history.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user", "timestamp", "punch_type", "speed", "count"])
+        # alice: two workouts a day apart, 60 punches each, one every 2s
+        for day in range(2):
+            for i in range(60):
+                ts = start + timedelta(days=day, seconds=2 * i)
+                writer.writerow(["alice@example.com", ts.isoformat(), "jab", "20.5", "1"])
+        # bob by username, unix timestamps, count omitted
+        for i in range(30):
+            ts = start + timedelta(seconds=2 * i)
+            writer.writerow(["bob", (ts - datetime(1970, 1, 1)).total_seconds(), "Hook", "18", ""])
+        # rejected rows: unknown user and unknown punch type
+        writer.writerow(["nobody", start.isoformat(), "jab", "20", "1"])
+        writer.writerow(["alice", start.isoformat(), "kick", "20", "1"])
+
+    stats = BulkImporter(engine, batch_size=25).run(iter_records(str(path)))
+
+    assert stats["rows_read"] == 152
+    assert stats["rows_loaded"] == 150
+    assert stats["rows_rejected"] == 2
+    assert stats["unknown_users"] == 1
+    assert stats["workouts_created"] == 3
+    assert stats["rows_per_second"] > 0
+
+    alice_workouts = db.query(Workout).filter(Workout.user_id == alice.id).order_by(Workout.started_at).all()
+    assert len(alice_workouts) == 2
+    assert alice_workouts[0].started_at == start
+    assert alice_workouts[0].ended_at == start + timedelta(seconds=118)
+    for workout in alice_workouts:
+        assert db.query(Punch).filter(Punch.workout_id == workout.id).count() == 60
+
+    bob_workout = db.query(Workout).filter(Workout.user_id == bob.id).one()
+    bob_punches = db.query(Punch).filter(Punch.workout_id == bob_workout.id).all()
+    assert len(bob_punches) == 30
+    assert {p.punch_type for p in bob_punches} == {"hook"}
+    assert all(p.count == 1 for p in bob_punches)
+
+    # One active segment per continuous workout
+    segments = db.query(WorkoutSegment).filter(WorkoutSegment.workout_id == alice_workouts[0].id).all()
+    assert [s.kind for s in segments] == ["active"]
+    assert stats["segments_created"] == db.query(WorkoutSegment).count()
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import (
+    CoachAthlete, EmailVerifyToken, Punch, Session, Workout, WorkoutSegment,
+)
+from datetime import datetime
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_indexes.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _plan(db, stmt) -> str:
+    """SQLite EXPLAIN QUERY PLAN for a Core/ORM select, as one string"""
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+def _assert_uses_index(plan: str, index_name: str):
+    assert f"INDEX {index_name}" in plan, plan
+
+def test_workout_punches_use_workout_timestamp_index(db):
+    """Workout summaries and the reaper's last-punch lookup hit (workout_id, timestamp)"""
+    plan = _plan(db, select(Punch).where(Punch.workout_id == 1).order_by(Punch.timestamp))
+    _assert_uses_index(plan, "ix_punches_workout_id_timestamp")
+    assert "TEMP B-TREE" not in plan
+
+    plan = _plan(db, select(func.max(Punch.timestamp)).where(Punch.workout_id == 1))
+    _assert_uses_index(plan, "ix_punches_workout_id_timestamp")
+
+def test_session_punches_use_session_timestamp_index(db):
+    """Session analytics aggregate reads punches by (session_id, timestamp)"""
+    plan = _plan(
+        db,
+        select(Punch.punch_type, func.sum(Punch.count)).where(Punch.session_id == 1).group_by(Punch.punch_type),
+    )
+    _assert_uses_index(plan, "ix_punches_session_id_timestamp")
+
+def test_user_punch_ranges_use_user_timestamp_index(db):
+    """Weekly analytics, leaderboard, coach and report queries scan (user_id, timestamp) without joins"""
+    plan = _plan(
+        db,
+        select(Punch).where(Punch.user_id == 1, Punch.timestamp >= datetime(2024, 1, 1)),
+    )
+    _assert_uses_index(plan, "ix_punches_user_id_timestamp")
+
+def test_user_sessions_use_user_started_index(db):
+    """Weekly analytics and coach views range-scan a user's sessions by start time"""
+    plan = _plan(
+        db,
+        select(Session).where(Session.user_id == 1, Session.started_at >= datetime(2024, 1, 1)),
+    )
+    _assert_uses_index(plan, "ix_sessions_user_id_started_at")
+
+def test_open_workout_lookups_use_indexes(db):
+    """Active-workout lookup is an index search; the reaper scans only the partial index"""
+    plan = _plan(
+        db,
+        select(Workout.id, Workout.started_at)
+        .where(Workout.user_id == 1, Workout.ended_at == None)
+        .order_by(Workout.started_at.desc())
+        .limit(1),
+    )
+    # Without ANALYZE stats SQLite may pick either (user_id, started_at) index, or the
+    # unique open-workout index, which matches at most one row (nothing left to sort)
+    if "ux_workouts_open_user_id" in plan:
+        assert "SEARCH workouts USING INDEX ux_workouts_open_user_id (user_id=?)" in plan, plan
+    else:
+        assert "SEARCH workouts USING INDEX ix_workouts_" in plan, plan
+        assert "TEMP B-TREE" not in plan
+
+    # Both open-workout indexes are partial, so either one scans only open rows
+    plan = _plan(db, select(Workout.id, Workout.user_id).where(Workout.ended_at == None))
+    assert "INDEX ix_workouts_open_user_id_started_at" in plan or "INDEX ux_workouts_open_user_id" in plan, plan
+
+def test_segments_coach_and_token_lookups_use_indexes(db):
+    """Segment listing, coach roster and token verification avoid full scans"""
+    plan = _plan(db, select(WorkoutSegment).where(WorkoutSegment.workout_id == 1).order_by(WorkoutSegment.started_at))
+    _assert_uses_index(plan, "ix_workout_segments_workout_id_started_at")
+
+    plan = _plan(db, select(CoachAthlete).where(CoachAthlete.coach_id == 1, CoachAthlete.athlete_id == 2))
+    _assert_uses_index(plan, "ix_coach_athlete_coach_id_athlete_id")
+
+    plan = _plan(db, select(EmailVerifyToken).where(EmailVerifyToken.token_hash == "abc"))
+    _assert_uses_index(plan, "ix_email_verify_tokens_token_hash")
@@ -0,0 +1,235 @@
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.exc import OperationalError
+from services.ingest_queue import IngestQueue, IngestWorker
+
+class FakeStreamRedis:
+    """In-memory stand-in for the stream commands the ingest queue uses"""
+
+    def __init__(self):
+        self.connection_pool = SimpleNamespace(connection_kwargs={})
+        self.streams = {}
+        self.last_delivered = {}
+        # entry id -> {"consumer", "delivered_at", "times_delivered"}
+        self.pending = {}
+        self._seq = 0
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"{self._seq}-0"
+        self.streams.setdefault(stream, []).append((entry_id, {k: str(v) for k, v in fields.items()}))
+        return entry_id
+
+    def xgroup_create(self, stream, group, id="0", mkstream=False):
+        self.streams.setdefault(stream, [])
+
+    def xlen(self, stream):
+        return len(self.streams.get(stream, []))
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, start_id), = streams.items()
+        if start_id == ">":
+            last = self.last_delivered.get(stream, 0)
+            entries = [e for e in self.streams.get(stream, []) if _seq(e[0]) > last][:count]
+            if entries:
+                self.last_delivered[stream] = _seq(entries[-1][0])
+        else:
+            entries = [
+                e for e in self.streams.get(stream, [])
+                if e[0] in self.pending and self.pending[e[0]]["consumer"] == consumer and _seq(e[0]) > _seq(start_id)
+            ][:count]
+        for entry_id, _ in entries:
+            self._deliver(entry_id, consumer)
+        return [[stream, entries]] if entries else []
+
+    def xack(self, stream, group, *entry_ids):
+        for entry_id in entry_ids:
+            self.pending.pop(entry_id, None)
+        return len(entry_ids)
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        now = time.monotonic()
+        claimed = [
+            e for e in self.streams.get(stream, [])
+            if e[0] in self.pending and (now - self.pending[e[0]]["delivered_at"]) * 1000 >= min_idle_time
+        ][:count]
+        for entry_id, _ in claimed:
+            self._deliver(entry_id, consumer)
+        return ["0-0", claimed, []]
+
+    def xpending_range(self, stream, group, min, max, count):
+        entry = self.pending.get(min)
+        if entry is None:
+            return []
+        return [{"message_id": min, "consumer": entry["consumer"], "times_delivered": entry["times_delivered"]}]
+
+    def _deliver(self, entry_id, consumer):
+        entry = self.pending.setdefault(entry_id, {"times_delivered": 0})
+        entry.update(consumer=consumer, delivered_at=time.monotonic())
+        entry["times_delivered"] += 1
+
+def _seq(entry_id):
+    return int(entry_id.split("-")[0])
+
+class FakeSession:
+    """Session stand-in: inserted rows only become visible on commit"""
+
+    def __init__(self, store):
+        self.store = store
+        self.staged = []
+
+    def commit(self):
+        self.store.committed.extend(self.staged)
+        self.staged = []
+
+    def rollback(self):
+        self.staged = []
+
+    def close(self):
+        pass
+
+class Store:
+    def __init__(self):
+        self.committed = []
+        self.failing_users = {}
+        self.resolved = []
+
+    def session(self):
+        return FakeSession(self)
+
+    def resolve(self, db, user_id):
+        self.resolved.append(user_id)
+        return SimpleNamespace(id=user_id * 100)
+
+    def insert(self, db, user_id, workout_id, rows):
+        if user_id in self.failing_users:
+            raise self.failing_users[user_id]
+        db.staged.extend((user_id, workout_id, row["punch_type"]) for row in rows)
+        return len(rows)
+
+def _event(punch_type="jab"):
+    return {"timestamp": datetime(2024, 1, 1, 12, 0, 0), "punch_type": punch_type, "speed": 20.0, "count": 1}
+
+def _outage():
+    return OperationalError("INSERT", {}, Exception("connection refused"))
+
+@pytest.fixture
+def queue():
+    queue = IngestQueue(FakeStreamRedis())
+    queue.ensure_group()
+    return queue
+
+@pytest.fixture
+def store():
+    return Store()
+
+def _worker(queue, store, index=0):
+    worker = IngestWorker(queue, store.session, store.resolve, store.insert, index=index)
+    worker.flush_ms = 1
+    return worker
+
+def _dead_letters(queue):
+    return queue.redis_client.streams.get(queue.dead_letter_stream, [])
+
+def test_enqueue_roundtrip(queue):
+    """Test an enqueued batch decodes back to the same user and rows"""
+    queue.enqueue(7, [_event("jab"), _event("hook")])
+    (_, fields), = queue.redis_client.streams[queue.stream]
+    assert fields["n"] == "2"
+
+    user_id, rows = IngestQueue.decode_entry(fields)
+    assert user_id == 7
+    assert [r["punch_type"] for r in rows] == ["jab", "hook"]
+    assert rows[0]["timestamp"] == datetime(2024, 1, 1, 12, 0, 0)
+
+def test_batch_flush_commits_and_acks(queue, store):
+    """Test entries from several users are written in one flush and acked"""
+    queue.enqueue(1, [_event("jab")])
+    queue.enqueue(2, [_event("cross")])
+    queue.enqueue(1, [_event("hook")])
+
+    _worker(queue, store)._collect_and_flush()
+
+    assert sorted(store.committed) == [(1, 100, "hook"), (1, 100, "jab"), (2, 200, "cross")]
+    assert sorted(store.resolved) == [1, 2]
+    assert queue.redis_client.pending == {}
+
+def test_bad_entries_are_dead_lettered(queue, store):
+    """Test entries failing on their own data go to the dead letter stream without blocking the rest"""
+    store.failing_users[3] = ValueError("bad punch")
+    queue.enqueue(1, [_event("jab")])
+    queue.enqueue(3, [_event("cross")])
+    queue.redis_client.xadd(queue.stream, {"user_id": 4, "n": 1, "events": "not json"})
+
+    _worker(queue, store)._collect_and_flush()
+
+    assert store.committed == [(1, 100, "jab")]
+    assert sorted(fields["user_id"] for _, fields in _dead_letters(queue)) == ["3", "4"]
+    assert queue.redis_client.pending == {}
+
+def test_database_outage_leaves_entries_pending(queue, store):
+    """Test entries that fail because the database is down are neither acked nor dead-lettered"""
+    store.failing_users[1] = _outage()
+    queue.enqueue(1, [_event("jab")])
+    queue.enqueue(1, [_event("cross")])
+
+    _worker(queue, store)._collect_and_flush()
+
+    assert store.committed == []
+    assert _dead_letters(queue) == []
+    assert len(queue.redis_client.pending) == 2
+
+def test_outage_dead_letters_after_max_deliveries(queue, store):
+    """Test an entry still failing after INGEST_MAX_DELIVERIES deliveries is dead-lettered"""
+    store.failing_users[1] = _outage()
+    queue.enqueue(1, [_event("jab")])
+    worker = _worker(queue, store)
+    worker.max_deliveries = 2
+    worker.reclaim_idle_ms = 0
+
+    worker._collect_and_flush()
+    assert _dead_letters(queue) == []
+
+    worker._maybe_reclaim()
+    assert len(_dead_letters(queue)) == 1
+    assert queue.redis_client.pending == {}
+
+def test_reclaim_recovers_entries_of_crashed_consumer(queue, store):
+    """Test entries read but never acked by another consumer are claimed and written"""
+    queue.enqueue(1, [_event("jab")])
+    crashed = _worker(queue, store, index=0)
+    assert len(crashed._read(">", None)) == 1
+
+    survivor = _worker(queue, store, index=1)
+    survivor.reclaim_idle_ms = 0
+    survivor._maybe_reclaim()
+
+    assert store.committed == [(1, 100, "jab")]
+    assert queue.redis_client.pending == {}
+
+def test_shutdown_drains_waiting_entries(queue, store):
+    """Test a stopping worker flushes entries already in the stream before exiting"""
+    for i in range(3):
+        queue.enqueue(i + 1, [_event()])
+    worker = _worker(queue, store)
+    worker.request_stop()
+
+    worker.run()
+
+    assert sorted(user_id for user_id, _, _ in store.committed) == [1, 2, 3]
+    assert queue.redis_client.pending == {}
+
+def test_startup_recovery_stops_on_outage(queue, store):
+    """Test re-reading own pending entries at startup does not spin while the database is down"""
+    queue.enqueue(1, [_event()])
+    worker = _worker(queue, store)
+    worker._read(">", None)
+    store.failing_users[1] = _outage()
+
+    worker._drain(start_id="0")
+
+    assert queue.redis_client.pending[next(iter(queue.redis_client.pending))]["times_delivered"] == 2
+    assert _dead_letters(queue) == []
@@ -0,0 +1,42 @@
+import pytest
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from services.partitions import (
+    PunchPartitionManager, add_months, partition_name, partition_month, expired_partitions
+)
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_partitions.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_month_arithmetic_and_names():
+    """Test partition month math across year boundaries and name round-trips"""
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2026, 3, 1)) == "punches_p2026_03"
+    assert partition_month("punches_p2026_03") == date(2026, 3, 1)
+    assert partition_month("punches_default") is None
+
+def test_expired_partitions_respect_retention():
+    """Test only partitions wholly older than the retention window expire"""
+    names = ["punches_p2025_12", "punches_p2026_03", "punches_p2026_04", "punches_p2026_10", "punches_default"]
+    today = date(2026, 10, 16)
+
+    assert expired_partitions(names, today, 6) == ["punches_p2025_12", "punches_p2026_03"]
+    assert expired_partitions(names, today, 0) == []
+
+def test_manage_is_noop_without_partitioning(db):
+    """Test the scheduled job leaves unpartitioned (e.g. SQLite) databases alone"""
+    result = PunchPartitionManager().manage(db)
+    assert result == {"partitioned": False, "created": [], "expired": []}
@@ -1,24 +1,16 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from database import get_db, Base
+from database import Base
 from main import app
+from models import User, Session as SessionModel, Punch, UserDailyStats
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
 client = TestClient(app)
 
 @pytest.fixture(scope="function")
@@ -52,6 +44,101 @@ def test_create_punch(setup_database):
     # This will fail because session doesn't exist, but tests the endpoint
     assert response.status_code in [404, 422]  # 404 for missing session, 422 for validation
 
+def test_create_punches_batch(setup_database):
+    """Test logging a whole round of punches in one request"""
+    db = TestingSessionLocal()
+    user = User(username="batchuser", email="batch@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Batch Session")
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    user_id = user.id
+    db.close()
+
+    payload = [
+        {"session_id": session_id, "punch_type": "jab", "speed": 20.0 + i, "count": 1}
+        for i in range(50)
+    ]
+    response = client.post("/api/punches/batch", json=payload)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["punches_created"] == 50
+    assert data["session_ids"] == [session_id]
+
+    db = TestingSessionLocal()
+    punches = db.query(Punch).filter(Punch.session_id == session_id).all()
+    assert len(punches) == 50
+    assert {p.workout_id for p in punches} == {data["workout_id"]}
+    assert {p.user_id for p in punches} == {user_id}
+    rollup = db.query(UserDailyStats).filter(UserDailyStats.user_id == user_id, UserDailyStats.punch_type == "jab").one()
+    assert rollup.count == 50
+    assert rollup.speed_max == 69.0
+    db.close()
+
+def test_create_punches_batch_missing_session(setup_database):
+    """Test batch with an unknown session is rejected as a whole"""
+    response = client.post("/api/punches/batch", json=[
+        {"session_id": 999, "punch_type": "jab", "speed": 20.0, "count": 1}
+    ])
+    assert response.status_code == 404
+
+def test_session_analytics_aggregates(setup_database):
+    """Test session analytics totals match the logged punches"""
+    db = TestingSessionLocal()
+    user = User(username="statsuser", email="stats@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Stats Session")
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    db.close()
+
+    client.post("/api/punches/batch", json=[
+        {"session_id": session_id, "punch_type": "jab", "speed": 20.0, "count": 2},
+        {"session_id": session_id, "punch_type": "cross", "speed": 30.0, "count": 1},
+        {"session_id": session_id, "punch_type": "jab", "speed": 26.0, "count": 1},
+    ])
+    response = client.get(f"/api/analytics/{session_id}")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_punches"] == 4
+    assert data["average_speed"] == 24.0
+    assert data["punch_types"] == {"jab": 3, "cross": 1}
+
+def test_session_analytics_does_not_load_punch_rows(setup_database):
+    """Test the analytics cache miss is answered by SQL aggregates, not per-punch ORM objects"""
+    db = TestingSessionLocal()
+    user = User(username="aggonly", email="aggonly@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Aggregate Session")
+    db.add(session)
+    db.commit()
+    db.add_all([
+        Punch(user_id=user.id, session_id=session.id, punch_type="hook", speed=18.0 + i % 5, count=1)
+        for i in range(200)
+    ])
+    db.commit()
+    session_id = session.id
+    db.close()
+
+    loaded = []
+    listener = lambda target, context: loaded.append(target)
+    event.listen(Punch, "load", listener)
+    try:
+        response = client.get(f"/api/analytics/{session_id}")
+    finally:
+        event.remove(Punch, "load", listener)
+
+    assert response.status_code == 200
+    assert response.json()["total_punches"] == 200
+    assert loaded == []
+
 def test_health_endpoint():
     """Test health check endpoint"""
     response = client.get("/health")
@@ -63,3 +150,68 @@ def test_root_endpoint():
     response = client.get("/")
     assert response.status_code == 200
     assert "PunchTracker API" in response.json()["message"]
+
+def test_create_punches_batch_gzip(setup_database):
+    """Test a gzip-compressed batch body is accepted"""
+    import gzip
+    import json
+
+    db = TestingSessionLocal()
+    user = User(username="gzipuser", email="gzip@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Gzip Session")
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    db.close()
+
+    payload = [{"session_id": session_id, "punch_type": "hook", "speed": 22.0, "count": 1}] * 20
+    response = client.post(
+        "/api/punches/batch",
+        content=gzip.compress(json.dumps(payload).encode("utf-8")),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["punches_created"] == 20
+
+def test_compressed_body_size_cap():
+    """Test decompression stops at the configured cap"""
+    import gzip
+    from services.compression import decompress_body, BodyTooLargeError
+
+    bomb = gzip.compress(b"0" * (1024 * 1024))
+    with pytest.raises(BodyTooLargeError):
+        decompress_body(bomb, "gzip", limit=64 * 1024)
+    assert len(decompress_body(bomb, "gzip")) == 1024 * 1024
+
+def test_stream_decoding_matches_body_decoding():
+    """Test streamed bodies accept the same encodings as whole bodies and record size metrics when done"""
+    import asyncio
+    import zlib
+    from metrics import REQUEST_BODY_DECOMPRESSED_BYTES
+    from services.compression import decompress_body, decompress_stream
+
+    raw = b"".join(b'{"punch_type": "jab", "speed": %d}\n' % i for i in range(5000))
+    raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    bodies = {
+        "zlib-wrapped": ("deflate", zlib.compress(raw)),
+        "raw": ("deflate", raw_deflate.compress(raw) + raw_deflate.flush()),
+    }
+
+    async def collect(encoding, body, size):
+        async def chunks():
+            for offset in range(0, len(body), size):
+                yield body[offset:offset + size]
+        return b"".join([piece async for piece in decompress_stream(chunks(), encoding)])
+
+    for encoding, body in bodies.values():
+        observed = REQUEST_BODY_DECOMPRESSED_BYTES.labels(encoding=encoding)._sum.get()
+        # One-byte chunks split the zlib header across reads
+        assert asyncio.run(collect(encoding, body, 1)) == raw
+        assert asyncio.run(collect(encoding, body, 4096)) == decompress_body(body, encoding) == raw
+        assert REQUEST_BODY_DECOMPRESSED_BYTES.labels(encoding=encoding)._sum.get() == observed + 3 * len(raw)
+
+    with pytest.raises(zlib.error):
+        asyncio.run(collect("deflate", zlib.compress(raw)[:-10], 4096))
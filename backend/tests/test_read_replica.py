@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, ReplicaRouter
+from models import User
+
+# A second SQLite file stands in for the replica
+primary_engine = create_engine("sqlite:///./test_primary.db", connect_args={"check_same_thread": False})
+replica_engine = create_engine("sqlite:///./test_replica.db", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+@pytest.fixture(scope="function")
+def engines():
+    for e in (primary_engine, replica_engine):
+        Base.metadata.create_all(bind=e)
+    yield
+    for e in (primary_engine, replica_engine):
+        Base.metadata.drop_all(bind=e)
+
+def _usernames(engine):
+    db = TestingSessionLocal(bind=engine)
+    try:
+        return [u.username for u in db.query(User).all()]
+    finally:
+        db.close()
+
+def test_reads_go_to_healthy_replica(engines):
+    """Test read sessions bind to the replica while it is up and caught up"""
+    db = TestingSessionLocal(bind=replica_engine)
+    db.add(User(username="onreplica", email="replica@example.com", password_hash="x"))
+    db.commit()
+    db.close()
+
+    router = ReplicaRouter(replica_engine, primary_engine, max_lag_seconds=5)
+    assert router.read_engine() is replica_engine
+    assert _usernames(router.read_engine()) == ["onreplica"]
+
+def test_lagging_replica_falls_back_to_primary(engines, monkeypatch):
+    """Test reads move to the primary when lag exceeds the limit, and back once it recovers"""
+    router = ReplicaRouter(replica_engine, primary_engine, max_lag_seconds=5, check_interval=0)
+    monkeypatch.setattr(router, "measure_lag", lambda: 30.0)
+    assert router.read_engine() is primary_engine
+
+    monkeypatch.setattr(router, "measure_lag", lambda: 1.0)
+    assert router.read_engine() is replica_engine
+
+def test_unreachable_replica_falls_back_to_primary(engines):
+    """Test a replica that cannot be reached routes reads to the primary"""
+    down = create_engine("sqlite:////nonexistent-dir/replica.db")
+    router = ReplicaRouter(down, primary_engine)
+    assert router.read_engine() is primary_engine
+
+def test_lag_checked_once_per_interval(engines, monkeypatch):
+    """Test the lag probe is cached for the check interval"""
+    calls = []
+    router = ReplicaRouter(replica_engine, primary_engine, check_interval=60)
+    monkeypatch.setattr(router, "measure_lag", lambda: calls.append(1) or 0.0)
+
+    for _ in range(5):
+        assert router.read_engine() is replica_engine
+    assert len(calls) == 1
+
+def test_async_reads_follow_replica_health(engines, monkeypatch):
+    """Test async read sessions use the async replica engine only while the replica is healthy"""
+    async_replica = create_async_engine("sqlite+aiosqlite:///./test_replica.db")
+    async_primary = create_async_engine("sqlite+aiosqlite:///./test_primary.db")
+    router = ReplicaRouter(
+        replica_engine, primary_engine, max_lag_seconds=5, check_interval=0,
+        async_replica_engine=async_replica, async_primary_engine=async_primary
+    )
+
+    monkeypatch.setattr(router, "measure_lag", lambda: 1.0)
+    assert asyncio.run(router.read_async_engine()) is async_replica
+    monkeypatch.setattr(router, "measure_lag", lambda: 30.0)
+    assert asyncio.run(router.read_async_engine()) is async_primary
@@ -0,0 +1,102 @@
+import asyncio
+import time
+import pytest
+import redis
+import redis.asyncio
+from database import AsyncBreakerRedis, BreakerRedis, CircuitBreaker, CircuitOpenError
+
+def _unreachable_client(breaker):
+    """Client for a closed local port: every call is a fast connection error"""
+    pool = redis.ConnectionPool(host="127.0.0.1", port=1, socket_connect_timeout=0.1, socket_timeout=0.1)
+    return BreakerRedis(connection_pool=pool, breaker=breaker)
+
+def test_breaker_opens_after_repeated_failures():
+    """Test calls fail fast without touching Redis once the failure threshold is reached"""
+    breaker = CircuitBreaker("test", failure_threshold=3, cooldown_seconds=60)
+    client = _unreachable_client(breaker)
+
+    for _ in range(3):
+        with pytest.raises(redis.ConnectionError) as exc:
+            client.get("key")
+        assert not isinstance(exc.value, CircuitOpenError)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        client.get("key")
+    pipe = client.pipeline()
+    pipe.incr("a")
+    pipe.delete("b")
+    with pytest.raises(CircuitOpenError):
+        pipe.execute()
+
+def test_breaker_half_opens_after_cooldown():
+    """Test one trial call is let through after the cool-down and its outcome decides the state"""
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial while it is in flight
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_command_errors_do_not_open_breaker():
+    """Test errors returned by a reachable server count as successes"""
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_seconds=60)
+
+    def wrong_type():
+        raise redis.ResponseError("WRONGTYPE")
+
+    with pytest.raises(redis.ResponseError):
+        breaker.call(wrong_type)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_async_client_shares_the_breaker():
+    """Test the asyncio client counts failures on, and honours, the same breaker"""
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_seconds=60)
+    pool = redis.asyncio.ConnectionPool(host="127.0.0.1", port=1, socket_connect_timeout=0.1, socket_timeout=0.1)
+    client = AsyncBreakerRedis(connection_pool=pool, breaker=breaker)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(redis.ConnectionError):
+                await client.hgetall("session_stats:1")
+        with pytest.raises(CircuitOpenError):
+            await client.get("workout:summary:1")
+        with pytest.raises(CircuitOpenError):
+            _unreachable_client(breaker).get("key")
+        await client.aclose()
+
+    asyncio.run(run())
+
+def test_cancelled_call_leaves_breaker_untouched():
+    """Test a cancelled call neither closes an open breaker nor resets the failure count"""
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_seconds=0.05)
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def run():
+        breaker.record_failure()
+        with pytest.raises(asyncio.CancelledError):
+            await breaker.call_async(cancelled)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # A cancelled half-open trial keeps the breaker half-open and frees the trial slot
+        time.sleep(0.06)
+        with pytest.raises(asyncio.CancelledError):
+            await breaker.call_async(cancelled)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+
+    asyncio.run(run())
@@ -0,0 +1,85 @@
+import pytest
+import fakeredis
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Punch, Session as SessionModel
+from services.session_stats import SessionStatsService, STORE_LUA
+
+engine = create_engine("sqlite:///./test_session_stats.db", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def session_id(db):
+    user = User(username="stats", email="stats@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Stats", started_at=datetime.utcnow())
+    db.add(session)
+    db.commit()
+    return session.id
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def _punch(db, session_id, punch_type="jab", speed=20.0):
+    """Commit one punch; returns its increment delta and id"""
+    punch = Punch(session_id=session_id, punch_type=punch_type, speed=speed, count=1, timestamp=datetime.utcnow())
+    db.add(punch)
+    db.commit()
+    return [(punch_type, speed, 1)], punch.id
+
+def test_increment_on_missing_hash_rebuilds_without_partial_tallies(db, session_id, redis_client):
+    """Test the first increment of a session stores a full rebuild instead of only its own delta"""
+    service = SessionStatsService()
+    _punch(db, session_id, "jab")
+    delta, punch_id = _punch(db, session_id, "hook")
+
+    service.increment_many(db, redis_client, {session_id: delta}, punch_id)
+
+    stats = service.read(redis_client, session_id)
+    assert stats["total_punches"] == 2
+    assert stats["punch_types"] == {"jab": 1, "hook": 1}
+
+def test_rebuild_racing_an_increment_counts_each_punch_once(db, session_id, redis_client):
+    """Test an increment arriving after a rebuild that already saw its punch is skipped"""
+    service = SessionStatsService()
+    _punch(db, session_id)
+    service.rebuild(db, redis_client, session_id)
+    ttl = redis_client.ttl(service.cache_key(session_id))
+
+    # Punch committed, then another request rebuilds before this one increments
+    late_delta, late_id = _punch(db, session_id, speed=30.0)
+    service.rebuild(db, redis_client, session_id)
+    service.increment_many(db, redis_client, {session_id: late_delta}, late_id)
+    assert service.read(redis_client, session_id)["total_punches"] == 2
+
+    # Punches the rebuild did not see are still applied, without extending the TTL
+    delta, punch_id = _punch(db, session_id, speed=40.0)
+    service.increment_many(db, redis_client, {session_id: delta}, punch_id)
+    stats = service.read(redis_client, session_id)
+    assert stats["total_punches"] == 3
+    assert service.average_speed(stats) == 30.0
+    assert redis_client.ttl(service.cache_key(session_id)) <= ttl
+
+def test_older_rebuild_does_not_overwrite_newer(db, session_id, redis_client):
+    """Test a rebuild that finishes last but saw fewer punches keeps the newer hash"""
+    service = SessionStatsService()
+    _punch(db, session_id)
+    stale = service.aggregate(db, session_id)
+    _punch(db, session_id)
+    service.rebuild(db, redis_client, session_id)
+
+    service._script(redis_client, STORE_LUA)(keys=[service.cache_key(session_id)], args=service._store_args(stale))
+
+    assert service.read(redis_client, session_id)["total_punches"] == 2
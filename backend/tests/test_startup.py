@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy.exc import OperationalError
+import database
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Heavy or optional modules that must only load when first used, not on `import main`
+DEFERRED_MODULES = ("torch", "numpy", "sendgrid", "requests", "pyarrow")
+
+PROFILE_SCRIPT = """
+import json, sys
+import main
+import database
+print(json.dumps({
+    "engine_created": database._engine is not None,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+def _profile_import(**env):
+    result = subprocess.run(
+        [sys.executable, "-c", PROFILE_SCRIPT],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_main_defers_engines_and_optional_deps():
+    """Test importing the app creates no engine and loads none of the deferred modules"""
+    profile = _profile_import()
+    assert profile["engine_created"] is False
+    assert profile["loaded"] == []
+
+def test_import_does_not_contact_database():
+    """Test an unreachable Postgres does not break the import, which never builds an engine"""
+    profile = _profile_import(
+        POSTGRES_USER="punch", POSTGRES_PASSWORD="punch", POSTGRES_HOST="192.0.2.1",
+        POSTGRES_PORT="5432", POSTGRES_DB="punch", DB_CONNECT_RETRIES="1",
+    )
+    assert profile["engine_created"] is False
+
+class _FlakyEngine:
+    """Engine stand-in whose first `failures` connects raise OperationalError"""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+        return _Connection()
+
+    def dispose(self):
+        pass
+
+class _Connection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        return None
+
+@pytest.fixture
+def flaky(monkeypatch):
+    def make(failures):
+        engine = _FlakyEngine(failures)
+        monkeypatch.setattr(database, "get_engine", lambda: engine)
+        monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+        monkeypatch.setenv("DB_CONNECT_RETRIES", "3")
+        monkeypatch.delenv("USE_SQLITE_FALLBACK", raising=False)
+        return engine
+    return make
+
+def test_init_db_retries_until_reachable(flaky):
+    """Test init_db retries a database that comes up within the retry budget"""
+    engine = flaky(failures=2)
+    assert database.init_db() is engine
+    assert engine.attempts == 3
+
+def test_init_db_raises_after_retries(flaky):
+    """Test init_db fails loudly instead of silently switching databases"""
+    engine = flaky(failures=5)
+    with pytest.raises(OperationalError):
+        database.init_db()
+    assert engine.attempts == 3
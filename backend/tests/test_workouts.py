@@ -0,0 +1,253 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Workout, WorkoutSegment, WorkoutStats, Punch
+from services.workouts import WorkoutService
+from datetime import datetime, timedelta
+
+# Test database setup
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_workouts.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _workout_with_punches(db, user_id, last_punch_at, n=5):
+    workout = Workout(user_id=user_id, started_at=last_punch_at - timedelta(minutes=5), auto_detected=True)
+    db.add(workout)
+    db.commit()
+    for i in range(n):
+        db.add(Punch(
+            workout_id=workout.id,
+            punch_type="jab",
+            speed=20.0,
+            count=1,
+            timestamp=last_punch_at - timedelta(seconds=(n - 1 - i) * 20)
+        ))
+    db.commit()
+    return workout
+
+def test_reaper_closes_only_stale_workouts(db):
+    """Test the reaper closes inactive workouts and leaves live ones open"""
+    users = [User(username=f"reap{i}", email=f"reap{i}@example.com", password_hash="x") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+
+    now = datetime.utcnow()
+    stale = _workout_with_punches(db, users[0].id, now - timedelta(minutes=30))
+    live = _workout_with_punches(db, users[1].id, now)
+    empty = Workout(user_id=users[2].id, started_at=now - timedelta(hours=1))
+    db.add(empty)
+    db.commit()
+
+    result = WorkoutService().reap_stale_workouts(db)
+
+    assert result["reaped"] == 1
+    assert result["workout_ids"] == [stale.id]
+    db.expire_all()
+    assert db.query(Workout).get(stale.id).ended_at is not None
+    assert db.query(Workout).get(live.id).ended_at is None
+    assert db.query(Workout).get(empty.id).ended_at is None
+    assert db.query(WorkoutSegment).filter(WorkoutSegment.workout_id == stale.id).count() > 0
+
+def test_reaper_stores_workout_stats(db):
+    """Test closing a workout stores totals, the type mix and per-segment aggregates"""
+    user = User(username="stats", email="stats@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    start = datetime.utcnow() - timedelta(minutes=30)
+    workout = Workout(user_id=user.id, started_at=start, auto_detected=True)
+    db.add(workout)
+    db.commit()
+    # Two 60s rounds of punches 5s apart, separated by a 30s rest
+    offsets = [i * 5 for i in range(13)] + [90 + i * 5 for i in range(13)]
+    db.add_all([
+        Punch(workout_id=workout.id, punch_type="jab" if i % 2 else "cross", speed=20.0 + i, count=1,
+              timestamp=start + timedelta(seconds=offset))
+        for i, offset in enumerate(offsets)
+    ])
+    db.commit()
+
+    WorkoutService().reap_stale_workouts(db)
+
+    stats = db.get(WorkoutStats, workout.id)
+    assert stats.total_punches == 26
+    assert stats.max_speed == 45.0
+    assert stats.average_speed == 32.5
+    assert stats.punch_mix == {"jab": 13, "cross": 13}
+    assert (stats.rounds, stats.rests) == (2, 1)
+    assert [s["punches"] for s in stats.segments] == [13, 0, 13]
+    assert stats.segments[2]["max_speed"] == 45.0
+
+def test_active_workout_registry_tracks_start_and_reap(db):
+    """Test start, lookup and reaping keep the active-workout registry in sync"""
+    from services.active_workouts import active_workout_registry
+
+    user = User(username="registry", email="registry@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    service = WorkoutService()
+
+    assert service.get_active_workout(db, user.id) is None
+    started = service.get_or_start_workout(db, user.id)
+    assert service.get_active_workout(db, user.id) == started
+    assert service.get_or_start_workout(db, user.id) == started
+
+    db.add(Punch(workout_id=started.id, punch_type="jab", speed=20.0, count=1,
+                 timestamp=datetime.utcnow() - timedelta(minutes=30)))
+    db.commit()
+    service.reap_stale_workouts(db)
+
+    assert service.get_active_workout(db, user.id) is None
+    active_workout_registry.clear(user.id)
+
+def test_stale_registry_entry_is_not_written_to(db):
+    """Test a registry entry for a workout closed elsewhere is evicted and a new workout started"""
+    from services.active_workouts import active_workout_registry
+
+    user = User(username="stale", email="stale@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    service = WorkoutService()
+    started = service.get_or_start_workout(db, user.id)
+
+    # Closed by another worker whose registry clear never reached this one
+    db.get(Workout, started.id).ended_at = datetime.utcnow()
+    db.commit()
+    assert active_workout_registry.get(db, user.id) == started
+
+    resolved = service.get_or_start_workout(db, user.id)
+    db.commit()
+
+    assert resolved.id != started.id
+    assert db.get(Workout, resolved.id).ended_at is None
+    assert service.get_active_workout(db, user.id) == resolved
+    active_workout_registry.clear(user.id)
+
+def test_workout_routes_use_async_session(db):
+    """Test start, active, stop and summary through the async session dependency"""
+    from fastapi.testclient import TestClient
+    from main import app
+    from auth import create_access_token
+    from services.active_workouts import active_workout_registry
+
+    client = TestClient(app)
+
+    user = User(username="asyncroutes", email="asyncroutes@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    active_workout_registry.clear(user.id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+
+    started = client.post("/api/workouts/start", json={"template_name": "speed_bag"}, headers=headers)
+    assert started.status_code == 200
+    workout_id = started.json()["id"]
+    assert client.get("/api/workouts/active", headers=headers).json()["id"] == workout_id
+
+    stopped = client.post("/api/workouts/stop", headers=headers)
+    assert stopped.json()["id"] == workout_id
+    assert client.get("/api/workouts/active", headers=headers).json() is None
+
+    summary = client.get(f"/api/workouts/{workout_id}/summary", headers=headers)
+    assert summary.status_code == 200
+    assert summary.json()["rounds"] == 10
+    assert summary.json()["rests"] == 9
+    assert summary.json()["punch_mix"] == {}
+    assert db.get(WorkoutStats, workout_id).rounds == 10
+
+def test_punch_after_stop_leaves_summary_unchanged(db):
+    """Test a punch sent after stop, through a stale registry entry, never changes the stored summary"""
+    from fastapi.testclient import TestClient
+    from main import app
+    from auth import create_access_token
+    from models import Session as SessionModel
+    from services.active_workouts import active_workout_registry
+
+    client = TestClient(app)
+
+    user = User(username="latepunch", email="latepunch@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    session = SessionModel(user_id=user.id, name="Late")
+    db.add(session)
+    db.commit()
+    active_workout_registry.clear(user.id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+    punch = {"session_id": session.id, "punch_type": "jab", "speed": 20.0, "count": 1}
+
+    first = client.post("/api/punches", json=punch).json()
+    workout_id = db.get(Punch, first["id"]).workout_id
+    client.post("/api/workouts/stop", headers=headers)
+    before = client.get(f"/api/workouts/{workout_id}/summary", headers=headers).json()
+
+    # Another worker still holds the closed workout in its registry
+    stopped = db.get(Workout, workout_id)
+    db.refresh(stopped)
+    active_workout_registry.set(user.id, workout_id, stopped.started_at)
+    late = client.post("/api/punches", json=punch).json()
+
+    assert db.get(Punch, late["id"]).workout_id != workout_id
+    assert client.get(f"/api/workouts/{workout_id}/summary", headers=headers).json() == before
+    assert before["total_punches"] == 1
+    assert db.query(Punch).filter(Punch.workout_id == workout_id).count() == 1
+    active_workout_registry.clear(user.id)
+
+def test_second_open_workout_is_rejected(db):
+    """Test a start that races an already open workout returns that workout instead of a second one"""
+    user = User(username="racer", email="racer@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    # Opened by another worker, so this process's registry does not know about it yet
+    existing = Workout(user_id=user.id, started_at=datetime.utcnow() - timedelta(minutes=1))
+    db.add(existing)
+    db.commit()
+
+    ref = WorkoutService().start_workout(db, user.id)
+
+    assert ref.id == existing.id
+    assert db.query(Workout).filter(Workout.user_id == user.id, Workout.ended_at == None).count() == 1
+
+def test_registry_async_lookup_and_clear(db, monkeypatch):
+    """Test the async registry falls back to the database and publishes clears without the sync client"""
+    import asyncio
+    import redis.asyncio
+    import services.active_workouts as active_workouts
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import NullPool
+    from services.active_workouts import ActiveWorkoutRegistry
+
+    unreachable = redis.asyncio.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1, decode_responses=True)
+
+    async def get_unreachable_redis():
+        return unreachable
+
+    monkeypatch.setattr(active_workouts, "get_async_redis", get_unreachable_redis)
+    user = User(username="asyncregistry", email="asyncregistry@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    workout = Workout(user_id=user.id, started_at=datetime.utcnow())
+    db.add(workout)
+    db.commit()
+
+    registry = ActiveWorkoutRegistry()
+    AsyncSessionLocal = async_sessionmaker(
+        create_async_engine("sqlite+aiosqlite:///./test_workouts.db", poolclass=NullPool), expire_on_commit=False
+    )
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            found = await registry.get_async(session, user.id)
+            await registry.clear_async(user.id)
+            cleared = await registry.get_async(session, user.id)
+        return found, cleared
+
+    found, cleared = asyncio.run(run())
+    assert found.id == workout.id
+    assert cleared is None